@@ -99,6 +99,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests use a file too: the shared in-memory database fails concurrent writers
+        # with "table is locked" instead of waiting for the lock (see core.stock_utils.lock_for_write)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
         # 'ENGINE': 'django.db.backends.mysql',
         # 'NAME': 'biolifec_biolife',
         # 'USER':'biolifec_biolife',
@@ -113,6 +118,25 @@ DATABASES = {
 }
 
 
+# Cache
+# Must be shared by all worker processes: cache version keys (core.cache_utils)
+# invalidate cached pages and in-process indexes everywhere. The database cache
+# table is created by migration core.0038; set REDIS_URL to use Redis instead
+# (needs the redis package).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -174,6 +198,10 @@ AUTH_USER_MODEL = 'core.User'
 # Login URL - redirect to website login page instead of Django admin login
 LOGIN_URL = '/login/'
 
+# Stock reservations: how long an unconfirmed (pending) order holds its stock
+# Expired reservations are released by `python manage.py release_expired_reservations`
+STOCK_RESERVATION_TTL_MINUTES = 24 * 60
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development - prints to console
 # For production, use SMTP:
@@ -3,7 +3,9 @@ from django.utils.html import format_html
 from .models import (
     User, Address, ShippingCharge, Unit, Category, SubCategory, ChildCategory,
     Brand, Product, ProductImage, ProductReview, Wishlist, Banner, Coupon,
-    CMSPage, Order, OrderItem, PasswordResetOTP, FlashDeal, Campaign
+    CMSPage, Order, OrderItem, PasswordResetOTP, FlashDeal, Campaign, ProductVariant,
+    StockMovement, StockReservation, ProductRecommendation, RecommendationBuild,
+    ProductSalesDaily, Cart, CartItem, CouponRedemption
 )
 
 
@@ -146,7 +148,7 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'sku', 'category', 'brand', 'regular_price', 'final_price_display', 'stock', 'is_active', 'is_featured', 'image_preview']
+    list_display = ['name', 'sku', 'category', 'brand', 'regular_price', 'final_price_display', 'stock', 'reserved_stock', 'is_active', 'is_featured', 'image_preview']
     list_filter = ['is_active', 'is_featured', 'category', 'brand', 'discount_type', 'created_at']
     search_fields = ['name', 'sku', 'short_description']
     readonly_fields = ['created_at', 'updated_at', 'image_preview', 'final_price_display']
@@ -183,6 +185,19 @@ class ProductAdmin(admin.ModelAdmin):
         price = obj.get_final_price()
         return f"${price:.2f}"
     final_price_display.short_description = 'Final Price'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # product_varient JSON is the variant editor; write it to ProductVariant rows
+        obj.sync_variants_from_json()
+
+
+@admin.register(ProductVariant)
+class ProductVariantAdmin(admin.ModelAdmin):
+    list_display = ['product', 'combination', 'price', 'discount_type', 'discount', 'effective_price', 'stock', 'reserved_stock', 'is_primary']
+    list_filter = ['is_primary', 'discount_type']
+    search_fields = ['product__name', 'product__sku', 'combination']
+    readonly_fields = ['effective_price', 'reserved_stock', 'created_at', 'updated_at']
 
 
 @admin.register(ProductImage)
@@ -387,6 +402,39 @@ class OrderItemAdmin(admin.ModelAdmin):
     readonly_fields = ['total', 'created_at']
 
 
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'variant_combination', 'movement_type', 'quantity', 'balance_after', 'reference_type', 'reference', 'user', 'created_at']
+    list_filter = ['movement_type', 'reference_type', 'created_at']
+    search_fields = ['product__name', 'product__sku', 'reference']
+    list_select_related = ['product', 'user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'product', 'variant_combination', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order__id', 'product__name', 'product__sku']
+    list_select_related = ['order', 'product']
+    readonly_fields = ['order', 'product', 'variant_combination', 'quantity', 'status', 'created_at', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        # Deleting would leave reserved_stock counters behind; cancel the order instead
+        return False
+
+
 @admin.register(PasswordResetOTP)
 class PasswordResetOTPAdmin(admin.ModelAdmin):
     list_display = ['email', 'otp_code', 'is_used', 'is_expired_display', 'expires_at', 'created_at']
@@ -401,3 +449,80 @@ class PasswordResetOTPAdmin(admin.ModelAdmin):
         text = 'Expired' if is_expired else 'Valid'
         return format_html('<span style="color: {};">{}</span>', color, text)
     is_expired_display.short_description = 'Status'
+
+
+@admin.register(ProductRecommendation)
+class ProductRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'position', 'recommended_product', 'score']
+    search_fields = ['product__name', 'product__sku']
+    list_select_related = ['product', 'recommended_product']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RecommendationBuild)
+class RecommendationBuildAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'is_incremental', 'last_order_id', 'orders_processed', 'products_updated']
+    list_filter = ['is_incremental']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductSalesDaily)
+class ProductSalesDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'quantity', 'orders', 'revenue']
+    list_filter = ['date']
+    search_fields = ['product__name', 'product__sku']
+    list_select_related = ['product']
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    extra = 0
+    fields = ['product', 'variant', 'quantity', 'campaign', 'earn_code', 'updated_at']
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ['user', 'item_count', 'coupon_code', 'updated_at']
+    search_fields = ['user__email', 'user__name']
+    list_select_related = ['user']
+    readonly_fields = ['user', 'item_count', 'coupon_code', 'created_at', 'updated_at']
+    inlines = [CartItemInline]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ['coupon', 'user', 'order', 'discount', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['coupon__coupon_code', 'user__email']
+    list_select_related = ['coupon', 'user', 'order']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
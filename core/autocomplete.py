@@ -0,0 +1,128 @@
+"""
+In-memory autocomplete index
+Prefix lookups over product names, SKUs, brands and categories use a sorted
+array of normalized keys: one binary search plus a short forward scan.
+Each process builds the index on first use and rebuilds it when the
+'catalog' cache version changes.
+"""
+import bisect
+import re
+import sys
+import threading
+import time
+from array import array
+
+from .cache_utils import get_cache_version
+from .models import Product, Brand, Category, SubCategory, ChildCategory
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Result order between kinds when match quality is equal
+KIND_ORDER = {'category': 0, 'subcategory': 1, 'childcategory': 2, 'brand': 3, 'product': 4}
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces (punctuation dropped)"""
+    return ' '.join(_TERM_RE.findall(text.casefold()))
+
+
+def _word_suffixes(text, limit):
+    """(rank, key) for the text from each word start: 0 for the whole text, 1 for later words"""
+    words = normalize(text).split()
+    return [(0 if i == 0 else 1, ' '.join(words[i:])) for i in range(min(len(words), limit))]
+
+
+class SuggestIndex:
+    """
+    Sorted-array prefix index.
+    _keys[i] is a normalized key; _targets[i] indexes _entries ((kind, pk, label));
+    _ranks[i] is 0 for a match at the start of the name or SKU, 1 for a later word.
+    """
+    # Seconds between catalog version checks
+    CHECK_INTERVAL = 5
+    # Rebuild at least this often (seconds), in case a version bump is lost
+    MAX_AGE = 600
+    # Word starts indexed per name ("organic turmeric powder", "turmeric powder", "powder")
+    MAX_SUFFIXES = 6
+    # Keys examined per lookup, bounding the cost of one-letter prefixes
+    MAX_SCAN = 200
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ranks = array('B')
+        self._targets = array('I')
+        self._entries = []
+        self._version = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        """Drop the index so the next lookup rebuilds it"""
+        with self._lock:
+            self._version = None
+
+    def _build(self):
+        """Load names from the database (5 queries) and sort the keys"""
+        entries = []
+        rows = []
+
+        def add(kind, pk, label, keys):
+            index = len(entries)
+            entries.append((kind, pk, sys.intern(label)))
+            rows.extend((key, rank, index) for rank, key in keys if key)
+
+        products = Product.objects.filter(is_active=True).values_list('pk', 'name', 'sku')
+        for pk, name, sku in products.iterator(chunk_size=2000):
+            add('product', pk, name, _word_suffixes(name, self.MAX_SUFFIXES) + [(0, normalize(sku))])
+
+        for kind, model in (('brand', Brand), ('category', Category),
+                            ('subcategory', SubCategory), ('childcategory', ChildCategory)):
+            for pk, name in model.objects.values_list('pk', 'name'):
+                add(kind, pk, name, _word_suffixes(name, self.MAX_SUFFIXES))
+
+        rows.sort()
+        self._keys = [sys.intern(key) for key, _, _ in rows]
+        self._ranks = array('B', (rank for _, rank, _ in rows))
+        self._targets = array('I', (index for _, _, index in rows))
+        self._entries = entries
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is None or now - self._checked_at >= self.CHECK_INTERVAL:
+                version = get_cache_version('catalog')
+                if version != self._version or now - self._built_at >= self.MAX_AGE:
+                    self._build()
+                    self._version = version
+                    self._built_at = now
+                self._checked_at = now
+            return self._keys, self._ranks, self._targets, self._entries
+
+    def lookup(self, query, limit=8):
+        """
+        Get entries with a name word or SKU starting with query, best match first
+        Returns: list of (kind, pk, label)
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        keys, ranks, targets, entries = self._ensure_fresh()
+
+        best = {}
+        start = bisect.bisect_left(keys, prefix)
+        for position in range(start, min(start + self.MAX_SCAN, len(keys))):
+            if not keys[position].startswith(prefix):
+                break
+            index = targets[position]
+            if ranks[position] < best.get(index, 2):
+                best[index] = ranks[position]
+
+        ordered = sorted(
+            best,
+            key=lambda index: (best[index], KIND_ORDER[entries[index][0]], len(entries[index][2]), entries[index][2])
+        )
+        return [entries[index] for index in ordered[:limit]]
+
+
+suggest_index = SuggestIndex()
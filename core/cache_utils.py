@@ -0,0 +1,98 @@
+"""
+Cache utility functions
+Rarely-changing data is cached and invalidated across worker processes
+through version keys stored in the Django cache, which settings.CACHES
+shares between processes.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from .models import Setting
+
+
+def _version_key(name):
+    return f'core:version:{name}'
+
+
+def get_cache_version(name):
+    """Get the current version token of a named cache"""
+    version = cache.get(_version_key(name))
+    if version is None:
+        # First use (or evicted): publish a token so every process agrees on it
+        cache.add(_version_key(name), time.time_ns(), None)
+        version = cache.get(_version_key(name))
+    return version
+
+
+def bump_cache_version(name):
+    """Invalidate a named cache in every process that shares the cache backend"""
+    cache.set(_version_key(name), time.time_ns(), None)
+
+
+def get_versioned(name, builder, timeout=300, key='', depends=()):
+    """
+    Get a value cached under the current version of name, building it on a miss.
+    key distinguishes entries within the same name (e.g. a filter signature).
+    depends names other caches the value is built from; bumping any of them
+    invalidates it as well.
+    builder must return picklable data (not querysets).
+    """
+    version = ':'.join(str(get_cache_version(dependency)) for dependency in (name, *depends))
+    key = f'core:{name}:{version}:{key}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+class SettingCache:
+    """
+    Process-local copy of the Setting singleton.
+    Reloaded when the 'setting' version changes (Setting signals bump it).
+    """
+    # Seconds between setting version checks
+    CHECK_INTERVAL = 5
+    # Reload at least this often (seconds), in case a version bump is lost
+    MAX_AGE = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._setting = None
+        self._version = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._setting is not None and now - self._checked_at >= self.CHECK_INTERVAL:
+                if get_cache_version('setting') != self._version:
+                    self._setting = None
+                self._checked_at = now
+            if self._setting is None or now - self._loaded_at > self.MAX_AGE:
+                # Read before loading, so a change saved meanwhile triggers another reload
+                self._version = get_cache_version('setting')
+                # Defaults until the singleton is saved from the settings page
+                self._setting = Setting.objects.first() or Setting()
+                self._checked_at = now
+                self._loaded_at = now
+            return self._setting
+
+    def invalidate(self):
+        """Drop the local copy and bump the shared version"""
+        with self._lock:
+            self._setting = None
+        bump_cache_version('setting')
+
+
+setting_cache = SettingCache()
+
+
+def get_setting():
+    """
+    Get the Setting singleton from cache (unsaved defaults if there is none yet)
+    The instance is shared: read it, don't modify or save it.
+    """
+    return setting_cache.get()
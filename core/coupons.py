@@ -0,0 +1,56 @@
+"""
+Coupon lookup and redemption
+Lookups are case-insensitive and cached under the 'coupons' version (bumped by
+Coupon signals and by every redemption). Redemption is a single conditional
+UPDATE, so concurrent checkouts can't push usage past usage_limit, and each
+use is recorded in CouponRedemption.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_utils import bump_cache_version, get_versioned
+from .models import Coupon, CouponRedemption
+
+
+def normalize_code(coupon_code):
+    """Codes are matched trimmed and uppercase"""
+    return (coupon_code or '').strip().upper()
+
+
+def get_coupon(coupon_code):
+    """
+    Get a coupon by code (case-insensitive) from cache
+    The instance is shared: read it, don't modify or save it.
+    Returns: Coupon or None
+    """
+    code = normalize_code(coupon_code)
+    if not code:
+        return None
+    # False marks a cached miss (None means not cached)
+    coupon = get_versioned(
+        'coupons',
+        lambda: Coupon.objects.filter(coupon_code__iexact=code).first() or False,
+        key=code
+    )
+    return coupon or None
+
+
+def redeem_coupon(coupon, user=None, order=None, discount=0):
+    """
+    Count one use of coupon if it is still active, in date and under its usage limit.
+    Call inside the order's transaction so a failed order releases the use.
+    Returns: CouponRedemption, or None if the coupon can no longer be used
+    """
+    now = timezone.now()
+    redeemed = Coupon.objects.filter(
+        pk=coupon.pk,
+        is_active=True,
+        start_date__lte=now,
+        end_date__gte=now,
+        usage__lt=F('usage_limit'),
+    ).update(usage=F('usage') + 1, updated_at=now)
+    if not redeemed:
+        return None
+    transaction.on_commit(lambda: bump_cache_version('coupons'))
+    return CouponRedemption.objects.create(coupon_id=coupon.pk, user=user, order=order, discount=discount)
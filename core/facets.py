@@ -0,0 +1,66 @@
+"""
+Facet counts for the storefront product filters
+"""
+import hashlib
+from collections import Counter
+
+from django.db.models import Count
+
+from .cache_utils import get_versioned
+
+# One grouped row per (category ancestry, brand) combination
+FACET_FIELDS = ('ancestor_category_id', 'ancestor_sub_category_id', 'child_category_id', 'brand_id')
+
+
+def _facet_rows(queryset):
+    """Product counts grouped by category ancestry and brand (one GROUP BY query)"""
+    return list(
+        queryset.order_by().values_list(*FACET_FIELDS).annotate(count=Count('pk'))
+    )
+
+
+def get_facet_counts(queryset, signature, category_ids=(), subcategory_ids=(), childcategory_ids=(), brand_ids=()):
+    """
+    Count products per category, subcategory, child category and brand.
+    queryset: products filtered by everything except the category and brand filters
+    signature: hashable description of the filters applied to queryset (cache key)
+    Category counts honour the selected brands and brand counts honour the selected
+    categories, so each facet shows what selecting one more option would add.
+    Returns: {'categories': {id: n}, 'sub_categories': {id: n}, 'child_categories': {id: n}, 'brands': {id: n}}
+    """
+    key = hashlib.md5(repr(signature).encode()).hexdigest()
+    rows = get_versioned('product_facets', lambda: _facet_rows(queryset), key=key)
+
+    category_ids, subcategory_ids = set(category_ids), set(subcategory_ids)
+    childcategory_ids, brand_ids = set(childcategory_ids), set(brand_ids)
+    filter_categories = bool(category_ids or subcategory_ids or childcategory_ids)
+
+    categories = Counter()
+    sub_categories = Counter()
+    child_categories = Counter()
+    brands = Counter()
+    for category, sub, child, brand, count in rows:
+        if not brand_ids or brand in brand_ids:
+            if category:
+                categories[category] += count
+            if sub:
+                sub_categories[sub] += count
+            if child:
+                child_categories[child] += count
+
+        # Same matching rules as product_list's category filter
+        in_categories = (
+            not filter_categories or
+            category in category_ids or
+            sub in subcategory_ids or
+            child in childcategory_ids
+        )
+        if brand and in_categories:
+            brands[brand] += count
+
+    return {
+        'categories': dict(categories),
+        'sub_categories': dict(sub_categories),
+        'child_categories': dict(child_categories),
+        'brands': dict(brands),
+    }
@@ -0,0 +1,41 @@
+"""
+Build co-purchase product recommendations from order history.
+Usage:
+    python manage.py build_recommendations                # full rebuild
+    python manage.py build_recommendations --incremental  # fold in orders since the last build
+"""
+from django.core.management.base import BaseCommand
+
+from core.recommendations import TOP_K, CHUNK_SIZE, build_recommendations, update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute the top co-purchased products for every product from OrderItem history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only process orders placed since the last build (full rebuild if there is none)',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=TOP_K,
+            help=f'Recommendations stored per product (default: {TOP_K})',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Order items fetched per query (default: {CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            build = update_recommendations(options['top_k'], options['chunk_size'])
+        else:
+            build = build_recommendations(options['top_k'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{build}: {build.orders_processed} order(s), recommendations updated for {build.products_updated} product(s)'
+        ))
@@ -0,0 +1,24 @@
+"""
+Recompute the daily per-product sales rollup (ProductSalesDaily) from paid orders.
+Usage:
+    python manage.py rebuild_sales_rollup
+"""
+from django.core.management.base import BaseCommand
+
+from core.sales import rebuild_sales_rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ProductSalesDaily from paid order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Order items fetched per database round trip (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales_rollup(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} daily sales row(s)'))
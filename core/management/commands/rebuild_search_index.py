@@ -0,0 +1,26 @@
+"""
+Rebuild the product full-text search index.
+Usage: python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate product search documents and the full-text index (SQLite FTS5 / MySQL FULLTEXT)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Documents written per query (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {written} product(s) for full-text search ({connection.vendor})'
+        ))
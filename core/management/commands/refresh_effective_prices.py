@@ -0,0 +1,53 @@
+"""
+Recompute materialized product effective prices and flip them at flash deal boundaries.
+Usage:
+    python manage.py refresh_effective_prices          # recompute every product once
+    python manage.py refresh_effective_prices --loop   # keep running, refresh at each deal start/end
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.pricing import flash_deal_index, refresh_effective_prices, get_flash_deal_product_ids
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product.effective_price and refresh it at every flash deal start_time/end_time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and refresh affected products at each flash deal boundary',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=int,
+            default=300,
+            help='Maximum seconds to sleep between boundary checks in --loop mode (default: 300)',
+        )
+
+    def handle(self, *args, **options):
+        last_run = timezone.now()
+        updated = refresh_effective_prices()
+        self.stdout.write(self.style.SUCCESS(f'Updated effective price for {updated} product(s)'))
+
+        if not options['loop']:
+            return
+
+        max_sleep = options['max_sleep']
+        while True:
+            flash_deal_index.invalidate()
+            next_boundary = flash_deal_index.next_boundary()
+            # Wake just after the boundary so the deal is on the right side of it
+            delay = (next_boundary - timezone.now()).total_seconds() + 1
+            time.sleep(min(max(delay, 1), max_sleep))
+
+            now = timezone.now()
+            flash_deal_index.invalidate()
+            product_ids = get_flash_deal_product_ids(last_run, now)
+            last_run = now
+            if product_ids:
+                updated = refresh_effective_prices(product_ids)
+                self.stdout.write(f'[{now:%Y-%m-%d %H:%M:%S}] Flash deal boundary: updated {updated} product(s)')
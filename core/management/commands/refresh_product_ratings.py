@@ -0,0 +1,32 @@
+"""
+Recompute product rating aggregates (average, count, per-star histogram) from reviews.
+Usage:
+    python manage.py refresh_product_ratings               # every product
+    python manage.py refresh_product_ratings --product 12  # selected products
+"""
+from django.core.management.base import BaseCommand
+
+from core.ratings import rebuild_product_ratings
+
+
+class Command(BaseCommand):
+    help = 'Backfill Product.rating_avg, rating_count and rating_histogram from ProductReview'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='product_ids',
+            help='Product ID to refresh (repeatable; default: all products)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Products written per bulk update (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_product_ratings(options['product_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated ratings for {updated} product(s)'))
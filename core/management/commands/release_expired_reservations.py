@@ -0,0 +1,60 @@
+"""
+Release stock reservations of unconfirmed orders whose TTL has passed.
+Usage:
+    python manage.py release_expired_reservations          # release once (e.g. from cron)
+    python manage.py release_expired_reservations --loop   # keep sweeping every --interval seconds
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import StockReservation
+from core.stock_utils import release_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release expired StockReservations and return their quantities to available stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and sweep every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between sweeps in --loop mode (default: 60)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Reservations released per transaction (default: 500)',
+        )
+
+    def sweep(self, batch_size):
+        released = 0
+        while True:
+            # Uses the (status, expires_at) index
+            expired_ids = list(StockReservation.objects.filter(
+                status='active', expires_at__lte=timezone.now()
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not expired_ids:
+                return released
+            released += release_reservations(StockReservation.objects.filter(pk__in=expired_ids))
+
+    def handle(self, *args, **options):
+        released = self.sweep(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservation(s)'))
+
+        if not options['loop']:
+            return
+
+        while True:
+            time.sleep(options['interval'])
+            released = self.sweep(options['batch_size'])
+            if released:
+                self.stdout.write(f'[{timezone.now():%Y-%m-%d %H:%M:%S}] Released {released} expired reservation(s)')
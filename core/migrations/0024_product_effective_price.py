@@ -0,0 +1,51 @@
+# Generated manually: materialized effective price on Product
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def apply_discount(price, discount_type, discount):
+    if discount_type == 'flat' and discount > 0:
+        price = price - discount
+    elif discount_type == 'percentage' and discount > 0:
+        price = price * (1 - discount / 100)
+    return max(Decimal('0'), price)
+
+
+def backfill_effective_price(apps, schema_editor):
+    """
+    Populate effective_price from product-level discounts.
+    Active flash deals are applied by `manage.py refresh_effective_prices`.
+    """
+    Product = apps.get_model('core', 'Product')
+    products = []
+    for product in Product.objects.all().iterator():
+        price = apply_discount(
+            Decimal(str(product.regular_price)),
+            product.discount_type,
+            Decimal(str(product.discount or 0))
+        )
+        product.effective_price = price.quantize(Decimal('0.01'))
+        products.append(product)
+    Product.objects.bulk_update(products, ['effective_price'], batch_size=500)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_remove_campaign_percentage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_effective_price, noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 03:48
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('combination', models.CharField(max_length=255)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('discount_type', models.CharField(blank=True, choices=[('flat', 'Flat'), ('percentage', 'Percentage')], max_length=20, null=True)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('is_primary', models.BooleanField(default=False)),
+                ('effective_price', models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='core.product')),
+            ],
+            options={
+                'verbose_name': 'Product Variant',
+                'verbose_name_plural': 'Product Variants',
+                'ordering': ['product', 'combination'],
+                'indexes': [models.Index(fields=['product', 'is_primary'], name='core_produc_product_763ac5_idx')],
+                'unique_together': {('product', 'combination')},
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated manually: copy product_varient combinations into ProductVariant rows
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def to_decimal(value, default):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else Decimal(str(default))
+    except (InvalidOperation, ValueError):
+        return Decimal(str(default))
+
+
+def apply_discount(price, discount_type, discount):
+    if discount_type == 'flat' and discount > 0:
+        price = price - discount
+    elif discount_type == 'percentage' and discount > 0:
+        price = price * (1 - discount / 100)
+    return max(Decimal('0'), price).quantize(Decimal('0.01'))
+
+
+def copy_combinations(apps, schema_editor):
+    """
+    Create one ProductVariant per product_varient['combinations'] entry.
+    Active flash deals are applied by `manage.py refresh_effective_prices`.
+    """
+    Product = apps.get_model('core', 'Product')
+    ProductVariant = apps.get_model('core', 'ProductVariant')
+    variants = []
+    for product in Product.objects.exclude(product_varient={}).iterator():
+        combinations = (product.product_varient or {}).get('combinations') or {}
+        for combo_key, combo_data in combinations.items():
+            if not isinstance(combo_data, dict):
+                continue
+            price = to_decimal(combo_data.get('price'), product.regular_price)
+            discount_type = combo_data.get('discount_type') or None
+            discount = to_decimal(combo_data.get('discount'), 0)
+            try:
+                stock = max(0, int(combo_data.get('stock') or 0))
+            except (TypeError, ValueError):
+                stock = 0
+            variants.append(ProductVariant(
+                product=product,
+                combination=combo_key,
+                price=price,
+                stock=stock,
+                discount_type=discount_type,
+                discount=discount,
+                is_primary=bool(combo_data.get('is_primary', False)),
+                effective_price=apply_discount(price, discount_type, discount),
+            ))
+    ProductVariant.objects.bulk_create(variants, batch_size=500)
+
+
+def delete_variants(apps, schema_editor):
+    ProductVariant = apps.get_model('core', 'ProductVariant')
+    ProductVariant.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_productvariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_combinations, delete_variants),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 03:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_migrate_product_varient_to_productvariant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_combination', models.CharField(blank=True, max_length=255, null=True)),
+                ('movement_type', models.CharField(choices=[('deduct', 'Deduct'), ('add', 'Add'), ('adjust', 'Adjust')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Signed stock change (negative for deductions)')),
+                ('balance_after', models.IntegerField(help_text='Product stock after this movement')),
+                ('variant_balance_after', models.IntegerField(blank=True, help_text='Variant stock after this movement', null=True)),
+                ('reason', models.CharField(blank=True, max_length=255, null=True)),
+                ('reference_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='core.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['product', 'created_at'], name='core_stockm_product_ef6271_idx'), models.Index(fields=['reference_type', 'reference'], name='core_stockm_referen_3f2b3f_idx')],
+            },
+        ),
+    ]
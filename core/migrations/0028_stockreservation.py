@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_stockmovement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_stock',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='reserved_stock',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_combination', models.CharField(blank=True, default='', max_length=255)),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('released', 'Released'), ('converted', 'Converted')], default='active', max_length=20)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Empty once the order is confirmed', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='core.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='core.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['product', 'variant_combination', 'status'], name='core_stockr_product_99b1cb_idx'), models.Index(fields=['status', 'expires_at'], name='core_stockr_status_1d8a8b_idx'), models.Index(fields=['order', 'status'], name='core_stockr_order_i_6eea4c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 05:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.product')),
+                ('name', models.CharField(max_length=255)),
+                ('sku', models.CharField(max_length=100)),
+                ('brand', models.CharField(blank=True, default='', max_length=255)),
+                ('categories', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Search Document',
+                'verbose_name_plural': 'Product Search Documents',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated manually: full-text index over ProductSearchDocument and initial documents
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+from core.search import drop_search_index, ensure_search_index
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 table kept in sync by triggers on SQLite, FULLTEXT indexes on MySQL (DDL in core.search)"""
+    ensure_search_index(schema_editor.connection.alias)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection.alias)
+
+
+def populate_documents(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    ProductSearchDocument = apps.get_model('core', 'ProductSearchDocument')
+    products = Product.objects.select_related('brand', 'category', 'sub_category', 'child_category')
+    documents = []
+    for product in products.iterator(chunk_size=500):
+        categories = [c.name for c in (product.category, product.sub_category, product.child_category) if c]
+        body = [strip_tags(text) for text in (product.short_description, product.long_description) if text]
+        documents.append(ProductSearchDocument(
+            product_id=product.pk,
+            name=product.name,
+            sku=product.sku,
+            brand=product.brand.name if product.brand else '',
+            categories=' '.join(categories),
+            body=' '.join(body),
+        ))
+    ProductSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+def remove_documents(apps, schema_editor):
+    apps.get_model('core', 'ProductSearchDocument').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, remove_search_index),
+        migrations.RunPython(populate_documents, remove_documents),
+    ]
@@ -0,0 +1,44 @@
+# Generated manually: denormalized category ancestry on Product
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_category_ancestry(apps, schema_editor):
+    """Populate ancestor_category/ancestor_sub_category from the most specific category assigned"""
+    Product = apps.get_model('core', 'Product')
+    products = []
+    for product in Product.objects.select_related('sub_category', 'child_category__sub_category').iterator():
+        if product.child_category_id:
+            sub_category = product.child_category.sub_category
+        else:
+            sub_category = product.sub_category
+        product.ancestor_sub_category_id = sub_category.pk if sub_category else None
+        product.ancestor_category_id = sub_category.category_id if sub_category else product.category_id
+        products.append(product)
+    Product.objects.bulk_update(products, ['ancestor_category', 'ancestor_sub_category'], batch_size=500)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ancestor_category',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.category'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ancestor_sub_category',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.subcategory'),
+        ),
+        migrations.RunPython(backfill_category_ancestry, noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated manually: review aggregates on Product
+
+from decimal import Decimal
+
+import core.models
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    """
+    Populate rating aggregates from existing reviews.
+    Later drift can be repaired with `manage.py refresh_product_ratings`.
+    """
+    Product = apps.get_model('core', 'Product')
+    ProductReview = apps.get_model('core', 'ProductReview')
+    histograms = {}
+    counts = ProductReview.objects.order_by().values_list('product_id', 'star').annotate(count=models.Count('pk'))
+    for product_id, star, count in counts:
+        if 1 <= star <= 5:
+            histograms.setdefault(product_id, [0, 0, 0, 0, 0])[star - 1] = count
+
+    products = []
+    for product in Product.objects.filter(pk__in=histograms.keys()).iterator():
+        histogram = histograms[product.pk]
+        count = sum(histogram)
+        total = sum(star * n for star, n in enumerate(histogram, start=1))
+        product.rating_histogram = histogram
+        product.rating_count = count
+        product.rating_avg = (Decimal(total) / count).quantize(Decimal('0.01'))
+        products.append(product)
+    Product.objects.bulk_update(products, ['rating_histogram', 'rating_count', 'rating_avg'], batch_size=500)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(default=core.models.empty_rating_histogram, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_avg', 'rating_count', 'id'], name='core_produc_rating__f2bf06_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_product_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_id', models.IntegerField(default=0)),
+                ('is_incremental', models.BooleanField(default=False)),
+                ('orders_processed', models.IntegerField(default=0)),
+                ('products_updated', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Recommendation Build',
+                'verbose_name_plural': 'Recommendation Builds',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(help_text='Orders containing both products')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='core.product')),
+                ('recommended_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='core.product')),
+            ],
+            options={
+                'verbose_name': 'Product Recommendation',
+                'verbose_name_plural': 'Product Recommendations',
+                'ordering': ['product', 'position'],
+                'indexes': [models.Index(fields=['product', 'position'], name='core_produc_product_4e7e7e_idx')],
+                'unique_together': {('product', 'recommended_product')},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated manually: daily per-product sales rollup
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_sales(apps, schema_editor):
+    """
+    Populate the rollup from existing paid orders.
+    Later drift can be repaired with `manage.py rebuild_sales_rollup`.
+    """
+    OrderItem = apps.get_model('core', 'OrderItem')
+    ProductSalesDaily = apps.get_model('core', 'ProductSalesDaily')
+    rollup = {}
+    items = OrderItem.objects.filter(order__payment_status='paid').order_by().values_list(
+        'order_id', 'order__created_at', 'product_id', 'quantity', 'total'
+    )
+    for order_id, created_at, product_id, quantity, total in items.iterator(chunk_size=5000):
+        key = (product_id, timezone.localdate(created_at))
+        sold, revenue, orders = rollup.get(key, (0, Decimal('0'), set()))
+        orders.add(order_id)
+        rollup[key] = (sold + quantity, revenue + total, orders)
+    ProductSalesDaily.objects.bulk_create([
+        ProductSalesDaily(product_id=product_id, date=day, quantity=sold, orders=len(orders), revenue=revenue)
+        for (product_id, day), (sold, revenue, orders) in rollup.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.product')),
+            ],
+            options={
+                'verbose_name': 'Product Daily Sales',
+                'verbose_name_plural': 'Product Daily Sales',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'product'], name='core_produc_date_16ef31_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
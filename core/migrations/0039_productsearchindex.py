@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 13:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='core.product')),
+            ],
+            options={
+                'db_table': 'core_productsearch_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -2,12 +2,26 @@ from django.db import models
 import random
 import string
 import time
+from decimal import Decimal
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 
 
+def fields_except(instance, *excluded):
+    """Names of all concrete non-pk fields of instance except excluded (for save(update_fields=...))"""
+    return [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
+
+def empty_rating_histogram():
+    """Review count per star, index 0 = 1 star"""
+    return [0, 0, 0, 0, 0]
+
+
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
     
@@ -95,6 +109,9 @@ class User(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-date_joined']
+        indexes = [
+            models.Index(fields=['date_joined', 'id']),
+        ]
     
     def __str__(self):
         return self.email
@@ -275,11 +292,22 @@ class Product(models.Model):
     sub_category = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     child_category = models.ForeignKey(ChildCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
+    # Denormalized category ancestry for join-free hierarchy filters, kept in sync by save() and core.signals
+    ancestor_category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    ancestor_sub_category = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
     unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     short_description = models.TextField(blank=True, null=True)
     long_description = models.TextField(blank=True, null=True)
     regular_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Materialized get_final_price() for SQL filtering/sorting, kept in sync by save() and core.pricing
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True, editable=False)
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    # Units held by active StockReservations, maintained by core.stock_utils
+    reserved_stock = models.IntegerField(default=0, editable=False)
+    # Review aggregates, maintained incrementally by core.ratings
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_histogram = models.JSONField(default=empty_rating_histogram, editable=False)
     discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES, blank=True, null=True)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     is_active = models.BooleanField(default=True)
@@ -287,6 +315,8 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     # JSON structure: {"variant_name": "Color", "variant_values": ["red", "blue"], 
     # "combinations": {"red/xl": {"price": 100, "stock": 10, "image": "url"}, ...}}
+    # Combination price/stock/discount/is_primary live in ProductVariant rows (see variant_data);
+    # the JSON keeps the variant definition and is what the product forms post.
     product_varient = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -295,68 +325,158 @@ class Product(models.Model):
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['effective_price', 'id']),
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['rating_avg', 'rating_count', 'id']),
+        ]
     
     def __str__(self):
         return self.name
     
     def save(self, *args, **kwargs):
-        """Override save to calculate stock and price from variants if enabled"""
-        # Check if variants are enabled
-        if self.product_varient and self.product_varient.get('enabled', False):
-            combinations = self.product_varient.get('combinations', {})
-            if combinations:
+        """Override save to keep the materialized effective price and category ancestry in sync"""
+        self.refresh_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & {'category', 'sub_category', 'child_category'}:
+            self.refresh_category_ancestry()
+            if update_fields is not None:
+                update_fields = kwargs['update_fields'] = set(update_fields) | {'ancestor_category', 'ancestor_sub_category'}
+        if update_fields is not None and set(update_fields) & {'regular_price', 'discount_type', 'discount'}:
+            kwargs['update_fields'] = set(update_fields) | {'effective_price'}
+        elif update_fields is None and not self._state.adding:
+            # Never write back stale reserved stock or rating aggregates; they only change under row locks
+            kwargs['update_fields'] = fields_except(
+                self, 'reserved_stock', 'rating_avg', 'rating_count', 'rating_histogram'
+            )
+        
+        super().save(*args, **kwargs)
+    
+    def sync_variants_from_json(self):
+        """
+        Write product_varient['combinations'] (as posted by the product forms) to ProductVariant rows,
+        then calculate stock and price from variants if enabled
+        
+        The posted stock only seeds new combinations: existing rows keep their stock, which
+        changes through core.stock_utils (orders, inventory screens) and may be newer than the form.
+        """
+        from django.db import transaction
+        from .stock_utils import lock_for_write
+        
+        combinations = self.product_varient.get('combinations', {}) if self.product_varient else {}
+        combinations = {key: data for key, data in combinations.items() if isinstance(data, dict)}
+        
+        with transaction.atomic():
+            lock_for_write()
+            # Locked so Product.stock below is summed from stock no order can change meanwhile
+            existing = {variant.combination: variant for variant in self.variants.select_for_update()}
+            to_create = []
+            to_update = []
+            for combo_key, combo_data in combinations.items():
+                variant = existing.get(combo_key)
+                if variant:
+                    stock = variant.stock
+                    variant.apply_combination_data(combo_data, default_price=self.regular_price)
+                    variant.stock = stock
+                    to_update.append(variant)
+                else:
+                    variant = ProductVariant(product=self, combination=combo_key)
+                    variant.apply_combination_data(combo_data, default_price=self.regular_price)
+                    to_create.append(variant)
+            
+            self._variants_by_key = {variant.combination: variant for variant in to_create + to_update}
+            self.refresh_variant_effective_prices()
+            
+            removed = [variant.pk for key, variant in existing.items() if key not in combinations]
+            if removed:
+                ProductVariant.objects.filter(pk__in=removed).delete()
+            ProductVariant.objects.bulk_create(to_create)
+            ProductVariant.objects.bulk_update(
+                to_update, ['price', 'discount_type', 'discount', 'is_primary', 'effective_price']
+            )
+            
+            if self.product_varient and self.product_varient.get('enabled', False) and combinations:
                 # Calculate total stock from all combinations
-                total_stock = sum(
-                    combo.get('stock', 0) 
-                    for combo in combinations.values() 
-                    if isinstance(combo, dict)
-                )
-                self.stock = total_stock
+                self.stock = sum(variant.stock for variant in self._variants_by_key.values())
                 
                 # Set regular_price from is_primary variant
-                for combo_key, combo_data in combinations.items():
-                    if isinstance(combo_data, dict) and combo_data.get('is_primary', False):
-                        primary_price = combo_data.get('price', 0)
-                        if primary_price:
-                            self.regular_price = primary_price
-                        break
-        
-        super().save(*args, **kwargs)
+                primary = self.get_primary_variant()
+                if primary and primary.price:
+                    self.regular_price = primary.price
+                self.save(update_fields=['stock', 'regular_price'])
+            
+            # Reload variants (with primary keys) on next access
+            del self._variants_by_key
+    
+    def _get_variants_by_key(self):
+        """Variants keyed by combination, loaded once per instance (uses prefetch_related('variants') if present)"""
+        if not hasattr(self, '_variants_by_key'):
+            self._variants_by_key = {variant.combination: variant for variant in self.variants.all()}
+        return self._variants_by_key
+    
+    def get_variant(self, variant_combination):
+        """Get ProductVariant for a combination key (e.g. "red/xl") or None"""
+        if not variant_combination or not self.product_varient or not self.pk:
+            return None
+        return self._get_variants_by_key().get(variant_combination)
+    
+    def get_primary_variant(self):
+        """Get the is_primary ProductVariant or None"""
+        if not self.product_varient or not self.pk:
+            return None
+        for variant in self._get_variants_by_key().values():
+            if variant.is_primary:
+                return variant
+        return None
+    
+    @property
+    def variant_data(self):
+        """product_varient JSON with combination price/stock/discount taken from ProductVariant rows"""
+        if not self.product_varient:
+            return {}
+        data = dict(self.product_varient)
+        combinations = {}
+        for combo_key, combo_data in (data.get('combinations') or {}).items():
+            combo_data = dict(combo_data) if isinstance(combo_data, dict) else {}
+            variant = self.get_variant(combo_key)
+            if variant:
+                combo_data.update(variant.as_combination_data())
+            combinations[combo_key] = combo_data
+        data['combinations'] = combinations
+        return data
     
     def get_final_price(self, variant_combination=None):
         """Calculate final price considering discount, variant, and flash deals"""
         base_price = float(self.regular_price)
         
         # Get base price from variant if specified
-        if variant_combination and self.product_varient:
-            combinations = self.product_varient.get('combinations', {})
-            if variant_combination in combinations:
-                variant_data = combinations[variant_combination]
-                if isinstance(variant_data, dict):
-                    base_price = float(variant_data.get('price', self.regular_price))
-                    
-                    # Apply variant-level discount if available
-                    variant_discount_type = variant_data.get('discount_type', '')
-                    variant_discount = float(variant_data.get('discount', 0))
-                    
-                    if variant_discount_type == 'flat' and variant_discount > 0:
-                        base_price = base_price - variant_discount
-                    elif variant_discount_type == 'percentage' and variant_discount > 0:
-                        base_price = base_price * (1 - variant_discount / 100)
-                    
-                    # Check for active flash deal (flash deals override variant discounts)
-                    active_flash_deal = self.get_active_flash_deal()
-                    if active_flash_deal:
-                        if active_flash_deal.discount_type == 'flat':
-                            final_price = base_price - float(active_flash_deal.discount)
-                        elif active_flash_deal.discount_type == 'percentage':
-                            final_price = base_price * (1 - float(active_flash_deal.discount) / 100)
-                        else:
-                            final_price = base_price
-                        return max(0, final_price)
-                    
-                    # Return variant price with variant discount applied
-                    return max(0, base_price)
+        variant = self.get_variant(variant_combination)
+        if variant:
+            base_price = float(variant.price)
+            
+            # Apply variant-level discount if available
+            variant_discount_type = variant.discount_type or ''
+            variant_discount = float(variant.discount or 0)
+            
+            if variant_discount_type == 'flat' and variant_discount > 0:
+                base_price = base_price - variant_discount
+            elif variant_discount_type == 'percentage' and variant_discount > 0:
+                base_price = base_price * (1 - variant_discount / 100)
+            
+            # Check for active flash deal (flash deals override variant discounts)
+            active_flash_deal = self.get_active_flash_deal()
+            if active_flash_deal:
+                if active_flash_deal.discount_type == 'flat':
+                    final_price = base_price - float(active_flash_deal.discount)
+                elif active_flash_deal.discount_type == 'percentage':
+                    final_price = base_price * (1 - float(active_flash_deal.discount) / 100)
+                else:
+                    final_price = base_price
+                return max(0, final_price)
+            
+            # Return variant price with variant discount applied
+            return max(0, base_price)
         
         # Check for active flash deal first (flash deals override product discounts)
         active_flash_deal = self.get_active_flash_deal()
@@ -378,32 +498,105 @@ class Product(models.Model):
             final_price = base_price
         
         return max(0, final_price)  # Ensure price is not negative
-    
+
+    def refresh_effective_price(self):
+        """
+        Recompute effective_price from get_final_price().
+        Returns True if it changed.
+        """
+        effective_price = Decimal(str(self.get_final_price())).quantize(Decimal('0.01'))
+        if self.effective_price != effective_price:
+            self.effective_price = effective_price
+            return True
+        return False
+
+    @property
+    def rating_breakdown(self):
+        """Per-star review counts for display: [{'star', 'count', 'percent'}], 5 stars first"""
+        histogram = self.rating_histogram or empty_rating_histogram()
+        return [
+            {
+                'star': star,
+                'count': histogram[star - 1],
+                'percent': round(histogram[star - 1] * 100 / self.rating_count) if self.rating_count else 0,
+            }
+            for star in range(5, 0, -1)
+        ]
+
+    def refresh_category_ancestry(self):
+        """
+        Recompute ancestor_category/ancestor_sub_category from the most specific
+        category assigned (child category, then subcategory, then category).
+        Returns True if they changed.
+        """
+        sub_category = None
+        if self.child_category_id:
+            sub_category_id = self.child_category.sub_category_id
+            if self.sub_category_id == sub_category_id:
+                sub_category = self.sub_category
+            else:
+                sub_category = self.child_category.sub_category
+        elif self.sub_category_id:
+            sub_category = self.sub_category
+        
+        ancestor_sub_category_id = sub_category.pk if sub_category else None
+        ancestor_category_id = sub_category.category_id if sub_category else self.category_id
+        if (self.ancestor_category_id, self.ancestor_sub_category_id) != (ancestor_category_id, ancestor_sub_category_id):
+            self.ancestor_category_id = ancestor_category_id
+            self.ancestor_sub_category_id = ancestor_sub_category_id
+            return True
+        return False
+
+    def refresh_variant_effective_prices(self):
+        """
+        Recompute effective_price of every ProductVariant (not saved).
+        Returns: list of changed variants
+        """
+        changed = []
+        if not self.product_varient or not self.pk:
+            return changed
+        for combo_key, variant in self._get_variants_by_key().items():
+            effective_price = Decimal(str(self.get_final_price(combo_key))).quantize(Decimal('0.01'))
+            if variant.effective_price != effective_price:
+                variant.effective_price = effective_price
+                changed.append(variant)
+        return changed
+
+    @property
+    def final_price(self):
+        """Final price precomputed by core.pricing.resolve_prices, falls back to get_final_price"""
+        if hasattr(self, '_final_price'):
+            return self._final_price
+        return self.get_final_price()
+
     def get_active_flash_deal(self):
         """Get active flash deal for this product if any"""
-        from django.utils import timezone
-        now = timezone.now()
-        active_deals = self.flash_deals.filter(
-            is_active=True,
-            start_time__lte=now,
-            end_time__gte=now
-        ).first()
-        return active_deals
+        # Use the deal attached by core.pricing.resolve_prices if available
+        if hasattr(self, '_active_flash_deal'):
+            return self._active_flash_deal
+        # Import here to avoid circular import
+        from .pricing import flash_deal_index
+        return flash_deal_index.get(self.pk)
     
     def get_variant_stock(self, variant_combination=None):
         """Get stock for specific variant combination"""
-        if variant_combination and self.product_varient:
-            combinations = self.product_varient.get('combinations', {})
-            if variant_combination in combinations:
-                return combinations[variant_combination].get('stock', self.stock)
+        variant = self.get_variant(variant_combination)
+        if variant:
+            return variant.stock
         return self.stock
     
+    def get_available_stock(self, variant_combination=None):
+        """Get stock for specific variant combination minus active reservations"""
+        variant = self.get_variant(variant_combination)
+        if variant:
+            return max(0, variant.stock - variant.reserved_stock)
+        return max(0, self.stock - self.reserved_stock)
+    
     def is_low_stock(self):
         """Check if product is low on stock"""
-        # Import Setting here to avoid circular import
-        from django.apps import apps
-        Setting = apps.get_model('core', 'Setting')
-        setting = Setting.objects.first()
+        # Import here to avoid circular import
+        from .cache_utils import get_setting
+        setting = get_setting()
         threshold = setting.low_stock_threshold if setting else 10
         return self.stock <= threshold
     
@@ -420,6 +613,110 @@ class Product(models.Model):
         return 'in_stock'
 
 
+class ProductVariant(models.Model):
+    """Variant combination of a product (e.g. "red/xl") with its own price and stock"""
+    DISCOUNT_TYPE_CHOICES = Product.DISCOUNT_TYPE_CHOICES
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
+    # Combination key as used in product_varient['combinations'] and OrderItem.product_varient
+    combination = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES, blank=True, null=True)
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    is_primary = models.BooleanField(default=False)
+    # Units held by active StockReservations, maintained by core.stock_utils
+    reserved_stock = models.IntegerField(default=0, editable=False)
+    # Materialized Product.get_final_price(combination), kept in sync by core.pricing
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Product Variant'
+        verbose_name_plural = 'Product Variants'
+        ordering = ['product', 'combination']
+        unique_together = ['product', 'combination']
+        indexes = [
+            models.Index(fields=['product', 'is_primary']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.combination}"
+    
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None and not self._state.adding:
+            # Never write back a stale reserved_stock; it only changes under row locks
+            kwargs['update_fields'] = fields_except(self, 'reserved_stock')
+        super().save(*args, **kwargs)
+    
+    def apply_combination_data(self, combo_data, default_price=0):
+        """Set fields from a product_varient['combinations'] entry"""
+        def to_decimal(value, default):
+            try:
+                return Decimal(str(value)) if value not in (None, '') else Decimal(str(default))
+            except ArithmeticError:
+                return Decimal(str(default))
+        
+        self.price = to_decimal(combo_data.get('price'), default_price)
+        try:
+            self.stock = max(0, int(combo_data.get('stock') or 0))
+        except (TypeError, ValueError):
+            self.stock = 0
+        self.discount_type = combo_data.get('discount_type') or None
+        self.discount = to_decimal(combo_data.get('discount'), 0)
+        self.is_primary = bool(combo_data.get('is_primary', False))
+    
+    def as_combination_data(self):
+        """Values in product_varient['combinations'] format"""
+        return {
+            'price': float(self.price),
+            'stock': self.stock,
+            'discount_type': self.discount_type or '',
+            'discount': float(self.discount),
+            'is_primary': self.is_primary,
+            'effective_price': float(self.effective_price),
+        }
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Denormalized search text for a product, kept in sync by core.search.
+    Indexed by an FTS5 table + triggers on SQLite and FULLTEXT indexes on MySQL
+    (created by core.search); run `manage.py rebuild_search_index` after altering this table.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=255)
+    sku = models.CharField(max_length=100)
+    brand = models.CharField(max_length=255, blank=True, default='')
+    categories = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Product Search Document'
+        verbose_name_plural = 'Product Search Documents'
+    
+    def __str__(self):
+        return self.name
+
+
+class ProductSearchIndex(models.Model):
+    """
+    SQLite FTS5 table over ProductSearchDocument (rowid = product id), created by
+    core.search rather than by migrations. Lets product queries join the index
+    and select its bm25() score; the table does not exist on other databases.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_index'
+    )
+    
+    class Meta:
+        managed = False
+        db_table = 'core_productsearch_fts'
+
+
 class Campaign(models.Model):
     """Product promotion campaigns"""
     COMMISSION_TYPE_FLAT = 'flat'
@@ -510,6 +807,47 @@ class Wishlist(models.Model):
         return f"{self.user.email} - {self.product.name}"
 
 
+class Cart(models.Model):
+    """Persistent cart of a logged-in user (anonymous carts live in the session)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    coupon_code = models.CharField(max_length=50, blank=True, null=True)
+    # Sum of item quantities, kept up to date by website.cart for the header count
+    item_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Cart'
+        verbose_name_plural = 'Carts'
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.item_count} item(s)"
+
+
+class CartItem(models.Model):
+    """One (product, variant) line of a Cart"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    variant = models.CharField(max_length=255, blank=True, default='')
+    quantity = models.PositiveIntegerField(default=1)
+    campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True, blank=True, related_name='cart_items')
+    earn_code = models.CharField(max_length=50, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Cart Item'
+        verbose_name_plural = 'Cart Items'
+        ordering = ['pk']
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product', 'variant'], name='unique_cart_product_variant'),
+        ]
+    
+    def __str__(self):
+        variant_str = f" ({self.variant})" if self.variant else ""
+        return f"{self.cart.user.email} - {self.product.name}{variant_str} x {self.quantity}"
+
+
 class Banner(models.Model):
     """Homepage banners"""
     title = models.CharField(max_length=255)
@@ -565,6 +903,26 @@ class Coupon(models.Model):
         )
 
 
+class CouponRedemption(models.Model):
+    """One use of a coupon by an order (written by core.coupons.redeem_coupon)"""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='coupon_redemptions')
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='coupon_redemptions')
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Coupon Redemption'
+        verbose_name_plural = 'Coupon Redemptions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['coupon', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.coupon.coupon_code} - {self.user.email if self.user else 'deleted user'}"
+
+
 class FlashDeal(models.Model):
     """Flash deals with time-limited offers on products"""
     DISCOUNT_TYPE_CHOICES = [
@@ -689,6 +1047,9 @@ class Order(models.Model):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.user.email}"
@@ -727,6 +1088,139 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockMovement(models.Model):
+    """Append-only ledger of stock changes written by core.stock_utils"""
+    MOVEMENT_TYPE_CHOICES = [
+        ('deduct', 'Deduct'),
+        ('add', 'Add'),
+        ('adjust', 'Adjust'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    variant_combination = models.CharField(max_length=255, blank=True, null=True)
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES)
+    quantity = models.IntegerField(help_text="Signed stock change (negative for deductions)")
+    # Running balances after this movement, so history never replays the ledger
+    balance_after = models.IntegerField(help_text="Product stock after this movement")
+    variant_balance_after = models.IntegerField(blank=True, null=True, help_text="Variant stock after this movement")
+    reason = models.CharField(max_length=255, blank=True, null=True)
+    reference_type = models.CharField(max_length=50, blank=True, null=True)
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Stock Movement'
+        verbose_name_plural = 'Stock Movements'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['reference_type', 'reference']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
+    def __str__(self):
+        variant_str = f" - {self.variant_combination}" if self.variant_combination else ""
+        return f"{self.product.name}{variant_str}: {self.quantity:+d} ({self.balance_after})"
+    
+    def save(self, *args, **kwargs):
+        """Movements are append-only"""
+        if not self._state.adding:
+            raise ValueError("Stock movements cannot be modified")
+        super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+    """Stock held for a placed order until it is delivered, cancelled or expires"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('released', 'Released'),
+        ('converted', 'Converted'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+    variant_combination = models.CharField(max_length=255, blank=True, default='')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField(blank=True, null=True, help_text="Empty once the order is confirmed")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'variant_combination', 'status']),
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['order', 'status']),
+        ]
+    
+    def __str__(self):
+        variant_str = f" - {self.variant_combination}" if self.variant_combination else ""
+        return f"{self.order} - {self.product.name}{variant_str} x {self.quantity} ({self.status})"
+
+
+class ProductSalesDaily(models.Model):
+    """Units, orders and revenue per product per order date for paid orders (see core.sales)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    quantity = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Product Daily Sales'
+        verbose_name_plural = 'Product Daily Sales'
+        ordering = ['-date']
+        unique_together = ['product', 'date']
+        indexes = [
+            models.Index(fields=['date', 'product']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} - {self.date}: {self.quantity}"
+
+
+class ProductRecommendation(models.Model):
+    """Top co-purchased products per product, built by `manage.py build_recommendations`"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_in')
+    score = models.PositiveIntegerField(help_text='Orders containing both products')
+    position = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        verbose_name = 'Product Recommendation'
+        verbose_name_plural = 'Product Recommendations'
+        ordering = ['product', 'position']
+        unique_together = ['product', 'recommended_product']
+        indexes = [
+            models.Index(fields=['product', 'position']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} -> {self.recommended_product} ({self.score})"
+
+
+class RecommendationBuild(models.Model):
+    """Order history watermark of each ProductRecommendation build"""
+    last_order_id = models.IntegerField(default=0)
+    is_incremental = models.BooleanField(default=False)
+    orders_processed = models.IntegerField(default=0)
+    products_updated = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Recommendation Build'
+        verbose_name_plural = 'Recommendation Builds'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        kind = 'Incremental' if self.is_incremental else 'Full'
+        return f"{kind} build through order #{self.last_order_id}"
+
+
 class Setting(models.Model):
     """Global system settings"""
     system_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
@@ -790,6 +1284,9 @@ class Withdrawal(models.Model):
         verbose_name = 'Withdrawal'
         verbose_name_plural = 'Withdrawals'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
         
     def __str__(self):
         return f"{self.user.email} - {self.amount}"
@@ -820,6 +1317,9 @@ class Transaction(models.Model):
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
         
     def __str__(self):
         return f"{self.user.email} - {self.transaction_type} - {self.amount}"
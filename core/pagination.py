@@ -0,0 +1,177 @@
+"""
+Keyset (cursor) pagination
+Pages are addressed by opaque tokens holding the sort key of the row they
+start after, so every page is one indexed range scan regardless of depth
+(no OFFSET, and no COUNT unless the template asks for it).
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+from functools import cached_property
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _encode_value(value):
+    # Full precision: DjangoJSONEncoder truncates microseconds, which breaks seeks
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a page cursor')
+
+
+class CursorPage:
+    """
+    One page of CursorPaginator results.
+    Compatible with django.core.paginator.Page for templates: next_page_number and
+    previous_page_number return cursor tokens to pass back as the page parameter.
+    """
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def next_page_number(self):
+        """Cursor token for the page after this one"""
+        return self.paginator.encode_cursor(self.object_list[-1], self.number + 1, backwards=False)
+
+    def previous_page_number(self):
+        """Cursor token for the page before this one ('' for the first page)"""
+        if self.number <= 2:
+            return ''
+        return self.paginator.encode_cursor(self.object_list[0], self.number - 1, backwards=True)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return (self.number - 1) * self.paginator.per_page + len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by (sort columns, pk) instead of OFFSET.
+    ordering: model field or annotation names, '-' prefix for descending;
+    pk is appended as the tie-breaker. Sort columns must not be NULL.
+    count/num_pages run a COUNT query only when accessed.
+    """
+    def __init__(self, queryset, per_page, ordering):
+        ordering = list(ordering)
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+
+    @cached_property
+    def count(self):
+        """Total number of rows (one COUNT query, only if used)"""
+        return self.queryset.order_by().count()
+
+    @cached_property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def page_range(self):
+        """Cursor pages can't be addressed by number; templates get prev/next only"""
+        return range(0)
+
+    def encode_cursor(self, obj, number, backwards):
+        """Opaque token for the page that starts after (or, backwards, ends before) obj"""
+        cursor = {
+            'o': self.ordering,
+            'k': [getattr(obj, field) for field in self.fields],
+            'n': number,
+            'b': backwards,
+        }
+        data = json.dumps(cursor, default=_encode_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Returns: cursor dict, or None for a missing, malformed or foreign token"""
+        if not token:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            cursor = json.loads(data)
+            valid = (
+                cursor['o'] == self.ordering and
+                len(cursor['k']) == len(self.fields) and
+                isinstance(cursor['n'], int) and cursor['n'] > 1
+            )
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            return None
+        return cursor if valid else None
+
+    def _seek(self, values, backwards):
+        """Q for rows strictly after values in the (possibly reversed) ordering"""
+        condition = None
+        for field, order, value in reversed(list(zip(self.fields, self.ordering, values))):
+            descending = order.startswith('-') != backwards
+            after = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+            condition = after if condition is None else after | (Q(**{field: value}) & condition)
+        return condition
+
+    def get_page(self, token):
+        """
+        Get the page addressed by a cursor token (first page for a missing or invalid token)
+        Returns: CursorPage
+        """
+        cursor = self.decode_cursor(token)
+        queryset = self.queryset
+        backwards = False
+        if cursor:
+            backwards = bool(cursor['b'])
+            try:
+                queryset = queryset.filter(self._seek(cursor['k'], backwards))
+            except (ValidationError, ValueError, TypeError):
+                cursor = None
+                backwards = False
+                queryset = self.queryset
+            else:
+                if backwards:
+                    queryset = queryset.reverse()
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not cursor:
+            return CursorPage(rows, 1, self, has_previous=False, has_next=has_more)
+        if backwards:
+            rows.reverse()
+            number = cursor['n'] if has_more else 1
+            return CursorPage(rows, number, self, has_previous=has_more, has_next=True)
+        return CursorPage(rows, cursor['n'], self, has_previous=True, has_next=has_more)
@@ -0,0 +1,187 @@
+"""
+Batch pricing utility functions
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from .cache_utils import bump_cache_version, get_cache_version
+from .models import FlashDeal, Product, ProductVariant
+
+
+class FlashDealIndex:
+    """
+    Process-local index of product ID -> active flash deal.
+    The index is rebuilt lazily and expires itself at the next flash deal
+    start_time/end_time boundary. FlashDeal signals invalidate it on change,
+    and other processes pick that up from the 'flash_deals' version.
+    """
+    # Seconds between flash deal version checks
+    CHECK_INTERVAL = 5
+    # Rebuild at least this often, in case a version bump is lost
+    MAX_AGE = timedelta(minutes=5)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_product = {}
+        self._active_deals = []
+        self._expires_at = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        """Drop the index so the next lookup reloads it, here and in every other process"""
+        with self._lock:
+            self._expires_at = None
+        bump_cache_version('flash_deals')
+
+    def _build(self, now):
+        """Load live and upcoming deals (2 queries) and compute the next boundary"""
+        deals = {
+            deal.pk: deal
+            for deal in FlashDeal.objects.filter(is_active=True, end_time__gte=now)
+        }
+        links = FlashDeal.products.through.objects.filter(
+            flashdeal_id__in=deals.keys()
+        ).values_list('flashdeal_id', 'product_id')
+
+        active_deals = sorted(
+            (deal for deal in deals.values() if deal.start_time <= now),
+            key=lambda deal: deal.created_at,
+            reverse=True
+        )
+        active_ids = {deal.pk for deal in active_deals}
+
+        products_by_deal = {}
+        for deal_id, product_id in links:
+            products_by_deal.setdefault(deal_id, []).append(product_id)
+
+        by_product = {}
+        for deal in active_deals:
+            # Same precedence as FlashDeal ordering: newest deal wins
+            for product_id in products_by_deal.get(deal.pk, []):
+                by_product.setdefault(product_id, deal)
+
+        # Next moment the set of active deals can change
+        expires_at = now + self.MAX_AGE
+        for deal in deals.values():
+            boundary = deal.end_time if deal.pk in active_ids else deal.start_time
+            expires_at = min(expires_at, boundary)
+
+        self._by_product = by_product
+        self._active_deals = active_deals
+        self._expires_at = expires_at
+
+    def _ensure_fresh(self):
+        now = timezone.now()
+        checked_at = time.monotonic()
+        with self._lock:
+            if self._expires_at is not None and checked_at - self._checked_at >= self.CHECK_INTERVAL:
+                if get_cache_version('flash_deals') != self._version:
+                    self._expires_at = None
+                self._checked_at = checked_at
+            if self._expires_at is None or now >= self._expires_at:
+                # Read before building, so a change saved meanwhile triggers another rebuild
+                self._version = get_cache_version('flash_deals')
+                self._checked_at = checked_at
+                self._build(now)
+            return self._by_product, self._active_deals
+
+    def get(self, product_id):
+        """Get active flash deal for a product ID, or None"""
+        by_product, _ = self._ensure_fresh()
+        return by_product.get(product_id)
+
+    def active_deals(self):
+        """Get all currently active flash deals, newest first"""
+        _, active_deals = self._ensure_fresh()
+        return list(active_deals)
+
+    def next_boundary(self):
+        """Get the time at which the index next expires (deal start/end or max age)"""
+        self._ensure_fresh()
+        return self._expires_at
+
+
+flash_deal_index = FlashDealIndex()
+
+
+def get_active_flash_deals(product_ids):
+    """
+    Get the active flash deal for every product in product_ids
+    Returns: {product_id: FlashDeal}
+    """
+    deals = {}
+    for product_id in set(product_ids):
+        deal = flash_deal_index.get(product_id)
+        if deal:
+            deals[product_id] = deal
+    return deals
+
+
+def resolve_prices(products, variants=None):
+    """
+    Attach active flash deal and final price to each product instance.
+    variants is an optional sequence of variant combinations, one per product.
+    Returns: list of products (same order)
+    """
+    products = list(products)
+    if variants is None:
+        variants = [None] * len(products)
+
+    deals = get_active_flash_deals([p.pk for p in products])
+
+    for product, variant in zip(products, variants):
+        product._active_flash_deal = deals.get(product.pk)
+        product._final_price = product.get_final_price(variant or None)
+
+    return products
+
+
+def refresh_effective_prices(product_ids=None, batch_size=500):
+    """
+    Recompute materialized product and variant effective prices in bulk
+    (all products if product_ids is None)
+    Returns: number of products updated
+    """
+    products = Product.objects.prefetch_related('variants')
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+
+    changed_products = []
+    changed_variants = []
+    updated = 0
+    for product in products.iterator(chunk_size=batch_size):
+        variants = product.refresh_variant_effective_prices()
+        if product.refresh_effective_price() or variants:
+            changed_products.append(product)
+            changed_variants.extend(variants)
+        if len(changed_products) >= batch_size:
+            Product.objects.bulk_update(changed_products, ['effective_price'])
+            ProductVariant.objects.bulk_update(changed_variants, ['effective_price'])
+            updated += len(changed_products)
+            changed_products = []
+            changed_variants = []
+
+    if changed_products:
+        Product.objects.bulk_update(changed_products, ['effective_price'])
+        ProductVariant.objects.bulk_update(changed_variants, ['effective_price'])
+        updated += len(changed_products)
+
+    if updated:
+        # Price filters feed the storefront facet counts and cached listings
+        bump_cache_version('product_facets')
+        bump_cache_version('catalog')
+    return updated
+
+
+def get_flash_deal_product_ids(start, end):
+    """Get IDs of products whose flash deal starts or ends within (start, end]"""
+    return set(
+        FlashDeal.products.through.objects.filter(
+            Q(flashdeal__start_time__gt=start, flashdeal__start_time__lte=end) |
+            Q(flashdeal__end_time__gte=start, flashdeal__end_time__lt=end)
+        ).values_list('product_id', flat=True)
+    )
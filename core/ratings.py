@@ -0,0 +1,104 @@
+"""
+Product rating aggregates
+Product.rating_avg, rating_count and rating_histogram are updated
+incrementally under a row lock on every ProductReview change (see
+core.signals); rebuild_product_ratings() recomputes them from the reviews.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from .cache_utils import bump_cache_version
+from .models import Product, ProductReview, empty_rating_histogram
+from .stock_utils import lock_for_write
+
+logger = logging.getLogger(__name__)
+
+# Stars counted in the histogram; others (only possible through bulk updates or raw writes) are ignored
+VALID_STARS = range(1, 6)
+
+
+def rating_summary(histogram):
+    """
+    Average and count for a per-star histogram
+    Returns: (rating_avg: Decimal, rating_count: int)
+    """
+    count = sum(histogram)
+    if not count:
+        return Decimal('0.00'), 0
+    total = sum(star * n for star, n in enumerate(histogram, start=1))
+    return (Decimal(total) / count).quantize(Decimal('0.01')), count
+
+
+def _counted_star(product_id, star):
+    """star if it belongs in the histogram, else None (logged)"""
+    if star is None or star in VALID_STARS:
+        return star
+    logger.warning(f'Ignoring out-of-range review star {star!r} for Product #{product_id}')
+    return None
+
+
+def apply_rating_change(product_id, added=None, removed=None):
+    """
+    Add and/or remove one review's star on a product's rating aggregates
+    (both when a review's star changes); stars outside 1..5 are not counted
+    """
+    added = _counted_star(product_id, added)
+    removed = _counted_star(product_id, removed)
+    if added is None and removed is None:
+        return
+
+    with transaction.atomic():
+        lock_for_write()
+        histogram = Product.objects.select_for_update().filter(
+            pk=product_id
+        ).values_list('rating_histogram', flat=True).first()
+        if histogram is None:
+            return  # Product is being deleted
+
+        histogram = list(histogram) or empty_rating_histogram()
+        if added is not None:
+            histogram[added - 1] += 1
+        if removed is not None:
+            histogram[removed - 1] = max(0, histogram[removed - 1] - 1)
+
+        rating_avg, rating_count = rating_summary(histogram)
+        Product.objects.filter(pk=product_id).update(
+            rating_histogram=histogram, rating_avg=rating_avg, rating_count=rating_count
+        )
+
+
+def rebuild_product_ratings(product_ids=None, batch_size=500):
+    """
+    Recompute rating aggregates from ProductReview in bulk (all products if product_ids is None)
+    Returns: number of products updated
+    """
+    reviews = ProductReview.objects.all()
+    products = Product.objects.only('pk', 'rating_avg', 'rating_count', 'rating_histogram')
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    histograms = {}
+    counts = reviews.order_by().values_list('product_id', 'star').annotate(count=Count('pk'))
+    for product_id, star, count in counts:
+        if star in VALID_STARS:
+            histograms.setdefault(product_id, empty_rating_histogram())[star - 1] = count
+
+    changed = []
+    for product in products.iterator(chunk_size=batch_size):
+        histogram = histograms.get(product.pk, empty_rating_histogram())
+        rating_avg, rating_count = rating_summary(histogram)
+        if (product.rating_histogram, product.rating_avg, product.rating_count) != (histogram, rating_avg, rating_count):
+            product.rating_histogram = histogram
+            product.rating_avg = rating_avg
+            product.rating_count = rating_count
+            changed.append(product)
+
+    Product.objects.bulk_update(changed, ['rating_histogram', 'rating_avg', 'rating_count'], batch_size=batch_size)
+    if changed:
+        bump_cache_version('catalog')
+    return len(changed)
@@ -0,0 +1,124 @@
+"""
+Co-purchase recommendations
+Builds an item-to-item co-occurrence matrix from OrderItem history (a sparse
+dict of Counters, one row per product), keeps the top-K neighbours of each
+product and stores them in ProductRecommendation.
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import OrderItem, ProductRecommendation, RecommendationBuild
+
+# Neighbours stored per product
+TOP_K = 12
+# Orders with more distinct products are skipped (n^2 pairs, weak signal)
+MAX_BASKET_SIZE = 50
+# OrderItem rows fetched per database round trip
+CHUNK_SIZE = 5000
+
+
+def _baskets(rows):
+    """Group a (order_id, product_id) stream ordered by order_id into per-order product sets"""
+    current_order, basket = None, set()
+    for order_id, product_id in rows:
+        if order_id != current_order:
+            if basket:
+                yield basket
+            current_order, basket = order_id, set()
+        basket.add(product_id)
+    if basket:
+        yield basket
+
+
+def count_co_purchases(after_order_id=0, through_order_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream order items of orders in (after_order_id, through_order_id] and count
+    how many orders contain each pair of products (cancelled orders excluded).
+    Memory grows with distinct co-purchased pairs, not with order history.
+    Returns: (matrix: {product_id: Counter({other_id: orders})}, orders processed)
+    """
+    rows = OrderItem.objects.filter(
+        order_id__gt=after_order_id
+    ).exclude(
+        order__order_status='cancelled'
+    ).order_by('order_id').values_list('order_id', 'product_id')
+    if through_order_id is not None:
+        rows = rows.filter(order_id__lte=through_order_id)
+
+    matrix = defaultdict(Counter)
+    orders = 0
+    for basket in _baskets(rows.iterator(chunk_size=chunk_size)):
+        orders += 1
+        if len(basket) > MAX_BASKET_SIZE:
+            continue
+        for a, b in combinations(basket, 2):
+            matrix[a][b] += 1
+            matrix[b][a] += 1
+    return matrix, orders
+
+
+def _top_neighbours(counts, top_k):
+    """Highest-count neighbours; ties go to the lower product ID for stable output"""
+    return heapq.nlargest(top_k, counts.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _recommendation_rows(matrix, top_k):
+    return [
+        ProductRecommendation(product_id=product_id, recommended_product_id=other_id, score=score, position=position)
+        for product_id, counts in matrix.items()
+        for position, (other_id, score) in enumerate(_top_neighbours(counts, top_k))
+    ]
+
+
+def build_recommendations(top_k=TOP_K, chunk_size=CHUNK_SIZE):
+    """
+    Rebuild every product's recommendations from the full order history
+    Returns: RecommendationBuild
+    """
+    through_order_id = OrderItem.objects.aggregate(last=Max('order_id'))['last'] or 0
+    matrix, orders = count_co_purchases(0, through_order_id, chunk_size)
+
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(_recommendation_rows(matrix, top_k), batch_size=1000)
+        return RecommendationBuild.objects.create(
+            last_order_id=through_order_id,
+            orders_processed=orders,
+            products_updated=len(matrix),
+        )
+
+
+def update_recommendations(top_k=TOP_K, chunk_size=CHUNK_SIZE):
+    """
+    Fold orders placed since the last build into the stored recommendations.
+    Only products bought in those orders are rewritten. Stored top-K scores are
+    the baseline, so a pair outside a product's top K restarts from its new
+    count; periodic full builds restore exact counts.
+    Returns: RecommendationBuild
+    """
+    last_build = RecommendationBuild.objects.order_by('-last_order_id').first()
+    if last_build is None:
+        return build_recommendations(top_k, chunk_size)
+
+    through_order_id = OrderItem.objects.aggregate(last=Max('order_id'))['last'] or 0
+    matrix, orders = count_co_purchases(last_build.last_order_id, through_order_id, chunk_size)
+
+    with transaction.atomic():
+        existing = ProductRecommendation.objects.filter(
+            product_id__in=list(matrix)
+        ).values_list('product_id', 'recommended_product_id', 'score')
+        for product_id, other_id, score in existing.iterator(chunk_size=chunk_size):
+            matrix[product_id][other_id] += score
+
+        ProductRecommendation.objects.filter(product_id__in=list(matrix)).delete()
+        ProductRecommendation.objects.bulk_create(_recommendation_rows(matrix, top_k), batch_size=1000)
+        return RecommendationBuild.objects.create(
+            last_order_id=max(through_order_id, last_build.last_order_id),
+            is_incremental=True,
+            orders_processed=orders,
+            products_updated=len(matrix),
+        )
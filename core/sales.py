@@ -0,0 +1,111 @@
+"""
+Daily sales rollup
+ProductSalesDaily keeps units, orders and revenue per product per order date
+for paid orders. Order signals add an order's items when it becomes paid and
+take them back if it stops being paid or is deleted, so best-seller and
+trending rankings are small aggregates over the rollup instead of scans of
+the order history.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .cache_utils import bump_cache_version, get_versioned
+from .models import OrderItem, Product, ProductSalesDaily
+
+# Product IDs kept per ranking; inactive products are skipped when reading
+RANKING_SIZE = 24
+# Days of sales counted towards trending
+TRENDING_DAYS = 30
+
+
+def _order_totals(order):
+    """Returns: {product_id: (quantity, revenue)} for the order's items"""
+    totals = {}
+    items = OrderItem.objects.filter(order=order).values_list('product_id', 'quantity', 'total')
+    for product_id, quantity, total in items:
+        sold, revenue = totals.get(product_id, (0, Decimal('0')))
+        totals[product_id] = (sold + quantity, revenue + total)
+    return totals
+
+
+def record_order_sales(order, sign=1):
+    """Add (sign=1) or remove (sign=-1) a paid order's items in the rollup for its order date"""
+    totals = _order_totals(order)
+    if not totals:
+        return
+    day = timezone.localdate(order.created_at)
+    with transaction.atomic():
+        ProductSalesDaily.objects.bulk_create(
+            [ProductSalesDaily(product_id=product_id, date=day) for product_id in totals],
+            ignore_conflicts=True,
+        )
+        for product_id, (quantity, revenue) in totals.items():
+            ProductSalesDaily.objects.filter(product_id=product_id, date=day).update(
+                quantity=F('quantity') + sign * quantity,
+                orders=F('orders') + sign,
+                revenue=F('revenue') + sign * revenue,
+            )
+        if sign < 0:
+            ProductSalesDaily.objects.filter(product_id__in=list(totals), date=day, orders__lte=0).delete()
+    transaction.on_commit(lambda: bump_cache_version('sales_rankings'))
+
+
+def rebuild_sales_rollup(chunk_size=5000):
+    """
+    Recompute the whole rollup from paid orders
+    Returns: number of (product, date) rows written
+    """
+    rollup = {}
+    items = OrderItem.objects.filter(order__payment_status='paid').order_by().values_list(
+        'order_id', 'order__created_at', 'product_id', 'quantity', 'total'
+    )
+    for order_id, created_at, product_id, quantity, total in items.iterator(chunk_size=chunk_size):
+        key = (product_id, timezone.localdate(created_at))
+        sold, revenue, orders = rollup.get(key, (0, Decimal('0'), set()))
+        orders.add(order_id)
+        rollup[key] = (sold + quantity, revenue + total, orders)
+
+    with transaction.atomic():
+        ProductSalesDaily.objects.all().delete()
+        ProductSalesDaily.objects.bulk_create([
+            ProductSalesDaily(product_id=product_id, date=day, quantity=sold, orders=len(orders), revenue=revenue)
+            for (product_id, day), (sold, revenue, orders) in rollup.items()
+        ], batch_size=1000)
+    transaction.on_commit(lambda: bump_cache_version('sales_rankings'))
+    return len(rollup)
+
+
+def build_sales_rankings(size=RANKING_SIZE):
+    """
+    Rank products from the rollup: best sellers by units sold overall,
+    trending by paid orders in the last TRENDING_DAYS (newer products first on ties)
+    Returns: {'best_sellers': [product_id, ...], 'trending': [product_id, ...]}
+    """
+    best_sellers = ProductSalesDaily.objects.values('product_id').annotate(
+        sold=Sum('quantity')
+    ).filter(sold__gt=0).order_by('-sold', 'product_id')
+
+    since = timezone.localdate() - timedelta(days=TRENDING_DAYS)
+    trending = ProductSalesDaily.objects.filter(date__gte=since).values('product_id').annotate(
+        recent_orders=Sum('orders')
+    ).filter(recent_orders__gt=0).order_by('-recent_orders', '-product__created_at')
+
+    return {
+        'best_sellers': [row['product_id'] for row in best_sellers[:size]],
+        'trending': [row['product_id'] for row in trending[:size]],
+    }
+
+
+def get_sales_rankings():
+    """Cached rankings; the key includes today's date because the trending window moves daily"""
+    return get_versioned('sales_rankings', build_sales_rankings, timeout=3600, key=str(timezone.localdate()))
+
+
+def ranked_products(product_ids, limit):
+    """Active products for ranked IDs, in rank order, at most limit (one query)"""
+    products = Product.objects.filter(is_active=True).in_bulk(product_ids)
+    return [products[pk] for pk in product_ids if pk in products][:limit]
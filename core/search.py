@@ -0,0 +1,232 @@
+"""
+Product full-text search
+Backed by SQLite FTS5 or MySQL FULLTEXT indexes over ProductSearchDocument,
+chosen by database backend. The product query is joined to the index
+(through the search_index / search_document relations) and ordered by its
+relevance score in SQL, so every match is returned and pages seek on the score. Other backends (and queries the index cannot serve) fall
+back to icontains filtering.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import BooleanField, FloatField, IntegerField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Product, ProductSearchDocument, ProductSearchIndex
+
+DOCUMENT_TABLE = ProductSearchDocument._meta.db_table
+FTS_TABLE = ProductSearchIndex._meta.db_table
+DOCUMENT_FIELDS = ['name', 'sku', 'brand', 'categories', 'body']
+
+# Terms per query, to keep MATCH expressions small
+MAX_TERMS = 8
+# InnoDB's default innodb_ft_min_token_size; shorter terms never match on MySQL
+MYSQL_MIN_TOKEN_SIZE = 3
+
+# Product fields copied into the search document
+INDEXED_PRODUCT_FIELDS = {
+    'name', 'sku', 'brand', 'category', 'sub_category', 'child_category',
+    'short_description', 'long_description',
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_document(product):
+    """Unsaved ProductSearchDocument for product (select_related brand and categories)"""
+    categories = [c.name for c in (product.category, product.sub_category, product.child_category) if c]
+    body = [strip_tags(text) for text in (product.short_description, product.long_description) if text]
+    return ProductSearchDocument(
+        product_id=product.pk,
+        name=product.name,
+        sku=product.sku,
+        brand=product.brand.name if product.brand else '',
+        categories=' '.join(categories),
+        body=' '.join(body),
+    )
+
+
+def index_products(product_ids=None, batch_size=500):
+    """
+    Write search documents for products in bulk (all products if product_ids is None)
+    Returns: number of documents written
+    """
+    products = Product.objects.select_related('brand', 'category', 'sub_category', 'child_category')
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+
+    upsert = {'update_conflicts': True, 'update_fields': DOCUMENT_FIELDS + ['updated_at']}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['product']
+
+    written = 0
+    documents = []
+    for product in products.iterator(chunk_size=batch_size):
+        documents.append(build_document(product))
+        if len(documents) >= batch_size:
+            ProductSearchDocument.objects.bulk_create(documents, **upsert)
+            written += len(documents)
+            documents = []
+
+    if documents:
+        ProductSearchDocument.objects.bulk_create(documents, **upsert)
+        written += len(documents)
+
+    return written
+
+
+def _sqlite_ensure_index(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"name, sku, brand, categories, body, "
+        f"content='{DOCUMENT_TABLE}', content_rowid='product_id', tokenize='unicode61')"
+    )
+    columns = ', '.join(DOCUMENT_FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in DOCUMENT_FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in DOCUMENT_FIELDS)
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.product_id, {new_values});"
+    delete = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.product_id, {old_values});"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN {insert} END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN {delete} END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN {delete} {insert} END"
+    )
+
+
+def _sqlite_drop_index(cursor):
+    for trigger in ('ai', 'ad', 'au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def _sqlite_rebuild_index(cursor):
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _sqlite_search(terms):
+    # Terms are \w+ only, so quoting them is safe; trailing * makes each a prefix query
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return (
+        'search_index', f"{FTS_TABLE} MATCH %s", [match],
+        f"bm25({FTS_TABLE}, 10.0, 10.0, 4.0, 3.0, 1.0)", [],
+    )
+
+
+MYSQL_INDEXES = {
+    'core_productsearch_ft': DOCUMENT_FIELDS,
+    'core_productsearch_name_ft': ['name'],
+}
+
+
+def _mysql_existing_indexes(cursor):
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        [DOCUMENT_TABLE]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _mysql_ensure_index(cursor):
+    existing = _mysql_existing_indexes(cursor)
+    for index_name, fields in MYSQL_INDEXES.items():
+        if index_name not in existing:
+            cursor.execute(f"CREATE FULLTEXT INDEX {index_name} ON {DOCUMENT_TABLE} ({', '.join(fields)})")
+
+
+def _mysql_drop_index(cursor):
+    existing = _mysql_existing_indexes(cursor)
+    for index_name in MYSQL_INDEXES:
+        if index_name in existing:
+            cursor.execute(f"DROP INDEX {index_name} ON {DOCUMENT_TABLE}")
+
+
+def _mysql_rebuild_index(cursor):
+    cursor.execute(f"OPTIMIZE TABLE {DOCUMENT_TABLE}")
+
+
+def _mysql_search(terms):
+    terms = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN_SIZE]
+    if not terms:
+        return None
+    against = ' '.join(f'+{term}*' for term in terms)
+    columns = ', '.join(f'{DOCUMENT_TABLE}.{field}' for field in DOCUMENT_FIELDS)
+    score = f"MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)"
+    return (
+        'search_document', score, [against],
+        f"-(3 * MATCH({DOCUMENT_TABLE}.name) AGAINST (%s IN BOOLEAN MODE) + {score})", [against, against],
+    )
+
+
+# vendor -> (ensure index, drop index, rebuild index, search)
+# search(terms) returns the Product relation to join the index through, the match
+# condition and params and the rank expression and params (lower is better), both
+# on the index table, or None if the index can't serve the terms
+BACKENDS = {
+    'sqlite': (_sqlite_ensure_index, _sqlite_drop_index, _sqlite_rebuild_index, _sqlite_search),
+    'mysql': (_mysql_ensure_index, _mysql_drop_index, _mysql_rebuild_index, _mysql_search),
+}
+
+
+def _run_ddl(operation, using):
+    db = connections[using]
+    backend = BACKENDS.get(db.vendor)
+    if backend:
+        with db.cursor() as cursor:
+            backend[operation](cursor)
+
+
+def ensure_search_index(using=DEFAULT_DB_ALIAS):
+    """Create the backend's full-text index over ProductSearchDocument if missing (used by migration 0030)"""
+    _run_ddl(0, using)
+
+
+def drop_search_index(using=DEFAULT_DB_ALIAS):
+    """Drop the backend's full-text index over ProductSearchDocument if present"""
+    _run_ddl(1, using)
+
+
+def rebuild_search_index(batch_size=500):
+    """
+    Re-create the full-text index and every search document
+    Returns: number of documents written
+    """
+    ensure_search_index()
+    ProductSearchDocument.objects.exclude(product__in=Product.objects.all()).delete()
+    written = index_products(batch_size=batch_size)
+    _run_ddl(2, DEFAULT_DB_ALIAS)
+    return written
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset to matches for query, ordered by relevance
+    (annotated as search_rank, lower is better; 0 for every icontains match)
+    Returns: QuerySet
+    """
+    backend = BACKENDS.get(connection.vendor)
+    terms = _TERM_RE.findall(query.lower())[:MAX_TERMS]
+    search = backend[3](terms) if backend and terms else None
+    if search is None:
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(sku__icontains=query)
+        ).annotate(search_rank=Value(0, output_field=IntegerField())).order_by('search_rank', '-created_at')
+    relation, condition, params, rank, rank_params = search
+    # The index is joined rather than queried per row (a correlated score subquery
+    # re-runs the match for every product), so the score can be selected, filtered
+    # on by cursor pages and sorted on in the same query
+    return queryset.filter(**{f'{relation}__isnull': False}).filter(
+        RawSQL(condition, params, output_field=BooleanField())
+    ).annotate(
+        search_rank=RawSQL(rank, rank_params, output_field=FloatField())
+    ).order_by('search_rank')
@@ -1,31 +1,61 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.db import transaction as db_transaction
 from decimal import Decimal
-from .models import Order, OrderItem, User, Transaction, Campaign
-from .stock_utils import deduct_stock
+from .models import (
+    Order, OrderItem, User, Transaction, Campaign, FlashDeal, StockReservation, Setting,
+    Category, SubCategory, ChildCategory, CMSPage, Product, Brand, ProductReview, Banner, Coupon
+)
+from .cache_utils import setting_cache, bump_cache_version
+from .search import index_products, INDEXED_PRODUCT_FIELDS
+from .pricing import flash_deal_index, refresh_effective_prices
+from .stock_utils import deduct_stock_bulk, release_reservations
+from .ratings import apply_rating_change
+from .sales import record_order_sales
 
 
 @receiver(pre_save, sender=Order)
 def process_stock_on_order_status_change(sender, instance, **kwargs):
     """
-    Deduct stock when order status changes to 'delivered' and payment_status is 'paid'.
+    Deduct stock when the order becomes 'delivered' and 'paid', whichever status changes last.
+    Release stock reservations when the order is cancelled and stop them from
+    expiring once the order leaves 'pending'.
     This runs before save to check the previous state.
     """
     if instance.pk:  # Only for existing orders
         try:
             old_order = Order.objects.get(pk=instance.pk)
-            # Check if order status changed to 'delivered' and payment_status is 'paid'
-            if (old_order.order_status != 'delivered' and instance.order_status == 'delivered' and 
-                instance.payment_status == 'paid'):
+            was_fulfilled = old_order.order_status == 'delivered' and old_order.payment_status == 'paid'
+            is_fulfilled = instance.order_status == 'delivered' and instance.payment_status == 'paid'
+            if is_fulfilled and not was_fulfilled:
                 # Process campaign rewards
                 process_campaign_rewards(instance)
                 # Deduct stock for all order items
                 deduct_stock_for_delivered_order(instance)
+            
+            if old_order.order_status != 'cancelled' and instance.order_status == 'cancelled':
+                release_reservations(StockReservation.objects.filter(order=instance))
+            elif old_order.order_status == 'pending' and instance.order_status != 'pending':
+                # Confirmed orders hold their stock until delivery or cancellation
+                StockReservation.objects.filter(order=instance, status='active').update(expires_at=None)
+            
+            # Daily sales rollup counts paid orders only
+            was_paid = old_order.payment_status == 'paid'
+            is_paid = instance.payment_status == 'paid'
+            if was_paid != is_paid:
+                record_order_sales(instance, 1 if is_paid else -1)
         except Order.DoesNotExist:
             pass
 
 
+@receiver(pre_delete, sender=Order)
+def release_reservations_on_order_delete(sender, instance, **kwargs):
+    """Return reserved stock of a deleted order to available stock and drop its sales from the rollup"""
+    release_reservations(StockReservation.objects.filter(order=instance))
+    if instance.payment_status == 'paid':
+        record_order_sales(instance, -1)
+
+
 def process_campaign_rewards(order):
     """
     Process campaign rewards for all order items that have a campaign and earn_code.
@@ -93,32 +123,282 @@ def deduct_stock_for_delivered_order(order):
     if order.order_status != 'delivered' or order.payment_status != 'paid':
         return
     
-    # Get all order items that haven't had stock deducted yet
-    order_items = OrderItem.objects.filter(
-        order=order,
-        stock_deducted=False
-    ).select_related('product')
-    
-    for order_item in order_items:
-        product = order_item.product
-        variant_combination = order_item.product_varient if order_item.product_varient else None
+    with db_transaction.atomic():
+        # Reserved units are now leaving the warehouse: convert the reservations first
+        # (reservations are always locked before stock rows)
+        release_reservations(StockReservation.objects.filter(order=order), status='converted')
         
-        # Deduct stock using the utility function
-        success, message = deduct_stock(
-            product=product,
-            quantity=order_item.quantity,
-            variant_combination=variant_combination,
+        # Lock the order items that haven't had stock deducted yet so a
+        # concurrent save of the same order cannot deduct them twice
+        order_items = list(OrderItem.objects.select_for_update().filter(
+            order=order,
+            stock_deducted=False
+        ).order_by('pk'))
+        
+        # Deduct stock for the whole order: one lock query per table, one bulk update per table
+        results = deduct_stock_bulk(
+            [(item.product_id, item.quantity, item.product_varient or None) for item in order_items],
             order_id=order.id,
             user=order.user,
-            reason=f'Order #{order.id} delivered and paid - Item #{order_item.id}'
+            reason=f'Order #{order.id} delivered and paid'
         )
         
-        if success:
-            # Mark stock as deducted to prevent duplicate deduction
-            order_item.stock_deducted = True
-            order_item.save(update_fields=['stock_deducted'])
+        deducted_items = []
+        for order_item, (success, message) in zip(order_items, results):
+            if success:
+                # Mark stock as deducted to prevent duplicate deduction
+                order_item.stock_deducted = True
+                deducted_items.append(order_item)
+            else:
+                # Log the error but don't fail the order update
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.warning(f'Failed to deduct stock for Order #{order.id}, Item #{order_item.id}: {message}')
+        
+        if deducted_items:
+            OrderItem.objects.bulk_update(deducted_items, ['stock_deducted'])
+
+
+@receiver(post_save, sender=FlashDeal)
+@receiver(post_delete, sender=FlashDeal)
+@receiver(m2m_changed, sender=FlashDeal.products.through)
+def invalidate_flash_deal_index(sender, **kwargs):
+    """Rebuild the in-process flash deal index after any flash deal change"""
+    flash_deal_index.invalidate()
+    # Invalidate again once committed so no reader caches pre-commit state
+    db_transaction.on_commit(flash_deal_index.invalidate)
+
+
+def schedule_effective_price_refresh(product_ids):
+    """Recompute effective prices for product_ids once the current transaction commits"""
+    product_ids = set(product_ids)
+    if product_ids:
+        db_transaction.on_commit(lambda: refresh_effective_prices(product_ids))
+
+
+@receiver(post_save, sender=FlashDeal)
+def refresh_prices_on_flash_deal_save(sender, instance, **kwargs):
+    """Flash deal discount, time window or status changed"""
+    schedule_effective_price_refresh(instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=FlashDeal)
+def refresh_prices_on_flash_deal_delete(sender, instance, **kwargs):
+    """Capture product IDs before the m2m rows are deleted with the deal"""
+    schedule_effective_price_refresh(instance.products.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=FlashDeal.products.through)
+def refresh_prices_on_flash_deal_products_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Products added to or removed from a flash deal"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # product.flash_deals.add/remove/clear
+        schedule_effective_price_refresh([instance.pk])
+    elif action == 'pre_clear':
+        schedule_effective_price_refresh(instance.products.values_list('pk', flat=True))
+    else:
+        schedule_effective_price_refresh(pk_set or [])
+
+
+@receiver(post_save, sender=Setting)
+@receiver(post_delete, sender=Setting)
+def invalidate_setting_cache(sender, **kwargs):
+    """Reload the cached Setting singleton in every process after a change"""
+    setting_cache.invalidate()
+    db_transaction.on_commit(setting_cache.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ChildCategory)
+@receiver(post_delete, sender=ChildCategory)
+@receiver(post_save, sender=CMSPage)
+@receiver(post_delete, sender=CMSPage)
+def invalidate_navigation_cache(sender, **kwargs):
+    """Rebuild cached header/footer navigation after a category or CMS page change"""
+    bump_cache_version('navigation')
+    db_transaction.on_commit(lambda: bump_cache_version('navigation'))
+
+
+def schedule_search_index_update(product_ids):
+    """Re-index search documents for product_ids once the current transaction commits"""
+    product_ids = list(product_ids)
+    if product_ids:
+        db_transaction.on_commit(lambda: index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def update_search_document_on_product_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the product's search document in sync (skipped for saves of non-indexed fields)"""
+    if update_fields is not None and not set(update_fields) & INDEXED_PRODUCT_FIELDS:
+        return
+    schedule_search_index_update([instance.pk])
+
+
+def _related_product_ids(sender, instance):
+    """IDs of products whose search document includes this brand/category name"""
+    lookup = {
+        Brand: 'brand',
+        Category: 'category',
+        SubCategory: 'sub_category',
+        ChildCategory: 'child_category',
+    }[sender]
+    return list(Product.objects.filter(**{lookup: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=ChildCategory)
+def update_search_documents_on_taxonomy_save(sender, instance, created, **kwargs):
+    """Re-index products after a brand or category rename"""
+    if not created:
+        schedule_search_index_update(_related_product_ids(sender, instance))
+
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=SubCategory)
+@receiver(pre_delete, sender=ChildCategory)
+def update_search_documents_on_taxonomy_delete(sender, instance, **kwargs):
+    """Re-index products whose brand or category is being deleted (the FK is set to NULL)"""
+    schedule_search_index_update(_related_product_ids(sender, instance))
+
+
+# Product fields that change which facet bucket (or price range) a product falls in
+FACET_PRODUCT_FIELDS = {
+    'is_active', 'brand', 'category', 'sub_category', 'child_category', 'effective_price',
+} | INDEXED_PRODUCT_FIELDS
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ChildCategory)
+@receiver(post_delete, sender=ChildCategory)
+def invalidate_facet_cache(sender, update_fields=None, **kwargs):
+    """Recount cached storefront facets after a product or taxonomy change"""
+    if update_fields is not None and not set(update_fields) & FACET_PRODUCT_FIELDS:
+        return
+    bump_cache_version('product_facets')
+    # Search documents are re-indexed on commit, so bump again once they are
+    db_transaction.on_commit(lambda: bump_cache_version('product_facets'))
+
+
+def refresh_category_ancestry(products):
+    """Recompute denormalized category ancestry for a Product queryset in bulk"""
+    products = products.select_related('sub_category', 'child_category__sub_category')
+    changed = [product for product in products if product.refresh_category_ancestry()]
+    Product.objects.bulk_update(changed, ['ancestor_category', 'ancestor_sub_category'], batch_size=500)
+
+
+@receiver(post_save, sender=SubCategory)
+def update_category_ancestry_on_subcategory_save(sender, instance, **kwargs):
+    """Move products along when a subcategory is re-parented"""
+    refresh_category_ancestry(
+        Product.objects.filter(ancestor_sub_category=instance).exclude(ancestor_category_id=instance.category_id)
+    )
+
+
+@receiver(post_save, sender=ChildCategory)
+def update_category_ancestry_on_childcategory_save(sender, instance, **kwargs):
+    """Move products along when a child category is re-parented"""
+    refresh_category_ancestry(
+        Product.objects.filter(child_category=instance).exclude(ancestor_sub_category_id=instance.sub_category_id)
+    )
+
+
+@receiver(pre_delete, sender=SubCategory)
+@receiver(pre_delete, sender=ChildCategory)
+def collect_category_ancestry_on_delete(sender, instance, **kwargs):
+    """Remember products whose ancestry runs through a category being deleted"""
+    lookup = 'ancestor_sub_category' if sender is SubCategory else 'child_category'
+    instance._ancestry_product_ids = list(
+        Product.objects.filter(**{lookup: instance}).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=ChildCategory)
+def update_category_ancestry_on_delete(sender, instance, **kwargs):
+    """Fall back to the remaining categories once the deleted one is set to NULL"""
+    product_ids = getattr(instance, '_ancestry_product_ids', None)
+    if product_ids:
+        refresh_category_ancestry(Product.objects.filter(pk__in=product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_save, sender=FlashDeal)
+@receiver(post_delete, sender=FlashDeal)
+@receiver(m2m_changed, sender=FlashDeal.products.through)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=ChildCategory)
+@receiver(post_delete, sender=ChildCategory)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Drop cached storefront listings after a catalog change"""
+    bump_cache_version('catalog')
+    db_transaction.on_commit(lambda: bump_cache_version('catalog'))
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_cache(sender, **kwargs):
+    """Drop cached coupon lookups after a coupon is edited or deleted"""
+    bump_cache_version('coupons')
+    db_transaction.on_commit(lambda: bump_cache_version('coupons'))
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_home_cache(sender, **kwargs):
+    """Drop the cached home page after a banner change (catalog changes bump 'catalog')"""
+    bump_cache_version('home')
+    db_transaction.on_commit(lambda: bump_cache_version('home'))
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored product/star of an edited review for the post_save delta"""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = ProductReview.objects.filter(
+            pk=instance.pk
+        ).values_list('product_id', 'star').first()
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_review_save(sender, instance, created, **kwargs):
+    """Apply a new or edited review to the product's rating aggregates"""
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        apply_rating_change(instance.product_id, added=instance.star)
+    elif previous != (instance.product_id, instance.star):
+        previous_product_id, previous_star = previous
+        if previous_product_id == instance.product_id:
+            apply_rating_change(instance.product_id, added=instance.star, removed=previous_star)
         else:
-            # Log the error but don't fail the order update
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f'Failed to deduct stock for Order #{order.id}, Item #{order_item.id}: {message}')
+            apply_rating_change(previous_product_id, removed=previous_star)
+            apply_rating_change(instance.product_id, added=instance.star)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """Remove a deleted review from the product's rating aggregates"""
+    apply_rating_change(instance.product_id, removed=instance.star)
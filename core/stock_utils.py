@@ -1,9 +1,81 @@
 """
 Stock management utility functions
 """
-from django.db import transaction
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
 from decimal import Decimal
-from .models import Product
+from .cache_utils import bump_cache_version
+from .models import Product, ProductVariant, StockMovement, StockReservation
+
+
+def lock_for_write(using=DEFAULT_DB_ALIAS):
+    """
+    Take the database write lock for the current transaction before reading rows it will update.
+    select_for_update locks the rows on MySQL; SQLite ignores it, and a transaction that reads
+    before writing fails with "database is locked" if another writer got in first. A no-op
+    UPDATE takes SQLite's write lock up front instead (waiting out the busy timeout).
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {Product._meta.db_table} SET id = id WHERE 0')
+
+
+def _variant_rows(product, variant_combination):
+    """QuerySet for the ProductVariant row of variant_combination (empty if none)"""
+    if not variant_combination or not product.product_varient:
+        return ProductVariant.objects.none()
+    return ProductVariant.objects.filter(product_id=product.pk, combination=variant_combination)
+
+
+def _variants_enabled(product):
+    """Product.stock is the sum of variant stock only when variants are enabled"""
+    return bool(product.product_varient and product.product_varient.get('enabled', False))
+
+
+def _apply_variant_delta(product, variant_combination, delta):
+    """Move Product.stock along with a variant and refresh the caller's instance"""
+    if _variants_enabled(product):
+        Product.objects.filter(pk=product.pk).update(stock=F('stock') + delta)
+    product.refresh_from_db(fields=['stock'])
+    variant = product.get_variant(variant_combination)
+    if variant:
+        variant.refresh_from_db(fields=['stock'])
+
+
+def _build_movement(product, quantity, movement_type, variant_combination=None, variant=None,
+                    reason=None, user=None, reference=None, reference_type=None):
+    """Unsaved StockMovement carrying the balances currently on product/variant"""
+    return StockMovement(
+        product_id=product.pk,
+        variant_combination=variant_combination or None,
+        movement_type=movement_type,
+        quantity=quantity,
+        balance_after=product.stock,
+        variant_balance_after=variant.stock if variant else None,
+        reason=reason,
+        reference_type=reference_type,
+        reference=reference,
+        user=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def _invalidate_listings_on_stock_out(movements):
+    """Cached storefront listings show in/out of stock; refresh them when a product crosses zero"""
+    if any((m.balance_after > 0) != (m.balance_after - m.quantity > 0) for m in movements):
+        transaction.on_commit(lambda: bump_cache_version('catalog'))
+
+
+def _record_movement(product, quantity, movement_type, variant_combination=None, **kwargs):
+    """Insert the ledger row for a single-item stock change"""
+    variant = product.get_variant(variant_combination) if variant_combination else None
+    movement = _build_movement(product, quantity, movement_type, variant_combination, variant, **kwargs)
+    movement.save()
+    _invalidate_listings_on_stock_out([movement])
 
 
 def deduct_stock(product, quantity, variant_combination=None, order_id=None, user=None, reason=None):
@@ -11,39 +83,37 @@ def deduct_stock(product, quantity, variant_combination=None, order_id=None, use
     Deduct stock from product (main or variant)
     Returns: (success: bool, message: str)
     """
+    movement_fields = {
+        'reason': reason,
+        'user': user,
+        'reference': str(order_id) if order_id else None,
+        'reference_type': 'order' if order_id else None,
+    }
     try:
         with transaction.atomic():
-            # Get current stock
-            if variant_combination and product.product_varient:
-                combinations = product.product_varient.get('combinations', {})
-                if variant_combination in combinations:
-                    previous_stock = combinations[variant_combination].get('stock', product.stock)
-                    if previous_stock < quantity:
-                        return False, f"Insufficient stock. Available: {previous_stock}, Requested: {quantity}"
-                    
-                    # Deduct from variant
-                    combinations[variant_combination]['stock'] = previous_stock - quantity
-                    product.product_varient['combinations'] = combinations
-                    product.save(update_fields=['product_varient'])
-                else:
-                    # Variant doesn't exist, use main stock
-                    previous_stock = product.stock
-                    if previous_stock < quantity:
-                        return False, f"Insufficient stock. Available: {previous_stock}, Requested: {quantity}"
-                    
-                    product.stock -= quantity
-                    product.save(update_fields=['stock'])
-            else:
-                # Deduct from main stock
-                previous_stock = product.stock
-                if previous_stock < quantity:
-                    return False, f"Insufficient stock. Available: {previous_stock}, Requested: {quantity}"
-                
-                product.stock -= quantity
-                product.save(update_fields=['stock'])
-            
+            variant_rows = _variant_rows(product, variant_combination)
+            # Deduct from variant: UPDATE ... SET stock = stock - n WHERE stock >= n (single row)
+            if variant_rows.filter(stock__gte=quantity).update(stock=F('stock') - quantity):
+                _apply_variant_delta(product, variant_combination, -quantity)
+                _record_movement(product, -quantity, 'deduct', variant_combination, **movement_fields)
+                return True, "Stock deducted successfully"
+
+            previous_stock = variant_rows.values_list('stock', flat=True).first()
+            if previous_stock is not None:
+                return False, f"Insufficient stock. Available: {previous_stock}, Requested: {quantity}"
+
+            # Variant doesn't exist, deduct from main stock
+            updated = Product.objects.filter(pk=product.pk, stock__gte=quantity).update(
+                stock=F('stock') - quantity
+            )
+            if not updated:
+                available = Product.objects.filter(pk=product.pk).values_list('stock', flat=True).first() or 0
+                return False, f"Insufficient stock. Available: {available}, Requested: {quantity}"
+
+            product.refresh_from_db(fields=['stock'])
+            _record_movement(product, -quantity, 'deduct', **movement_fields)
             return True, "Stock deducted successfully"
-            
+
     except Exception as e:
         return False, f"Error deducting stock: {str(e)}"
 
@@ -53,27 +123,21 @@ def add_stock(product, quantity, variant_combination=None, reason=None, user=Non
     Add stock to product (main or variant)
     Returns: (success: bool, message: str)
     """
+    movement_fields = {'reason': reason, 'user': user, 'reference': reference, 'reference_type': reference_type}
     try:
         with transaction.atomic():
-            # Get current stock
-            if variant_combination and product.product_varient:
-                combinations = product.product_varient.get('combinations', {})
-                if variant_combination in combinations:
-                    previous_stock = combinations[variant_combination].get('stock', product.stock)
-                    combinations[variant_combination]['stock'] = previous_stock + quantity
-                    product.product_varient['combinations'] = combinations
-                    product.save(update_fields=['product_varient'])
-                else:
-                    # Variant doesn't exist, use main stock
-                    product.stock += quantity
-                    product.save(update_fields=['stock'])
-            else:
-                # Add to main stock
-                product.stock += quantity
-                product.save(update_fields=['stock'])
-            
+            if _variant_rows(product, variant_combination).update(stock=F('stock') + quantity):
+                _apply_variant_delta(product, variant_combination, quantity)
+                _record_movement(product, quantity, 'add', variant_combination, **movement_fields)
+                return True, "Stock added successfully"
+
+            # Variant doesn't exist, add to main stock: UPDATE ... SET stock = stock + n
+            Product.objects.filter(pk=product.pk).update(stock=F('stock') + quantity)
+            product.refresh_from_db(fields=['stock'])
+            _record_movement(product, quantity, 'add', **movement_fields)
+
             return True, "Stock added successfully"
-            
+
     except Exception as e:
         return False, f"Error adding stock: {str(e)}"
 
@@ -83,41 +147,281 @@ def adjust_stock(product, new_stock, variant_combination=None, reason=None, user
     Adjust stock to a specific quantity
     Returns: (success: bool, message: str)
     """
+    movement_fields = {'reason': reason, 'user': user}
     try:
         with transaction.atomic():
-            # Get current stock
-            if variant_combination and product.product_varient:
-                combinations = product.product_varient.get('combinations', {})
-                if variant_combination in combinations:
-                    combinations[variant_combination]['stock'] = new_stock
-                    product.product_varient['combinations'] = combinations
-                    product.save(update_fields=['product_varient'])
-                else:
-                    product.stock = new_stock
-                    product.save(update_fields=['stock'])
-            else:
-                product.stock = new_stock
-                product.save(update_fields=['stock'])
-            
+            lock_for_write()
+            # Lock the variant row so the delta applied to Product.stock is exact
+            variant = _variant_rows(product, variant_combination).select_for_update().first()
+            if variant:
+                delta = new_stock - variant.stock
+                ProductVariant.objects.filter(pk=variant.pk).update(stock=new_stock)
+                _apply_variant_delta(product, variant_combination, delta)
+                _record_movement(product, delta, 'adjust', variant_combination, **movement_fields)
+                return True, "Stock adjusted successfully"
+
+            previous_stock = Product.objects.select_for_update().filter(
+                pk=product.pk
+            ).values_list('stock', flat=True).first() or 0
+            Product.objects.filter(pk=product.pk).update(stock=new_stock)
+            product.stock = new_stock
+            _record_movement(product, new_stock - previous_stock, 'adjust', **movement_fields)
+
             return True, "Stock adjusted successfully"
-            
+
     except Exception as e:
         return False, f"Error adjusting stock: {str(e)}"
 
 
+def _lock_stock_rows(items):
+    """
+    Lock every variant and product row touched by items, one query each.
+    Variants are locked before products (the order the single-item helpers
+    update them in) and rows are locked in pk order to avoid deadlocks.
+    Returns: ({product_id: Product}, {(product_id, combination): ProductVariant})
+    """
+    lock_for_write()
+    product_ids = {product_id for product_id, _, _ in items}
+    combinations = {combination for _, _, combination in items if combination}
+
+    variants = {}
+    if combinations:
+        variant_rows = ProductVariant.objects.select_for_update().filter(
+            product_id__in=product_ids, combination__in=combinations
+        ).order_by('pk')
+        variants = {(v.product_id, v.combination): v for v in variant_rows}
+
+    products = Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    return {p.pk: p for p in products}, variants
+
+
+BULK_SUCCESS_MESSAGES = {
+    'deduct': "Stock deducted successfully",
+    'add': "Stock added successfully",
+    'adjust': "Stock adjusted successfully",
+}
+
+
+def _apply_stock_bulk(items, movement_type, **movement_fields):
+    """
+    Apply stock changes for (product_id, quantity, variant_combination) items
+    to locked rows and write them back with one bulk_update per table.
+    quantity is the new stock level for 'adjust', the amount otherwise.
+    Movements are buffered and inserted with a single bulk_create.
+    Returns: list of (success: bool, message: str), one per item
+    """
+    items = [(product_id, quantity, combination or None) for product_id, quantity, combination in items]
+    if not items:
+        return []
+
+    with transaction.atomic():
+        products, variants = _lock_stock_rows(items)
+        changed_products = {}
+        changed_variants = {}
+        movements = []
+        results = []
+
+        for product_id, quantity, combination in items:
+            product = products.get(product_id)
+            if product is None:
+                results.append((False, f"Product #{product_id} not found"))
+                continue
+
+            variant = variants.get((product_id, combination)) if product.product_varient else None
+            current = variant.stock if variant else product.stock
+            if movement_type == 'adjust':
+                delta = quantity - current
+            else:
+                delta = quantity if movement_type == 'add' else -quantity
+
+            if delta == 0:
+                results.append((True, BULK_SUCCESS_MESSAGES[movement_type]))
+                continue
+
+            if current + delta < 0:
+                if movement_type == 'adjust':
+                    results.append((False, f"Stock cannot be negative: {quantity}"))
+                else:
+                    results.append((False, f"Insufficient stock. Available: {current}, Requested: {quantity}"))
+                continue
+
+            if variant:
+                variant.stock += delta
+                changed_variants[variant.pk] = variant
+                if _variants_enabled(product):
+                    product.stock += delta
+                    changed_products[product.pk] = product
+            else:
+                product.stock += delta
+                changed_products[product.pk] = product
+
+            movements.append(_build_movement(
+                product, delta, movement_type, combination if variant else None, variant, **movement_fields
+            ))
+            results.append((True, BULK_SUCCESS_MESSAGES[movement_type]))
+
+        if changed_variants:
+            ProductVariant.objects.bulk_update(changed_variants.values(), ['stock'])
+        if changed_products:
+            Product.objects.bulk_update(changed_products.values(), ['stock'])
+        if movements:
+            StockMovement.objects.bulk_create(movements)
+            _invalidate_listings_on_stock_out(movements)
+
+    return results
+
+
+def deduct_stock_bulk(items, order_id=None, user=None, reason=None):
+    """
+    Deduct stock for many items in a single transaction
+    items: iterable of (product_id, quantity, variant_combination)
+    Items that cannot be fulfilled are skipped; the rest are deducted.
+    Returns: list of (success: bool, message: str), one per item
+    """
+    items = list(items)
+    try:
+        return _apply_stock_bulk(
+            items, 'deduct', reason=reason, user=user,
+            reference=str(order_id) if order_id else None,
+            reference_type='order' if order_id else None
+        )
+    except Exception as e:
+        return [(False, f"Error deducting stock: {str(e)}")] * len(items)
+
+
+def add_stock_bulk(items, reason=None, user=None, reference=None, reference_type=None):
+    """
+    Add stock for many items in a single transaction
+    items: iterable of (product_id, quantity, variant_combination)
+    Returns: list of (success: bool, message: str), one per item
+    """
+    items = list(items)
+    try:
+        return _apply_stock_bulk(
+            items, 'add', reason=reason, user=user, reference=reference, reference_type=reference_type
+        )
+    except Exception as e:
+        return [(False, f"Error adding stock: {str(e)}")] * len(items)
+
+
+def adjust_stock_bulk(items, reason=None, user=None, reference=None, reference_type=None):
+    """
+    Set stock to specific quantities for many items in a single transaction
+    items: iterable of (product_id, new_stock, variant_combination)
+    Returns: list of (success: bool, message: str), one per item
+    """
+    items = list(items)
+    try:
+        return _apply_stock_bulk(
+            items, 'adjust', reason=reason, user=user, reference=reference, reference_type=reference_type
+        )
+    except Exception as e:
+        return [(False, f"Error adjusting stock: {str(e)}")] * len(items)
+
+
+def reserve_stock_bulk(order, items, expires_at=None):
+    """
+    Reserve stock for an order's items in a single transaction (all or nothing)
+    items: iterable of (product_id, quantity, variant_combination)
+    Rows are locked and checked against stock minus existing reservations,
+    so concurrent checkouts cannot both take the last units.
+    Returns: list of (success: bool, message: str), one per item
+    """
+    items = [(product_id, quantity, combination or None) for product_id, quantity, combination in items]
+    if not items:
+        return []
+    if expires_at is None:
+        expires_at = timezone.now() + timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 24 * 60))
+
+    with transaction.atomic():
+        products, variants = _lock_stock_rows(items)
+        changed_products = {}
+        changed_variants = {}
+        reservations = []
+        results = []
+
+        for product_id, quantity, combination in items:
+            product = products.get(product_id)
+            if product is None:
+                results.append((False, f"Product #{product_id} not found"))
+                continue
+
+            variant = variants.get((product_id, combination)) if product.product_varient else None
+            row = variant or product
+            available = row.stock - row.reserved_stock
+            if available < quantity:
+                results.append((False, f"Insufficient stock. Available: {max(0, available)}, Requested: {quantity}"))
+                continue
+
+            row.reserved_stock += quantity
+            if variant:
+                changed_variants[variant.pk] = variant
+                if _variants_enabled(product):
+                    product.reserved_stock += quantity
+                    changed_products[product.pk] = product
+            else:
+                changed_products[product.pk] = product
+
+            reservations.append(StockReservation(
+                order=order,
+                product_id=product_id,
+                variant_combination=combination if variant else '',
+                quantity=quantity,
+                expires_at=expires_at,
+            ))
+            results.append((True, "Stock reserved successfully"))
+
+        if len(reservations) == len(items):
+            ProductVariant.objects.bulk_update(changed_variants.values(), ['reserved_stock'])
+            Product.objects.bulk_update(changed_products.values(), ['reserved_stock'])
+            StockReservation.objects.bulk_create(reservations)
+
+    return results
+
+
+def release_reservations(reservations, status='released'):
+    """
+    Release active reservations from a StockReservation queryset and return
+    their quantities to available stock. Delivery passes status='converted'.
+    Returns: number of reservations released
+    """
+    with transaction.atomic():
+        lock_for_write()
+        reservations = list(reservations.select_for_update().filter(status='active').order_by('pk'))
+        if not reservations:
+            return 0
+
+        products, variants = _lock_stock_rows([
+            (r.product_id, r.quantity, r.variant_combination or None) for r in reservations
+        ])
+        changed_products = {}
+        changed_variants = {}
+
+        for reservation in reservations:
+            product = products[reservation.product_id]
+            variant = variants.get((reservation.product_id, reservation.variant_combination or None))
+            if variant:
+                variant.reserved_stock = max(0, variant.reserved_stock - reservation.quantity)
+                changed_variants[variant.pk] = variant
+            if not variant or _variants_enabled(product):
+                product.reserved_stock = max(0, product.reserved_stock - reservation.quantity)
+                changed_products[product.pk] = product
+
+        ProductVariant.objects.bulk_update(changed_variants.values(), ['reserved_stock'])
+        Product.objects.bulk_update(changed_products.values(), ['reserved_stock'])
+        StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).update(
+            status=status, updated_at=timezone.now()
+        )
+
+    return len(reservations)
+
+
 def validate_stock_availability(product, quantity, variant_combination=None):
     """
-    Validate if sufficient stock is available
+    Validate if sufficient stock is available (net of active reservations)
     Returns: (is_available: bool, available_quantity: int, message: str)
     """
-    if variant_combination and product.product_varient:
-        combinations = product.product_varient.get('combinations', {})
-        if variant_combination in combinations:
-            available = combinations[variant_combination].get('stock', product.stock)
-        else:
-            available = product.stock
-    else:
-        available = product.stock
+    available = product.get_available_stock(variant_combination)
     
     if available >= quantity:
         return True, available, "Stock available"
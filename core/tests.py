@@ -1,3 +1,446 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib import admin
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .admin import ProductAdmin
+from .cache_utils import SettingCache, bump_cache_version, get_setting, setting_cache
+from .coupons import redeem_coupon
+from .models import (
+    Address, Coupon, CouponRedemption, Order, OrderItem, Product, ProductReview, Setting, StockMovement,
+    StockReservation, User
+)
+from .pagination import CursorPaginator
+from .search import index_products, search_products
+from .stock_utils import deduct_stock, deduct_stock_bulk, reserve_stock_bulk
+
+
+def create_customer(email='customer@example.com'):
+    """Returns: (User, Address)"""
+    user = User.objects.create_user(email, 'Customer')
+    address = Address.objects.create(
+        title='Home', user=user, phone='9800000000', address='Street 1', city='Kathmandu',
+        state='Bagmati', country='Nepal'
+    )
+    return user, address
+
+
+def run_concurrently(target, count):
+    """Run target(index) in count threads started together; each thread closes its connection"""
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class StockDeductionConcurrencyTests(TransactionTestCase):
+    """Concurrent deductions of one SKU never oversell it"""
+    STOCK = 5
+    THREADS = 12
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Plain', sku='PLAIN', regular_price=Decimal('100.00'), stock=self.STOCK
+        )
+        self.variant_product = Product.objects.create(
+            name='Variant', sku='VARIANT', regular_price=Decimal('100.00'), stock=0,
+            product_varient={'enabled': True, 'combinations': {
+                'red/xl': {'price': 120, 'stock': self.STOCK, 'is_primary': True},
+                'blue/m': {'price': 90, 'stock': 3},
+            }},
+        )
+        self.variant_product.sync_variants_from_json()
+
+    def deduct_concurrently(self, deduct):
+        results = []
+        lock = threading.Lock()
+
+        def target(index):
+            success, message = deduct(index)
+            with lock:
+                results.append(success)
+
+        run_concurrently(target, self.THREADS)
+        return results
+
+    def assert_ledger_matches(self, product_id, initial_stock, final_stock, variant_combination=None):
+        movements = StockMovement.objects.filter(product_id=product_id, variant_combination=variant_combination)
+        deducted = movements.aggregate(total=Sum('quantity'))['total'] or 0
+        self.assertEqual(initial_stock + deducted, final_stock)
+        self.assertEqual(movements.count(), self.STOCK)
+        self.assertTrue(all(m.quantity == -1 and m.movement_type == 'deduct' for m in movements))
+
+    def test_deduct_stock_main_product(self):
+        results = self.deduct_concurrently(
+            lambda index: deduct_stock(Product.objects.get(pk=self.product.pk), 1, order_id=index + 1)
+        )
+
+        self.assertEqual(results.count(True), self.STOCK)
+        stock = Product.objects.get(pk=self.product.pk).stock
+        self.assertEqual(stock, 0)
+        self.assert_ledger_matches(self.product.pk, self.STOCK, stock)
+
+    def test_deduct_stock_variant(self):
+        results = self.deduct_concurrently(
+            lambda index: deduct_stock(Product.objects.get(pk=self.variant_product.pk), 1, 'red/xl')
+        )
+
+        self.assertEqual(results.count(True), self.STOCK)
+        product = Product.objects.get(pk=self.variant_product.pk)
+        variant = product.variants.get(combination='red/xl')
+        self.assertEqual(variant.stock, 0)
+        self.assertEqual(product.variants.get(combination='blue/m').stock, 3)
+        self.assertEqual(product.stock, 3)
+        self.assert_ledger_matches(product.pk, self.STOCK, variant.stock, 'red/xl')
+
+    def test_deduct_stock_bulk_main_product_and_variant(self):
+        results = self.deduct_concurrently(lambda index: deduct_stock_bulk([
+            (self.product.pk, 1, None),
+            (self.variant_product.pk, 1, 'red/xl'),
+        ])[0])
+
+        self.assertEqual(results.count(True), self.STOCK)
+        stock = Product.objects.get(pk=self.product.pk).stock
+        variant_stock = self.variant_product.variants.get(combination='red/xl').stock
+        self.assertEqual(stock, 0)
+        self.assertEqual(variant_stock, 0)
+        self.assert_ledger_matches(self.product.pk, self.STOCK, stock)
+        self.assert_ledger_matches(self.variant_product.pk, self.STOCK, variant_stock, 'red/xl')
+
+
+class CouponRedemptionTests(TransactionTestCase):
+    """Concurrent checkouts can't redeem a coupon past its usage limit"""
+    USAGE_LIMIT = 3
+    THREADS = 10
+
+    def setUp(self):
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            coupon_code='SAVE10', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            discount_type='percentage', discount=Decimal('10.00'), usage_limit=self.USAGE_LIMIT,
+        )
+        self.user, _ = create_customer()
+
+    def test_concurrent_redemptions_stop_at_usage_limit(self):
+        results = []
+        lock = threading.Lock()
+
+        def target(index):
+            with transaction.atomic():
+                redemption = redeem_coupon(self.coupon, self.user, discount=Decimal('1.00'))
+            with lock:
+                results.append(redemption is not None)
+
+        run_concurrently(target, self.THREADS)
+
+        self.assertEqual(results.count(True), self.USAGE_LIMIT)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage, self.USAGE_LIMIT)
+        self.assertEqual(CouponRedemption.objects.filter(coupon=self.coupon).count(), self.USAGE_LIMIT)
+
+    def test_rolled_back_order_releases_the_use(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertIsNotNone(redeem_coupon(self.coupon, self.user))
+                raise RuntimeError('order failed')
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage, 0)
+        self.assertFalse(CouponRedemption.objects.exists())
+
+    def test_inactive_or_expired_coupon_is_not_redeemed(self):
+        Coupon.objects.filter(pk=self.coupon.pk).update(is_active=False)
+        self.assertIsNone(redeem_coupon(self.coupon, self.user))
+
+        Coupon.objects.filter(pk=self.coupon.pk).update(is_active=True, end_date=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(redeem_coupon(self.coupon, self.user))
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage, 0)
+
+
+class OrderFulfilmentTests(TestCase):
+    """Reservations are converted and stock deducted once an order is delivered and paid"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Plain', sku='PLAIN', regular_price=Decimal('100.00'), stock=10)
+        user, address = create_customer()
+        self.order = Order.objects.create(user=user, billing_address=address, shipping_address=address)
+        self.item = OrderItem.objects.create(order=self.order, product=self.product, quantity=3, price=Decimal('100.00'))
+        reserve_stock_bulk(self.order, [(self.product.pk, 3, None)])
+
+    def update_order(self, **fields):
+        order = Order.objects.get(pk=self.order.pk)
+        for name, value in fields.items():
+            setattr(order, name, value)
+        order.save()
+
+    def assert_fulfilled(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(self.product.reserved_stock, 0)
+        self.assertEqual(
+            list(StockReservation.objects.filter(order=self.order).values_list('status', flat=True)), ['converted']
+        )
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.stock_deducted)
+
+    def test_paid_then_delivered(self):
+        self.update_order(payment_status='paid')
+        self.update_order(order_status='delivered')
+
+        self.assert_fulfilled()
+
+    def test_delivered_then_paid(self):
+        self.update_order(order_status='delivered')
+        reservation = StockReservation.objects.get(order=self.order)
+        self.assertEqual(reservation.status, 'active')
+        self.assertIsNone(reservation.expires_at)
+
+        self.update_order(payment_status='paid')
+
+        self.assert_fulfilled()
+
+    def test_saving_fulfilled_order_again_does_not_deduct_twice(self):
+        self.update_order(order_status='delivered', payment_status='paid')
+        self.update_order(payment_status='pending')
+        self.update_order(payment_status='paid')
+
+        self.assert_fulfilled()
+        self.assertEqual(StockMovement.objects.filter(product=self.product).count(), 1)
+
+
+class ProductAdminSaveTests(TestCase):
+    """Saving a product with variants keeps the stock its variants have now"""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Variant', sku='VARIANT', regular_price=Decimal('100.00'), stock=0,
+            product_varient={'enabled': True, 'combinations': {
+                'red/xl': {'price': 120, 'stock': 5, 'is_primary': True},
+                'blue/m': {'price': 90, 'stock': 3},
+            }},
+        )
+        self.product.sync_variants_from_json()
+
+    def test_admin_save_after_deduction(self):
+        deduct_stock(Product.objects.get(pk=self.product.pk), 2, 'red/xl')
+
+        # product_varient still says red/xl has 5
+        product = Product.objects.get(pk=self.product.pk)
+        product.product_varient['combinations']['blue/m']['price'] = 95
+        ProductAdmin(Product, admin.site).save_model(None, product, None, True)
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.stock, 6)
+        variants = {variant.combination: variant for variant in product.variants.all()}
+        self.assertEqual(variants['red/xl'].stock, 3)
+        self.assertEqual(variants['blue/m'].stock, 3)
+        self.assertEqual(variants['blue/m'].price, Decimal('95'))
+
+    def test_new_combination_takes_posted_stock(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.product_varient['combinations']['green/s'] = {'price': 80, 'stock': 4}
+        product.sync_variants_from_json()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 12)
+        self.assertEqual(product.variants.get(combination='green/s').stock, 4)
+
+
+class ProductSearchTests(TestCase):
+    """Full-text search returns every match, ranked, and pages through all of them"""
+    MATCHES = 1005
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f'Green tea {i}', sku=f'TEA{i}', regular_price=Decimal('10.00'))
+            for i in range(cls.MATCHES - 1)
+        ] + [
+            Product(name='Honey jar', sku='HONEY', regular_price=Decimal('10.00'), short_description='Pairs with tea'),
+            Product(name='Rice', sku='RICE', regular_price=Decimal('10.00')),
+        ])
+        index_products()
+
+    def test_every_match_is_returned(self):
+        results = search_products(Product.objects.all(), 'tea')
+
+        self.assertEqual(results.count(), self.MATCHES)
+        self.assertFalse(results.filter(sku='RICE').exists())
+
+    def test_name_matches_rank_above_description_matches(self):
+        results = list(search_products(Product.objects.all(), 'tea').values_list('sku', flat=True))
+
+        self.assertEqual(results[-1], 'HONEY')
+
+    def test_cursor_pages_cover_all_matches_once(self):
+        paginator = CursorPaginator(search_products(Product.objects.all(), 'tea'), 100, ['search_rank', '-created_at'])
+        seen = []
+        page = paginator.get_page(None)
+        seen.extend(product.pk for product in page)
+        while page.has_next():
+            page = paginator.get_page(page.next_page_number())
+            seen.extend(product.pk for product in page)
+
+        self.assertEqual(len(seen), self.MATCHES)
+        self.assertEqual(len(set(seen)), self.MATCHES)
+        self.assertEqual(page.number, 11)
+
+
+class CursorPaginatorTests(TestCase):
+    """Cursor tokens stay stable when sort values tie (pk breaks the tie)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', sku=f'SKU{i}', regular_price=Decimal('10.00')) for i in range(7)
+        ])
+        # Every row shares one created_at
+        Product.objects.update(created_at=timezone.now())
+
+    def paginator(self):
+        return CursorPaginator(Product.objects.all(), 3, ['-created_at'])
+
+    def test_pages_forward_without_gaps_or_repeats(self):
+        pages = [self.paginator().get_page(None)]
+        while pages[-1].has_next():
+            pages.append(self.paginator().get_page(pages[-1].next_page_number()))
+
+        pks = [product.pk for page in pages for product in page]
+        self.assertEqual(pks, list(Product.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)))
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+
+    def test_same_token_returns_same_page(self):
+        token = self.paginator().get_page(None).next_page_number()
+
+        first = [product.pk for product in self.paginator().get_page(token)]
+        second = [product.pk for product in self.paginator().get_page(token)]
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), 3)
+
+    def test_previous_token_returns_previous_page(self):
+        first_page = self.paginator().get_page(None)
+        second_page = self.paginator().get_page(first_page.next_page_number())
+        third_page = self.paginator().get_page(second_page.next_page_number())
+
+        back = self.paginator().get_page(third_page.previous_page_number())
+
+        self.assertEqual([p.pk for p in back], [p.pk for p in second_page])
+        self.assertEqual(back.number, 2)
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+
+class ProductRatingTests(TestCase):
+    """Review changes keep Product.rating_avg, rating_count and rating_histogram in sync"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Tea', sku='TEA', regular_price=Decimal('10.00'))
+        self.other_product = Product.objects.create(name='Honey', sku='HONEY', regular_price=Decimal('10.00'))
+        self.users = [User.objects.create_user(f'user{i}@example.com', f'User {i}') for i in range(3)]
+
+    def assert_rating(self, product, histogram, rating_avg, rating_count):
+        product.refresh_from_db()
+        self.assertEqual(product.rating_histogram, histogram)
+        self.assertEqual(product.rating_avg, Decimal(rating_avg))
+        self.assertEqual(product.rating_count, rating_count)
+
+    def test_add_reviews(self):
+        ProductReview.objects.create(user=self.users[0], product=self.product, star=5)
+        ProductReview.objects.create(user=self.users[1], product=self.product, star=4)
+        ProductReview.objects.create(user=self.users[2], product=self.product, star=4)
+
+        self.assert_rating(self.product, [0, 0, 0, 2, 1], '4.33', 3)
+
+    def test_edit_review_star(self):
+        review = ProductReview.objects.create(user=self.users[0], product=self.product, star=5)
+        ProductReview.objects.create(user=self.users[1], product=self.product, star=3)
+
+        review.star = 1
+        review.save()
+
+        self.assert_rating(self.product, [1, 0, 1, 0, 0], '2.00', 2)
+
+    def test_move_review_to_another_product(self):
+        review = ProductReview.objects.create(user=self.users[0], product=self.product, star=5)
+
+        review.product = self.other_product
+        review.save()
+
+        self.assert_rating(self.product, [0, 0, 0, 0, 0], '0.00', 0)
+        self.assert_rating(self.other_product, [0, 0, 0, 0, 1], '5.00', 1)
+
+    def test_delete_review(self):
+        review = ProductReview.objects.create(user=self.users[0], product=self.product, star=2)
+        ProductReview.objects.create(user=self.users[1], product=self.product, star=4)
+
+        review.delete()
+
+        self.assert_rating(self.product, [0, 0, 0, 1, 0], '4.00', 1)
+
+    def test_out_of_range_stars_are_not_counted(self):
+        ProductReview.objects.create(user=self.users[0], product=self.product, star=5)
+        with self.assertLogs('core.ratings', 'WARNING'):
+            zero = ProductReview.objects.create(user=self.users[1], product=self.product, star=0)
+            six = ProductReview.objects.create(user=self.users[2], product=self.product, star=6)
+        self.assert_rating(self.product, [0, 0, 0, 0, 1], '5.00', 1)
+
+        # Fixing a bad star counts the new one; deleting a bad one changes nothing
+        with self.assertLogs('core.ratings', 'WARNING'):
+            zero.star = 3
+            zero.save()
+            six.delete()
+
+        self.assert_rating(self.product, [0, 0, 1, 0, 1], '4.00', 2)
+
+
+class SettingCacheTests(TestCase):
+    """get_setting() loads and reloads the Setting singleton without querying on every call"""
+
+    def test_missing_setting_is_not_created(self):
+        Setting.objects.all().delete()
+
+        setting = get_setting()
+
+        self.assertIsNone(setting.pk)
+        self.assertEqual(setting.low_stock_threshold, Setting().low_stock_threshold)
+        self.assertFalse(Setting.objects.exists())
+
+    def test_version_checked_once_per_interval(self):
+        Setting.objects.first() or Setting.objects.create()
+        get_setting()
+        with self.assertNumQueries(0):
+            get_setting()
+
+        # Another process saved the setting
+        Setting.objects.update(low_stock_threshold=3)
+        bump_cache_version('setting')
+        with self.assertNumQueries(0):
+            self.assertNotEqual(get_setting().low_stock_threshold, 3)
+
+        setting_cache._checked_at -= SettingCache.CHECK_INTERVAL
+        self.assertEqual(get_setting().low_stock_threshold, 3)
+
+    def test_reloads_after_save(self):
+        setting = Setting.objects.first() or Setting.objects.create()
+        setting.low_stock_threshold = 3
+        setting.save()
+
+        self.assertEqual(get_setting().low_stock_threshold, 3)
@@ -151,6 +151,7 @@ urlpatterns = [
     path('inventory/', inventory_views.inventory_dashboard, name='inventory_dashboard'),
     path('inventory/low-stock/', inventory_views.low_stock_list, name='low_stock_list'),
     path('inventory/bulk-update/', inventory_views.bulk_stock_update, name='bulk_stock_update'),
+    path('inventory/movements/', inventory_views.stock_movement_list, name='stock_movement_list'),
     
     # Reports
     path('reports/', report_views.reports_index, name='reports_index'),
@@ -2,7 +2,6 @@ from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
 from core.models import Category, SubCategory, ChildCategory
 from django.forms import modelform_factory
 from django import forms
@@ -1,10 +1,11 @@
 from django.shortcuts import render
 from myadmin.decorators import superuser_required
 from core.models import (
-    User, Product, Order, OrderItem, Category, 
-    SubCategory, ChildCategory, Brand, Banner, Coupon, Setting
+    User, Product, Order, Category, 
+    SubCategory, ChildCategory, Banner, Coupon
 )
-from django.db.models import Sum, Count, Q, F
+from core.cache_utils import get_setting
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
@@ -55,7 +56,7 @@ def dashboard(request):
     active_coupons = Coupon.objects.filter(is_active=True).count()
     
     # Get global low stock threshold from settings
-    setting = Setting.objects.first()
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     # Inventory statistics
@@ -2,18 +2,18 @@ from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, F
-from django.db import transaction
-from core.models import Product, Setting
-from django import forms
-from django.forms import modelform_factory
+from django.db.models import Q
+from core.models import Product, StockMovement
+from core.cache_utils import get_setting
+from core.stock_utils import adjust_stock_bulk
+from core.pagination import CursorPaginator
 
 
 @superuser_required
 def inventory_dashboard(request):
     """Inventory overview dashboard"""
     # Get global low stock threshold from settings
-    setting = Setting.objects.first()
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     total_products = Product.objects.count()
@@ -58,7 +58,7 @@ def inventory_dashboard(request):
 def low_stock_list(request):
     """List products with low stock"""
     # Get global low stock threshold from settings
-    setting = Setting.objects.first()
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     products = Product.objects.filter(
@@ -109,7 +109,7 @@ def bulk_stock_update(request):
         response['Content-Disposition'] = 'attachment; filename="stock_export.csv"'
         
         # Get global low stock threshold from settings
-        setting = Setting.objects.first()
+        setting = get_setting()
         low_stock_threshold = setting.low_stock_threshold if setting else 10
         
         writer = csv.writer(response)
@@ -127,5 +127,114 @@ def bulk_stock_update(request):
         
         return response
     
+    if request.method == 'POST' and 'import' in request.POST:
+        csv_file = request.FILES.get('csv_file')
+        if not csv_file:
+            messages.error(request, 'Please choose a CSV file to import.')
+            return redirect('myadmin:bulk_stock_update')
+        
+        import csv
+        import io
+        
+        try:
+            rows = list(csv.reader(io.StringIO(csv_file.read().decode('utf-8-sig'))))
+        except UnicodeDecodeError:
+            messages.error(request, 'CSV file must be UTF-8 encoded.')
+            return redirect('myadmin:bulk_stock_update')
+        
+        # Accept "SKU, Stock Quantity" as well as the export format (SKU, Name, Current Stock, ...)
+        stock_column = 1
+        if rows and rows[0] and rows[0][0].strip().lower() == 'sku':
+            header = [cell.strip().lower() for cell in rows[0]]
+            for name in ('stock quantity', 'current stock', 'stock'):
+                if name in header:
+                    stock_column = header.index(name)
+                    break
+            rows = rows[1:]
+        
+        stock_by_sku = {}
+        errors = []
+        for line_number, row in enumerate(rows, start=2):
+            if not row or not row[0].strip():
+                continue
+            sku = row[0].strip()
+            try:
+                stock = int(row[stock_column])
+                if stock < 0:
+                    raise ValueError
+            except (IndexError, ValueError):
+                errors.append(f'Line {line_number}: invalid stock quantity for {sku}')
+                continue
+            stock_by_sku[sku] = stock
+        
+        products = list(Product.objects.filter(sku__in=stock_by_sku.keys()).only('id', 'sku', 'product_varient'))
+        items = []
+        skus = []
+        for product in products:
+            if product.product_varient and product.product_varient.get('enabled', False):
+                errors.append(f'{product.sku}: stock is managed per variant')
+                continue
+            items.append((product.pk, stock_by_sku[product.sku], None))
+            skus.append(product.sku)
+        
+        missing = set(stock_by_sku) - {product.sku for product in products}
+        errors.extend(f'{sku}: product not found' for sku in sorted(missing))
+        
+        # One transaction: locks, bulk_update and a single bulk_create of stock movements
+        results = adjust_stock_bulk(
+            items,
+            reason='Bulk CSV stock update',
+            user=request.user,
+            reference=csv_file.name,
+            reference_type='csv_import'
+        )
+        updated = 0
+        for sku, (success, message) in zip(skus, results):
+            if success:
+                updated += 1
+            else:
+                errors.append(f'{sku}: {message}')
+        
+        messages.success(request, f'Stock updated for {updated} product(s).')
+        if errors:
+            messages.warning(request, 'Skipped rows: ' + '; '.join(errors[:20]))
+        return redirect('myadmin:bulk_stock_update')
+    
     context = {}
     return render(request, 'admin/inventory/bulk_update.html', context)
+
+
+@superuser_required
+def stock_movement_list(request):
+    """Stock movement history"""
+    movements = StockMovement.objects.select_related('product', 'user')
+    
+    # Filter by product
+    product_id = request.GET.get('product')
+    product = None
+    if product_id and product_id.isdigit():
+        product = get_object_or_404(Product, pk=product_id)
+        movements = movements.filter(product=product)
+    
+    # Filter by reference
+    reference_type = request.GET.get('reference_type')
+    if reference_type:
+        movements = movements.filter(reference_type=reference_type)
+    reference = request.GET.get('reference')
+    if reference:
+        movements = movements.filter(reference=reference)
+    
+    # Cursor pagination: the ledger only grows
+    paginator = CursorPaginator(movements, 50, ['-created_at'])
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    context = {
+        'page_obj': page_obj,
+        'movements': page_obj,
+        'product': product,
+        'reference_type': reference_type,
+        'reference': reference,
+    }
+    
+    return render(request, 'admin/inventory/movements.html', context)
@@ -1,11 +1,11 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.db import transaction
 from core.models import Order, OrderItem
-from core.stock_utils import add_stock
+from core.stock_utils import add_stock_bulk, lock_for_write
+from core.pagination import CursorPaginator
 from django.forms import modelform_factory
 from django import forms
 
@@ -31,7 +31,7 @@ def order_list(request):
     if payment_filter:
         orders = orders.filter(payment_status=payment_filter)
     
-    paginator = Paginator(orders, 20)
+    paginator = CursorPaginator(orders, 20, ['-created_at'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -115,30 +115,37 @@ def order_edit(request, pk):
     )
     
     if request.method == 'POST':
+        # Read previous state before is_valid() copies the POST data onto the instance
+        old_order_status = order.order_status
+        old_payment_status = order.payment_status
         form = OrderForm(request.POST, instance=order)
         if form.is_valid():
-            old_order_status = order.order_status
-            old_payment_status = order.payment_status
-            
             order = form.save()
             
             # Restore stock if order is cancelled
             if old_order_status != 'cancelled' and order.order_status == 'cancelled':
                 with transaction.atomic():
-                    order_items = OrderItem.objects.filter(order=order).select_related('product')
-                    for item in order_items:
-                        variant = item.product_varient if item.product_varient else None
-                        success, message = add_stock(
-                            product=item.product,
-                            quantity=item.quantity,
-                            variant_combination=variant,
-                            reason=f"Order #{order.id} cancelled - stock restored",
-                            user=request.user,
-                            reference=str(order.id),
-                            reference_type='order_cancellation'
-                        )
-                        if not success:
+                    lock_for_write()
+                    # Only items whose stock was deducted on delivery are restored
+                    order_items = list(OrderItem.objects.select_for_update().filter(
+                        order=order, stock_deducted=True
+                    ).order_by('pk'))
+                    results = add_stock_bulk(
+                        [(item.product_id, item.quantity, item.product_varient or None) for item in order_items],
+                        reason=f"Order #{order.id} cancelled - stock restored",
+                        user=request.user,
+                        reference=str(order.id),
+                        reference_type='order_cancellation'
+                    )
+                    restored_items = []
+                    for item, (success, message) in zip(order_items, results):
+                        if success:
+                            item.stock_deducted = False
+                            restored_items.append(item)
+                        else:
                             messages.warning(request, f"Stock restoration warning for {item.product.name}: {message}")
+                    if restored_items:
+                        OrderItem.objects.bulk_update(restored_items, ['stock_deducted'])
             
             messages.success(request, f'Order #{order.id} updated successfully.')
             return redirect('myadmin:order_detail', pk=order.pk)
@@ -2,9 +2,9 @@ from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
 from core.models import Product, ProductImage, ProductReview, Category, SubCategory, ChildCategory, Brand, Unit
-from django.forms import modelform_factory, inlineformset_factory
+from core.search import search_products
+from django.forms import modelform_factory
 from django import forms
 import json
 
@@ -17,11 +17,7 @@ def product_list(request):
     # Search
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(sku__icontains=search_query) |
-            Q(short_description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     # Filters
     category_filter = request.GET.get('category')
@@ -45,8 +41,8 @@ def product_list(request):
         products = products.filter(is_featured=False)
     
     # Stock status filter
-    from core.models import Setting
-    setting = Setting.objects.first()
+    from core.cache_utils import get_setting
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     stock_status_filter = request.GET.get('stock_status')
@@ -96,6 +92,7 @@ def product_detail(request, pk):
     
     context = {
         'product': product,
+        'variant_data': product.variant_data,
         'images': images,
         'reviews': reviews,
     }
@@ -162,6 +159,7 @@ def product_create(request):
             
             if form.is_valid():  # Check again after variant validation
                 product = form.save()
+                product.sync_variants_from_json()
                 messages.success(request, f'Product "{product.name}" created successfully.')
                 return redirect('myadmin:product_detail', pk=product.pk)
     else:
@@ -264,6 +262,7 @@ def product_edit(request, pk):
             
             if form.is_valid():  # Check again after variant validation
                 product = form.save()
+                product.sync_variants_from_json()
                 messages.success(request, f'Product "{product.name}" updated successfully.')
                 return redirect('myadmin:product_detail', pk=product.pk)
     else:
@@ -292,7 +291,7 @@ def product_edit(request, pk):
     # Serialize product variant data for JavaScript (if editing)
     variant_json = '{}'
     if product.product_varient:
-        variant_json = json.dumps(product.product_varient)
+        variant_json = json.dumps(product.variant_data)
     
     context = {
         'form': form,
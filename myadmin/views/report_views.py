@@ -1,19 +1,18 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from myadmin.decorators import superuser_required
-from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, Avg, F, DecimalField
-from django.db.models.functions import TruncDate, TruncMonth, TruncYear, Coalesce
+from django.db.models import Q, Sum, Count, Avg
+from django.db.models.functions import TruncMonth, Coalesce
 from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
 from core.models import (
-    Order, OrderItem, Product, User, Category, Setting,
+    Order, OrderItem, Product, User, Category,
     Withdrawal, Transaction
 )
+from core.cache_utils import get_setting
 from django.http import HttpResponse
 import csv
-import json
 
 
 @superuser_required
@@ -142,7 +141,7 @@ def sales_report(request):
 def inventory_report(request):
     """Inventory status report"""
     # Get global low stock threshold from settings
-    setting = Setting.objects.first()
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     products = Product.objects.filter(is_active=True).select_related('category', 'brand')
@@ -391,13 +390,13 @@ def export_inventory_report_csv(products):
     
     writer = csv.writer(response)
     # Get global low stock threshold from settings
-    setting = Setting.objects.first()
+    setting = get_setting()
     low_stock_threshold = setting.low_stock_threshold if setting else 10
     
     writer.writerow(['SKU', 'Product Name', 'Category', 'Current Stock', 'Low Stock Threshold', 'Price', 'Stock Value', 'Status'])
     
     for product in products:
-        status = 'Out of Stock' if product.stock == 0 else ('Low Stock' if product.is_low_stock() else 'In Stock')
+        status = 'Out of Stock' if product.stock == 0 else ('Low Stock' if product.stock <= low_stock_threshold else 'In Stock')
         stock_value = float(product.regular_price) * product.stock
         writer.writerow([
             product.sku,
@@ -481,7 +480,7 @@ def finance_report(request):
             pass
     
     # Get system balance
-    setting = Setting.objects.first()
+    setting = get_setting()
     system_balance = setting.system_balance if setting else Decimal('0.00')
     
     # Base querysets
@@ -1,9 +1,8 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
-from core.models import Setting, Withdrawal, Transaction, User
+from core.models import Setting, Withdrawal, Transaction
+from core.pagination import CursorPaginator
 from django.forms import modelform_factory
 from django import forms
 
@@ -60,7 +59,7 @@ def withdrawal_list(request):
     if status_filter:
         withdrawals = withdrawals.filter(status=status_filter)
         
-    paginator = Paginator(withdrawals, 20)
+    paginator = CursorPaginator(withdrawals, 20, ['-created_at'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -131,7 +130,7 @@ def transaction_list(request):
     """List transactions"""
     transactions = Transaction.objects.select_related('user').all().order_by('-created_at')
     
-    paginator = Paginator(transactions, 30)
+    paginator = CursorPaginator(transactions, 30, ['-created_at'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
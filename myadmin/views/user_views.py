@@ -2,11 +2,12 @@ from django.shortcuts import render, get_object_or_404, redirect
 from myadmin.decorators import superuser_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Sum
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from decimal import Decimal
 from core.models import User, Address, Transaction, Withdrawal
+from core.pagination import CursorPaginator
 from django.forms import modelform_factory
 from django import forms
 
@@ -36,7 +37,7 @@ def user_list(request):
     elif influencer_filter == 'no':
         users = users.filter(is_influencer=False)
     
-    paginator = Paginator(users, 20)
+    paginator = CursorPaginator(users, 20, ['-date_joined'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -322,7 +323,7 @@ def user_transactions(request, pk):
     if status_filter in ['pending', 'success', 'failed']:
         transactions = transactions.filter(status=status_filter)
     
-    paginator = Paginator(transactions, 30)
+    paginator = CursorPaginator(transactions, 30, ['-created_at'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -348,7 +349,7 @@ def user_withdrawals(request, pk):
     if status_filter in ['pending', 'approved', 'rejected']:
         withdrawals = withdrawals.filter(status=status_filter)
     
-    paginator = Paginator(withdrawals, 20)
+    paginator = CursorPaginator(withdrawals, 20, ['-created_at'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
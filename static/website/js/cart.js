@@ -0,0 +1,129 @@
+/*
+ * Cart API client
+ * Forms with a data-cart-api attribute are posted to that JSON endpoint instead
+ * of their action; the response updates the changed cart line, the order summary
+ * and the header cart counts in place. Without JavaScript the forms post normally.
+ */
+(function () {
+    function csrfToken(form) {
+        const input = form && form.querySelector('input[name="csrfmiddlewaretoken"]');
+        if (input) {
+            return input.value;
+        }
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function post(url, form) {
+        return fetch(url, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: {
+                'X-CSRFToken': csrfToken(form),
+                'X-Requested-With': 'XMLHttpRequest',
+            },
+            credentials: 'same-origin',
+        }).then(function (response) {
+            return response.json().catch(function () {
+                return {success: false, error: 'Something went wrong, please try again'};
+            });
+        });
+    }
+
+    function notify(message, success) {
+        let toast = document.getElementById('cart-toast');
+        if (!toast) {
+            toast = document.createElement('div');
+            toast.id = 'cart-toast';
+            toast.className = 'fixed bottom-20 md:bottom-6 right-4 z-50 px-4 py-3 rounded-lg shadow-lg text-white font-semibold';
+            document.body.appendChild(toast);
+        }
+        toast.textContent = message;
+        toast.classList.toggle('bg-biolife-green', success);
+        toast.classList.toggle('bg-red-600', !success);
+        toast.classList.remove('hidden');
+        clearTimeout(toast._hideTimer);
+        toast._hideTimer = setTimeout(function () {
+            toast.classList.add('hidden');
+        }, 3000);
+    }
+
+    function setCount(count) {
+        document.querySelectorAll('[data-cart-count]').forEach(function (badge) {
+            badge.textContent = count;
+            badge.classList.toggle('hidden', count <= 0);
+        });
+    }
+
+    function setTotals(totals) {
+        document.querySelectorAll('[data-cart-total]').forEach(function (element) {
+            element.textContent = 'Rs ' + totals[element.dataset.cartTotal];
+        });
+        document.querySelectorAll('[data-cart-discount-row]').forEach(function (row) {
+            row.classList.toggle('hidden', parseFloat(totals.discount) <= 0);
+        });
+        document.querySelectorAll('[data-cart-coupon]').forEach(function (element) {
+            element.classList.toggle('hidden', !totals.coupon_code);
+            element.querySelectorAll('[data-cart-coupon-code]').forEach(function (code) {
+                code.textContent = totals.coupon_code || '';
+            });
+        });
+        document.querySelectorAll('[data-cart-coupon-button]').forEach(function (button) {
+            button.textContent = totals.coupon_code ? 'Remove' : 'Apply';
+        });
+    }
+
+    function setLine(data) {
+        if (data.removed !== null) {
+            const removed = document.querySelector('[data-cart-line="' + data.removed + '"]');
+            if (removed) {
+                removed.remove();
+            }
+            if (!document.querySelector('[data-cart-line]') && document.querySelector('[data-cart-lines]')) {
+                // Last line gone: show the empty cart page
+                window.location.reload();
+            }
+        }
+        if (data.line) {
+            const row = document.querySelector('[data-cart-line="' + data.line.key + '"]');
+            if (row) {
+                row.querySelectorAll('[data-cart-line-quantity]').forEach(function (input) {
+                    input.value = data.line.quantity;
+                });
+                row.querySelectorAll('[data-cart-line-total]').forEach(function (element) {
+                    element.textContent = 'Rs ' + data.line.total;
+                });
+            }
+        }
+    }
+
+    function apply(data) {
+        setLine(data);
+        setTotals(data.totals);
+        setCount(data.cart_count);
+    }
+
+    document.addEventListener('submit', function (event) {
+        const form = event.target.closest('form[data-cart-api]');
+        // Other handlers (e.g. variant validation) may have cancelled the submit
+        if (!form || event.defaultPrevented || !window.fetch) {
+            return;
+        }
+        event.preventDefault();
+        post(form.dataset.cartApi, form).then(function (data) {
+            if (!data.success) {
+                notify(data.error, false);
+                return;
+            }
+            apply(data);
+            if (form.dataset.cartMessage) {
+                notify(form.dataset.cartMessage, true);
+            }
+        }).catch(function () {
+            // Network failure: fall back to a normal form post
+            form.submit();
+        });
+    });
+
+    window.BiolifeCart = {post: post, apply: apply, notify: notify};
+})();
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class WebsiteConfig(AppConfig):
     name = 'website'
+    
+    def ready(self):
+        import website.signals  # Import signals to register them
@@ -0,0 +1,400 @@
+"""
+Cart storage and pricing
+Anonymous visitors keep their cart in the session (SessionCart); logged-in
+users get a Cart row with one CartItem per (product, variant), written with
+per-line upserts (DatabaseCart). A session cart is merged into the user's
+cart on login.
+The pricing engine prices either kind in a fixed number of queries whatever
+its size: products with their variants, campaigns and the coupon are loaded
+in bulk, and flash deals come from the in-memory index (core.pricing).
+cart_view and checkout share the resulting PricedCart.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core.coupons import get_coupon
+from core.models import Campaign, Cart, CartItem, Product
+from core.pricing import resolve_prices
+from core.stock_utils import validate_stock_availability
+
+# Fallback shipping when the address has no ShippingCharge
+FREE_SHIPPING_THRESHOLD = Decimal('50.00')
+FLAT_SHIPPING = Decimal('5.00')
+
+
+def default_shipping(subtotal):
+    """Free shipping over the threshold, otherwise a flat charge"""
+    return Decimal('0.00') if subtotal >= FREE_SHIPPING_THRESHOLD else FLAT_SHIPPING
+
+
+class CartLine:
+    """
+    One priced cart item.
+    index is the item's key in its cart store (used by update/remove URLs);
+    variant is the combination the line is priced and ordered with.
+    """
+    def __init__(self, index, product, variant, quantity, price, campaign=None, earn_code=''):
+        self.index = index
+        self.product = product
+        self.variant = variant
+        self.quantity = quantity
+        self.price = price
+        self.total = price * quantity
+        self.campaign = campaign
+        self.earn_code = earn_code
+
+
+class PricedCart:
+    """
+    Cart lines with current prices, coupon discount and shipping.
+    Items whose product is gone or inactive are left out (see missing: the items).
+    """
+    def __init__(self, lines, missing, coupon=None, coupon_code=None, shipping_address=None):
+        self.lines = lines
+        self.missing = missing
+        self.coupon = coupon
+        self.coupon_code = coupon_code
+        self.subtotal = sum((line.total for line in lines), Decimal('0.00'))
+        self.tax = Decimal('0.00')  # Tax removed from system
+        self.discount = Decimal('0.00')
+        if coupon:
+            if coupon.discount_type == 'flat':
+                self.discount = coupon.discount
+            else:  # percentage
+                self.discount = self.subtotal * (coupon.discount / 100)
+        self.set_shipping_address(shipping_address)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines)
+
+    def set_shipping_address(self, address):
+        """Recompute shipping and total for an address (None: default shipping)"""
+        if address is not None and address.shipping_charge:
+            self.shipping = address.shipping_charge.charge
+        else:
+            self.shipping = default_shipping(self.subtotal)
+        self.total = self.subtotal + self.shipping - self.discount
+
+    def stock_errors(self):
+        """Messages for lines asking for more than the available stock"""
+        errors = []
+        for line in self.lines:
+            # Variants are prefetched, so this runs no queries
+            is_available, available_qty, message = validate_stock_availability(
+                line.product, line.quantity, line.variant or None
+            )
+            if not is_available:
+                errors.append(f"{line.product.name}: {message}")
+        return errors
+
+    def totals(self):
+        """Template context for the order summary"""
+        return {
+            'subtotal': self.subtotal,
+            'shipping': self.shipping,
+            'tax': self.tax,
+            'discount': self.discount,
+            'total': self.total,
+            'coupon': self.coupon,
+        }
+
+
+def _load_coupon(coupon_code):
+    """Returns: valid Coupon for the code or None (cached lookup)"""
+    coupon = get_coupon(coupon_code)
+    return coupon if coupon and coupon.is_valid() else None
+
+
+def _campaign_id(item):
+    """Campaign ID stored with a cart item (session values may be strings) or None"""
+    try:
+        return int(item.get('campaign_id') or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def price_cart(items, coupon_code=None, shipping_address=None):
+    """
+    Price cart items (dicts with key, product_id, variant, quantity and optional
+    campaign_id/earn_code, as returned by the cart stores) at current prices.
+    Runs at most 4 queries: products, their variants, campaigns and (on a cache miss) the coupon.
+    Returns: PricedCart
+    """
+    items = list(items)
+    product_ids = {item['product_id'] for item in items}
+    products = Product.objects.filter(
+        is_active=True
+    ).prefetch_related('variants').in_bulk(product_ids) if product_ids else {}
+
+    campaign_ids = {_campaign_id(item) for item in items} - {None}
+    campaigns = Campaign.objects.filter(is_active=True).in_bulk(campaign_ids) if campaign_ids else {}
+
+    resolved = []
+    missing = []
+    for index, item in enumerate(items):
+        product = products.get(item['product_id'])
+        if product is None:
+            missing.append(item)
+            continue
+        variant = item.get('variant') or ''
+        # Products with variants are ordered as their primary variant when none was chosen
+        if not variant and product.product_varient and product.product_varient.get('enabled', False):
+            primary_variant = product.get_primary_variant()
+            if primary_variant:
+                variant = primary_variant.combination
+        resolved.append((item.get('key', index), item, product, variant))
+
+    # Attach flash deals once per product, then price each line's variant
+    resolve_prices(products.values())
+    lines = []
+    for index, item, product, variant in resolved:
+        price = Decimal(str(product.get_final_price(variant or None))).quantize(Decimal('0.01'))
+        campaign = campaigns.get(_campaign_id(item))
+        if campaign is not None and campaign.product_id != product.pk:
+            campaign = None
+        lines.append(CartLine(
+            index, product, variant, item['quantity'], price,
+            campaign=campaign, earn_code=item.get('earn_code', ''),
+        ))
+
+    return PricedCart(lines, missing, _load_coupon(coupon_code), coupon_code, shipping_address)
+
+
+class SessionCart:
+    """
+    Cart of an anonymous visitor: a list of item dicts in request.session['cart'].
+    Each item has a line_id that stays valid when other lines are removed.
+    """
+    def __init__(self, session):
+        self.session = session
+        if 'cart' not in session:
+            session['cart'] = {'items': [], 'coupon_code': None}
+        self.data = session['cart']
+        # Carts stored before line IDs existed
+        for item in self.data['items']:
+            if 'line_id' not in item:
+                item['line_id'] = self._next_line_id()
+                self.session.modified = True
+
+    def _next_line_id(self):
+        line_id = self.data.get('next_line_id', 1)
+        self.data['next_line_id'] = line_id + 1
+        return line_id
+
+    def _find(self, key):
+        for position, item in enumerate(self.data['items']):
+            if item['line_id'] == key:
+                return position
+        return None
+
+    def items(self):
+        """Returns: list of item dicts; key is the item's line_id"""
+        return [dict(item, key=item['line_id']) for item in self.data['items']]
+
+    @property
+    def coupon_code(self):
+        return self.data.get('coupon_code')
+
+    def count(self):
+        return sum(item.get('quantity', 0) for item in self.data['items'])
+
+    def add(self, product_id, variant, quantity, campaign_id='', earn_code=''):
+        """Add quantity to the (product, variant) line, creating it if needed. Returns: line key"""
+        for item in self.data['items']:
+            if item['product_id'] == product_id and item.get('variant') == variant:
+                item['quantity'] += quantity
+                # Preserve campaign info if not already set
+                if not item.get('campaign_id') and campaign_id:
+                    item['campaign_id'] = campaign_id
+                if not item.get('earn_code') and earn_code:
+                    item['earn_code'] = earn_code
+                break
+        else:
+            item = {
+                'line_id': self._next_line_id(),
+                'product_id': product_id,
+                'variant': variant,
+                'quantity': quantity,
+            }
+            if campaign_id:
+                item['campaign_id'] = campaign_id
+            if earn_code:
+                item['earn_code'] = earn_code
+            self.data['items'].append(item)
+        self.session.modified = True
+        return item['line_id']
+
+    def set_quantity(self, key, quantity):
+        """Set a line's quantity (0 or less removes it). Returns: False for an unknown key"""
+        position = self._find(key)
+        if position is None:
+            return False
+        if quantity <= 0:
+            self.data['items'].pop(position)
+        else:
+            self.data['items'][position]['quantity'] = quantity
+        self.session.modified = True
+        return True
+
+    def remove(self, key):
+        return self.set_quantity(key, 0)
+
+    def set_coupon(self, coupon_code):
+        self.data['coupon_code'] = coupon_code or None
+        self.session.modified = True
+
+    def clear(self):
+        self.data['items'] = []
+        self.data['coupon_code'] = None
+        self.session.modified = True
+
+
+class DatabaseCart:
+    """
+    Cart of a logged-in user. Every change is a single-row upsert or update,
+    followed by a refresh of Cart.item_count (read for the header count).
+    """
+    def __init__(self, user):
+        self.user = user
+        self._cart = None
+
+    def _get_cart(self, create=False):
+        if self._cart is None:
+            if create:
+                self._cart, _ = Cart.objects.get_or_create(user=self.user)
+            else:
+                self._cart = Cart.objects.filter(user=self.user).first()
+        return self._cart
+
+    def items(self):
+        """Returns: list of item dicts; key is the CartItem pk"""
+        cart = self._get_cart()
+        if cart is None:
+            return []
+        rows = CartItem.objects.filter(cart=cart).values(
+            'pk', 'product_id', 'variant', 'quantity', 'campaign_id', 'earn_code'
+        )
+        return [dict(row, key=row.pop('pk')) for row in rows]
+
+    @property
+    def coupon_code(self):
+        cart = self._get_cart()
+        return cart.coupon_code if cart else None
+
+    def count(self):
+        return get_user_cart_count(self.user)
+
+    def _refresh_count(self):
+        # One UPDATE summing the items, so concurrent changes can't leave an older total behind
+        total = CartItem.objects.filter(cart=OuterRef('pk')).values('cart').annotate(total=Sum('quantity'))
+        Cart.objects.filter(pk=self._get_cart().pk).update(
+            item_count=Coalesce(Subquery(total.values('total')), 0)
+        )
+
+    def add(self, product_id, variant, quantity, campaign_id='', earn_code=''):
+        """Add quantity to the (product, variant) line, creating it if needed. Returns: line key"""
+        cart = self._get_cart(create=True)
+        campaign_id = _campaign_id({'campaign_id': campaign_id})
+        line = CartItem.objects.filter(cart=cart, product_id=product_id, variant=variant or '')
+        increment = {'quantity': F('quantity') + quantity}
+        # Preserve campaign info if not already set
+        if campaign_id:
+            increment['campaign_id'] = Coalesce(F('campaign_id'), Value(campaign_id))
+        if earn_code:
+            increment['earn_code'] = Case(When(earn_code='', then=Value(earn_code)), default=F('earn_code'))
+        key = None
+        if not line.update(**increment):
+            try:
+                with transaction.atomic():
+                    key = CartItem.objects.create(
+                        cart=cart, product_id=product_id, variant=variant or '', quantity=quantity,
+                        campaign_id=campaign_id, earn_code=earn_code or '',
+                    ).pk
+            except IntegrityError:
+                # Created concurrently (e.g. a double click): add to that line instead
+                line.update(**increment)
+        self._refresh_count()
+        return key if key is not None else line.values_list('pk', flat=True).first()
+
+    def set_quantity(self, key, quantity):
+        """Set a line's quantity (0 or less removes it). Returns: False for an unknown key"""
+        cart = self._get_cart()
+        if cart is None:
+            return False
+        line = CartItem.objects.filter(cart=cart, pk=key)
+        changed = line.delete()[0] if quantity <= 0 else line.update(quantity=quantity)
+        if changed:
+            self._refresh_count()
+        return bool(changed)
+
+    def remove(self, key):
+        return self.set_quantity(key, 0)
+
+    def set_coupon(self, coupon_code):
+        cart = self._get_cart(create=True)
+        cart.coupon_code = coupon_code or None
+        cart.save(update_fields=['coupon_code', 'updated_at'])
+
+    def clear(self):
+        cart = self._get_cart()
+        if cart is None:
+            return
+        CartItem.objects.filter(cart=cart).delete()
+        cart.coupon_code = None
+        cart.save(update_fields=['coupon_code', 'updated_at'])
+        self._refresh_count()
+
+
+def get_cart(request):
+    """Cart store for the request: DatabaseCart for logged-in users, SessionCart otherwise"""
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    return SessionCart(request.session)
+
+
+def get_user_cart_count(user):
+    """Sum of a user's cart quantities, read from Cart.item_count (one indexed lookup)"""
+    return Cart.objects.filter(user=user).values_list('item_count', flat=True).first() or 0
+
+
+def get_cart_count(request):
+    """Header cart count without loading cart items"""
+    if request.user.is_authenticated:
+        return get_user_cart_count(request.user)
+    # Visitors without a session cookie have no cart; don't create a session for them
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return 0
+    items = request.session.get('cart', {}).get('items', [])
+    return sum(item.get('quantity', 0) for item in items)
+
+
+def merge_session_cart(session, user):
+    """Move an anonymous session cart into the user's cart (quantities of matching lines add up)"""
+    session_cart = session.get('cart')
+    if not session_cart or not (session_cart.get('items') or session_cart.get('coupon_code')):
+        return
+    items = session_cart.get('items', [])
+    existing = set(Product.objects.filter(pk__in=[item['product_id'] for item in items]).values_list('pk', flat=True))
+    database_cart = DatabaseCart(user)
+    with transaction.atomic():
+        for item in items:
+            if item['product_id'] not in existing:
+                continue
+            database_cart.add(
+                item['product_id'], item.get('variant') or '', item['quantity'],
+                item.get('campaign_id', ''), item.get('earn_code', ''),
+            )
+        if session_cart.get('coupon_code') and not database_cart.coupon_code:
+            database_cart.set_coupon(session_cart['coupon_code'])
+    del session['cart']
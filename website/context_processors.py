@@ -1,13 +1,70 @@
-from django.db.models import Q
-from core.models import Category, CMSPage, Wishlist, Setting
+from core.models import Category, CMSPage, Wishlist
+from core.cache_utils import get_setting, get_versioned
+from .cart import get_cart_count
+
+
+def build_navigation():
+    """
+    Build compact header/footer navigation data (plain dicts and lists).
+    Cached under the 'navigation' version, bumped by Category, SubCategory,
+    ChildCategory and CMSPage signals.
+    """
+    categories_list = Category.objects.filter(
+        is_featured=True
+    ).prefetch_related(
+        'sub_categories__child_categories'
+    ).order_by('order', 'name')  # Only featured categories for header
+    
+    nav_categories = [
+        {
+            'id': category.id,
+            'name': category.name,
+            'image_url': category.image.url if category.image else '',
+            'sub_categories': [
+                {
+                    'id': subcategory.id,
+                    'name': subcategory.name,
+                    'child_categories': [
+                        {'id': childcategory.id, 'name': childcategory.name}
+                        for childcategory in subcategory.child_categories.all()
+                    ],
+                }
+                for subcategory in category.sub_categories.all()
+            ],
+        }
+        for category in categories_list
+    ]
+    
+    def page_data(page):
+        return {'title': page.title, 'slug': page.slug}
+    
+    footer_pages = CMSPage.objects.filter(is_active=True, in_footer=True).order_by('title')
+    header_pages = CMSPage.objects.filter(is_active=True, in_header=True).order_by('title')
+    
+    return {
+        'nav_categories': nav_categories,
+        'cms_pages': [page_data(page) for page in footer_pages],
+        'customer_service_pages': [
+            page_data(page) for page in footer_pages if page.footer_section == 'customer_service'
+        ],
+        'information_pages': [
+            page_data(page) for page in footer_pages
+            if page.footer_section in ('information', None, '')
+        ],
+        'header_cms_pages': [page_data(page) for page in header_pages],
+    }
+
+
+def get_navigation(request):
+    """Get cached navigation data, memoized on the request for the context processors below"""
+    if not hasattr(request, '_navigation'):
+        request._navigation = get_versioned('navigation', build_navigation)
+    return request._navigation
 
 
 def cart_count(request):
-    """Add cart item count to context"""
-    cart = request.session.get('cart', {})
-    items = cart.get('items', [])
-    count = sum(item.get('quantity', 0) for item in items)
-    return {'cart_count': count}
+    """Add cart item count to context (cached per user; no cart items are loaded)"""
+    return {'cart_count': get_cart_count(request)}
 
 
 def wishlist_count(request):
@@ -21,36 +78,25 @@ def wishlist_count(request):
 
 def categories(request):
     """Add categories with subcategories and child categories to context for navigation"""
-    categories_list = Category.objects.filter(
-        is_featured=True
-    ).prefetch_related(
-        'sub_categories__child_categories'
-    ).order_by('order', 'name')  # Only featured categories for header
-    return {'nav_categories': categories_list}
+    return {'nav_categories': get_navigation(request)['nav_categories']}
 
 
 def cms_pages(request):
     """Add CMS pages to context for footer"""
-    all_pages = CMSPage.objects.filter(is_active=True, in_footer=True).order_by('title')
-    customer_service_pages = all_pages.filter(footer_section='customer_service')
-    information_pages = all_pages.filter(
-        Q(footer_section='information') | Q(footer_section__isnull=True) | Q(footer_section='')
-    )
-    
+    navigation = get_navigation(request)
     return {
-        'cms_pages': all_pages,
-        'customer_service_pages': customer_service_pages,
-        'information_pages': information_pages,
+        'cms_pages': navigation['cms_pages'],
+        'customer_service_pages': navigation['customer_service_pages'],
+        'information_pages': navigation['information_pages'],
     }
 
 
 def site_settings(request):
     """Add site settings to context for all templates"""
-    setting = Setting.objects.first()
+    setting = get_setting()
     return {'site_settings': setting}
 
 
 def header_cms_pages(request):
     """Add CMS pages to context for header navigation"""
-    pages = CMSPage.objects.filter(is_active=True, in_header=True).order_by('title')
-    return {'header_cms_pages': pages}
+    return {'header_cms_pages': get_navigation(request)['header_cms_pages']}
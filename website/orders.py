@@ -0,0 +1,107 @@
+"""
+Order placement
+Turns a PricedCart (website.cart) into an Order. Checks that need no locks
+run first; the transaction then issues a fixed number of statements whatever
+the cart size: one Order insert, one bulk insert of the items (totals already
+computed), the bulk stock reservation and the coupon's conditional update.
+"""
+from django.db import transaction
+
+from core.coupons import redeem_coupon
+from core.models import Order, OrderItem
+from core.stock_utils import reserve_stock_bulk
+
+
+class OrderPlacementError(Exception):
+    """
+    The order could not be placed (nothing was written).
+    errors lists the problems; coupon_invalid means the cart's coupon can no longer be used.
+    """
+    def __init__(self, message, errors=(), coupon_invalid=False):
+        super().__init__(message)
+        self.message = message
+        self.errors = list(errors)
+        self.coupon_invalid = coupon_invalid
+
+    def __str__(self):
+        if self.errors:
+            return f"{self.message}: {'; '.join(self.errors)}"
+        return self.message
+
+
+def validate_priced_cart(priced_cart):
+    """
+    Problems that would stop the cart from being ordered, checked without locks
+    (stock is checked again under lock when it is reserved)
+    Returns: list of error messages
+    """
+    errors = [f"Product ID {item['product_id']}: Product not found" for item in priced_cart.missing]
+    if not priced_cart.lines and not errors:
+        errors.append('Your cart is empty')
+    return errors + priced_cart.stock_errors()
+
+
+def place_order(user, priced_cart, billing_address, shipping_address, payment_method='cod'):
+    """
+    Create a pending order for a priced cart, reserve its stock and redeem its coupon
+    Shipping is recomputed for shipping_address.
+    Raises: OrderPlacementError (everything is rolled back)
+    Returns: Order
+    """
+    priced_cart.set_shipping_address(shipping_address)
+    errors = validate_priced_cart(priced_cart)
+    if errors:
+        raise OrderPlacementError('Stock validation failed', errors)
+
+    order = Order(
+        user=user,
+        billing_address=billing_address,
+        shipping_address=shipping_address,
+        sub_total=priced_cart.subtotal,
+        shipping=priced_cart.shipping,
+        tax=priced_cart.tax,
+        total=priced_cart.total,
+        payment_status='pending',
+        order_status='pending',
+        payment_method=payment_method,
+        shipping_charge=shipping_address.shipping_charge,
+    )
+    # Built before the transaction; bulk_create skips OrderItem.save, so totals are set here
+    items = [
+        OrderItem(
+            product=line.product,
+            product_varient=line.variant,
+            campaign=line.campaign,
+            earn_code=line.earn_code,
+            quantity=line.quantity,
+            price=line.price,
+            total=line.total,
+        )
+        for line in priced_cart
+    ]
+    reservation_items = [(line.product.pk, line.quantity, line.variant) for line in priced_cart]
+
+    with transaction.atomic():
+        order.save()
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        # Hold the stock for this order (deducted on delivery via signal); fails if
+        # another checkout took it first
+        results = reserve_stock_bulk(order, reservation_items)
+        errors = [
+            f"{line.product.name}: {message}"
+            for line, (success, message) in zip(priced_cart, results) if not success
+        ]
+        if errors:
+            raise OrderPlacementError('Stock validation failed', errors)
+
+        # Last, so the coupon row is locked only until commit
+        coupon = priced_cart.coupon
+        if coupon and not redeem_coupon(coupon, user, order, priced_cart.discount):
+            raise OrderPlacementError(
+                f'Coupon "{coupon.coupon_code}" is no longer valid and has been removed', coupon_invalid=True
+            )
+
+    return order
@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .cart import merge_session_cart
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Carry the anonymous session cart over into the user's persistent cart"""
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request.session, user)
@@ -1,3 +1,207 @@
+import html
+import re
+from datetime import timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import (
+    Address, Brand, Cart, CartItem, Coupon, CouponRedemption, Order, OrderItem, Product, StockReservation, User
+)
+from core.search import index_products
+from .cart import DatabaseCart, get_user_cart_count, price_cart
+from .orders import OrderPlacementError, place_order
+
+
+class CartMergeTests(TestCase):
+    """An anonymous session cart is merged into the user's cart on login"""
+
+    def setUp(self):
+        self.tea = Product.objects.create(name='Tea', sku='TEA', regular_price=Decimal('10.00'), stock=20)
+        self.honey = Product.objects.create(name='Honey', sku='HONEY', regular_price=Decimal('20.00'), stock=20)
+        self.user = User.objects.create_user('customer@example.com', 'Customer')
+
+    def add_anonymously(self, product, quantity):
+        response = self.client.post(reverse('website:cart_api_add', args=[product.pk]), {'quantity': quantity})
+        self.assertTrue(response.json()['success'])
+
+    def cart_lines(self):
+        return {
+            (item.product_id, item.quantity)
+            for item in CartItem.objects.filter(cart__user=self.user)
+        }
+
+    def test_session_cart_moves_into_empty_user_cart(self):
+        self.add_anonymously(self.tea, 2)
+        self.add_anonymously(self.honey, 1)
+
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.cart_lines(), {(self.tea.pk, 2), (self.honey.pk, 1)})
+        self.assertEqual(get_user_cart_count(self.user), 3)
+        self.assertNotIn('cart', self.client.session)
+
+    def test_matching_lines_add_up(self):
+        DatabaseCart(self.user).add(self.tea.pk, '', 1)
+        self.add_anonymously(self.tea, 2)
+        self.add_anonymously(self.honey, 1)
+
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.cart_lines(), {(self.tea.pk, 3), (self.honey.pk, 1)})
+        self.assertEqual(Cart.objects.get(user=self.user).item_count, 4)
+
+    def test_session_coupon_kept_unless_user_cart_has_one(self):
+        session = self.client.session
+        session['cart'] = {'items': [], 'coupon_code': 'SAVE10'}
+        session.save()
+
+        self.client.force_login(self.user)
+
+        self.assertEqual(Cart.objects.get(user=self.user).coupon_code, 'SAVE10')
+
+    def test_login_without_session_cart_creates_nothing(self):
+        self.client.force_login(self.user)
+
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+
+class ProductListingTests(TestCase):
+    """Pagination links keep the listing's filters"""
+    NEXT_LINK_RE = re.compile(r'<a href="\?([^"]*)"\s+class="[^"]*">\s*Next')
+
+    def setUp(self):
+        self.brand = Brand.objects.create(name='Organic Farm')
+        other = Brand.objects.create(name='Other')
+        for index in range(15):
+            Product.objects.create(
+                name=f'Green tea {index}', sku=f'TEA{index}', regular_price=Decimal('10.00'), stock=5, brand=self.brand
+            )
+        for index in range(5):
+            Product.objects.create(
+                name=f'Black tea {index}', sku=f'BLACK{index}', regular_price=Decimal('10.00'), stock=5, brand=other
+            )
+        index_products()
+
+    def test_next_page_keeps_filters(self):
+        url = reverse('website:product_list')
+        # '&' in the search must be encoded in the link, not split off as another parameter
+        response = self.client.get(url, {'brand': self.brand.pk, 'search': 'tea &', 'utm_source': 'mail'})
+        first_page = [product.sku for product in response.context['page_obj']]
+        query = html.unescape(self.NEXT_LINK_RE.search(response.content.decode()).group(1))
+        self.assertNotIn('utm_source', query)
+
+        response = self.client.get(f'{url}?{query}')
+        second_page = [product.sku for product in response.context['page_obj']]
+
+        self.assertEqual(len(first_page), 12)
+        self.assertEqual(len(second_page), 3)
+        self.assertEqual(set(first_page + second_page), {f'TEA{index}' for index in range(15)})
+        self.assertEqual(response.context['search_query'], 'tea &')
+
+
+class CartCountTests(TestCase):
+    """The header count follows every change to the user's cart"""
+
+    def setUp(self):
+        self.tea = Product.objects.create(name='Tea', sku='TEA', regular_price=Decimal('10.00'), stock=20)
+        self.user = User.objects.create_user('customer@example.com', 'Customer')
+
+    def test_count_reads_stored_total(self):
+        cart = DatabaseCart(self.user)
+        key = cart.add(self.tea.pk, '', 2)
+        self.assertEqual(get_user_cart_count(self.user), 2)
+
+        # A change made elsewhere (another worker) is seen on the next read
+        DatabaseCart(self.user).set_quantity(key, 5)
+        self.assertEqual(cart.count(), 5)
+
+        DatabaseCart(self.user).remove(key)
+        self.assertEqual(cart.count(), 0)
+
+    def test_header_count(self):
+        self.client.force_login(self.user)
+        DatabaseCart(self.user).add(self.tea.pk, '', 3)
+
+        response = self.client.get(reverse('website:cart'))
+
+        self.assertEqual(response.context['cart_count'], 3)
+
+
+class PlaceOrderTests(TestCase):
+    """place_order writes the order, its items, reservations and coupon use together or not at all"""
+
+    def setUp(self):
+        self.tea = Product.objects.create(name='Tea', sku='TEA', regular_price=Decimal('10.00'), stock=5)
+        self.honey = Product.objects.create(name='Honey', sku='HONEY', regular_price=Decimal('20.00'), stock=5)
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            coupon_code='SAVE10', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            discount_type='percentage', discount=Decimal('10.00'), usage_limit=1,
+        )
+        self.user = User.objects.create_user('customer@example.com', 'Customer')
+        self.address = Address.objects.create(
+            title='Home', user=self.user, phone='9800000000', address='Street 1', city='Kathmandu',
+            state='Bagmati', country='Nepal'
+        )
+
+    def priced_cart(self, coupon_code='SAVE10'):
+        return price_cart([
+            {'key': 1, 'product_id': self.tea.pk, 'variant': '', 'quantity': 2},
+            {'key': 2, 'product_id': self.honey.pk, 'variant': '', 'quantity': 3},
+        ], coupon_code)
+
+    def assert_nothing_written(self):
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CouponRedemption.objects.exists())
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('reserved_stock', flat=True)), [0, 0])
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage, 0)
+
+    def test_places_order(self):
+        order = place_order(self.user, self.priced_cart(), self.address, self.address)
+
+        self.assertEqual(order.sub_total, Decimal('80.00'))
+        self.assertEqual(
+            set(order.items.values_list('product_id', 'quantity', 'total')),
+            {(self.tea.pk, 2, Decimal('20.00')), (self.honey.pk, 3, Decimal('60.00'))},
+        )
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('reserved_stock', flat=True)), [2, 3])
+        self.assertEqual(CouponRedemption.objects.get().order, order)
+
+    def test_failed_reservation_rolls_back_everything(self):
+        priced_cart = self.priced_cart()
+        # Another checkout takes the honey after the cart was priced
+        Product.objects.filter(pk=self.honey.pk).update(reserved_stock=4)
+
+        with self.assertRaises(OrderPlacementError) as raised:
+            place_order(self.user, priced_cart, self.address, self.address)
+
+        self.assertIn('Honey', str(raised.exception))
+        self.assertFalse(raised.exception.coupon_invalid)
+        Product.objects.filter(pk=self.honey.pk).update(reserved_stock=0)
+        self.assert_nothing_written()
+
+    def test_used_up_coupon_rolls_back_everything(self):
+        priced_cart = self.priced_cart()
+        # Another checkout used the coupon after the cart was priced
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage=1)
+
+        with self.assertRaises(OrderPlacementError) as raised:
+            place_order(self.user, priced_cart, self.address, self.address)
+
+        self.assertTrue(raised.exception.coupon_invalid)
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage=0)
+        self.assert_nothing_written()
+
+    def test_unavailable_stock_is_rejected_before_writing(self):
+        Product.objects.filter(pk=self.tea.pk).update(stock=1)
+
+        with self.assertRaises(OrderPlacementError):
+            place_order(self.user, self.priced_cart(), self.address, self.address)
 
-# Create your tests here.
+        self.assert_nothing_written()
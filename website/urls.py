@@ -20,6 +20,7 @@ urlpatterns = [
     
     # Products
     path('products/', product_views.product_list, name='product_list'),
+    path('products/suggest/', product_views.product_suggest, name='product_suggest'),
     path('products/<int:pk>/review/', product_views.submit_review, name='submit_review'),
     path('products/<int:pk>/', product_views.product_detail, name='product_detail'),
     
@@ -29,6 +30,10 @@ urlpatterns = [
     path('cart/update/<int:item_index>/', cart_views.update_cart, name='update_cart'),
     path('cart/remove/<int:item_index>/', cart_views.remove_from_cart, name='remove_from_cart'),
     path('cart/coupon/', cart_views.apply_coupon, name='apply_coupon'),
+    path('cart/api/add/<int:product_id>/', cart_views.cart_api_add, name='cart_api_add'),
+    path('cart/api/items/<int:item_index>/', cart_views.cart_api_update, name='cart_api_update'),
+    path('cart/api/items/<int:item_index>/remove/', cart_views.cart_api_remove, name='cart_api_remove'),
+    path('cart/api/coupon/', cart_views.cart_api_coupon, name='cart_api_coupon'),
     
     # Checkout
     path('checkout/', checkout_views.checkout, name='checkout'),
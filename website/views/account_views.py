@@ -2,7 +2,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from core.models import Order, Address, Wishlist, Product, Setting, Withdrawal, Transaction, ShippingCharge
+from core.models import Order, Address, Wishlist, Product, Withdrawal, Transaction, ShippingCharge
+from core.cache_utils import get_setting
+from core.pricing import resolve_prices
 
 
 @login_required
@@ -13,7 +15,7 @@ def account_dashboard(request):
     pending_orders = Order.objects.filter(user=user, order_status='pending').count()
     
     # Get setting to check if referral system is active
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     active_referal_system = setting.active_referal_system
     
     # Build referral URL if user has earn_code and referral system is active
@@ -61,7 +63,7 @@ def account_profile(request):
         return redirect('website:account_profile')
     
     # Get setting for template
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     context = {
         'user': user,
@@ -216,7 +218,8 @@ def account_address_delete(request, address_id):
 @login_required
 def wishlist_view(request):
     """Display user's wishlist"""
-    wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
+    wishlist_items = list(Wishlist.objects.filter(user=request.user).select_related('product'))
+    resolve_prices([item.product for item in wishlist_items])
     
     context = {
         'wishlist_items': wishlist_items,
@@ -322,7 +325,7 @@ def account_kyc(request):
         return redirect('website:account_kyc')
     
     # Get setting for template
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     context = {
         'user': user,
@@ -393,7 +396,7 @@ def account_withdrawals(request):
         return redirect('website:account_kyc')
     
     # Get settings
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     # Get withdrawal history
     withdrawals = Withdrawal.objects.filter(user=user).order_by('-created_at')
@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from django.utils import timezone
@@ -6,10 +6,10 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
-from django.utils.crypto import get_random_string
 import secrets
 from datetime import timedelta
-from core.models import User, PasswordResetOTP, Setting, Transaction
+from core.models import User, PasswordResetOTP, Transaction
+from core.cache_utils import get_setting
 from decimal import Decimal
 
 
@@ -129,7 +129,7 @@ def register_view(request):
                 
                 # Process referral if earn_code provided and referral system is active
                 if earn_code:
-                    setting = Setting.objects.first()
+                    setting = get_setting()
                     if setting and setting.active_referal_system:
                         try:
                             # Find influencer with matching earn_code
@@ -1,6 +1,5 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from core.models import Brand, Product
+from django.shortcuts import get_object_or_404, redirect
+from core.models import Brand
 
 
 def brand_list(request, brand_id):
@@ -1,7 +1,8 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.models import Campaign, Setting, User
+from core.models import Campaign
+from core.cache_utils import get_setting
 from website.views.earn_views import check_influencer_kyc_access
 from django.http import JsonResponse
 
@@ -10,7 +11,7 @@ from django.http import JsonResponse
 def campaign_list(request):
     """List active campaigns"""
     # Get setting for context
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     # Check access
     has_access, error_message = check_influencer_kyc_access(request.user)
@@ -37,7 +38,7 @@ def campaign_list(request):
 def campaign_detail(request, campaign_id):
     """Campaign detail page with enroll button"""
     # Get setting for context
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     # Check access
     has_access, error_message = check_influencer_kyc_access(request.user)
@@ -1,80 +1,59 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import JsonResponse
-from core.models import Product, Coupon
-from decimal import Decimal
-
-
-def get_cart(request):
-    """Get or initialize cart from session"""
-    if 'cart' not in request.session:
-        request.session['cart'] = {
-            'items': [],
-            'coupon_code': None,
-        }
-    return request.session['cart']
+from django.views.decorators.http import require_POST
+from core.coupons import get_coupon, normalize_code
+from core.models import Product
+from website.cart import get_cart, price_cart
 
 
 def cart_view(request):
     """Display shopping cart"""
     cart = get_cart(request)
-    cart_items = []
-    subtotal = Decimal('0.00')
+    coupon_code = cart.coupon_code
+    priced_cart = price_cart(cart.items(), coupon_code)
     
-    for item in cart['items']:
-        try:
-            product = Product.objects.get(pk=item['product_id'], is_active=True)
-            item_total = Decimal(str(item['price'])) * item['quantity']
-            subtotal += item_total
-            
-            cart_items.append({
-                'product': product,
-                'variant': item.get('variant', ''),
-                'quantity': item['quantity'],
-                'price': Decimal(str(item['price'])),
-                'total': item_total,
-            })
-        except Product.DoesNotExist:
-            continue
+    # Drop a coupon that no longer exists or has expired
+    if coupon_code and priced_cart.coupon is None:
+        cart.set_coupon(None)
+        coupon_code = None
     
-    # Calculate shipping (free shipping over $50, otherwise $5)
-    shipping = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
+    context = {
+        'cart_items': priced_cart.lines,
+        'coupon_code': coupon_code or '',
+        **priced_cart.totals(),
+    }
     
-    # Tax removed from system
-    tax = Decimal('0.00')
+    return render(request, 'site/cart/cart.html', context)
+
+
+def prepare_cart_add(product, variant, quantity):
+    """
+    Resolve the variant and check stock before adding product to the cart
+    Returns: (variant, error message or None)
+    """
+    if quantity < 1:
+        return variant, 'Quantity must be at least 1'
     
-    # Apply coupon if exists
-    discount = Decimal('0.00')
-    coupon = None
-    if cart.get('coupon_code'):
-        try:
-            coupon = Coupon.objects.get(coupon_code=cart['coupon_code'])
-            if coupon.is_valid():
-                if coupon.discount_type == 'flat':
-                    discount = coupon.discount
-                else:  # percentage
-                    discount = subtotal * (coupon.discount / 100)
-            else:
-                cart['coupon_code'] = None
-                request.session.modified = True
-        except Coupon.DoesNotExist:
-            cart['coupon_code'] = None
-            request.session.modified = True
+    # Check if product has variants enabled
+    has_variants = product.product_varient and product.product_varient.get('enabled', False)
     
-    total = subtotal + shipping - discount
+    # If product has variants but no variant provided, use is_primary variant
+    if has_variants and not variant:
+        primary_variant = product.get_primary_variant()
+        if primary_variant:
+            variant = primary_variant.combination
+        
+        # If still no variant found, return error
+        if not variant:
+            return variant, 'Please select a variant for this product'
     
-    context = {
-        'cart_items': cart_items,
-        'subtotal': subtotal,
-        'shipping': shipping,
-        'tax': tax,
-        'discount': discount,
-        'total': total,
-        'coupon': coupon,
-        'coupon_code': cart.get('coupon_code', ''),
-    }
+    # Check stock (net of units reserved by placed orders)
+    stock = product.get_available_stock(variant or None)
     
-    return render(request, 'site/cart/cart.html', context)
+    if quantity > stock:
+        return variant, f'Only {stock} items available in stock'
+    return variant, None
 
 
 def add_to_cart(request, product_id):
@@ -82,81 +61,19 @@ def add_to_cart(request, product_id):
     if request.method == 'POST':
         try:
             product = Product.objects.get(pk=product_id, is_active=True)
-            variant = request.POST.get('variant', '')
             quantity = int(request.POST.get('quantity', 1))
+            variant, error = prepare_cart_add(product, request.POST.get('variant', ''), quantity)
             
-            if quantity < 1:
-                messages.error(request, 'Quantity must be at least 1')
-                return redirect('website:product_detail', pk=product_id)
-            
-            # Check if product has variants enabled
-            has_variants = product.product_varient and product.product_varient.get('enabled', False)
-            
-            # If product has variants but no variant provided, use is_primary variant
-            if has_variants and not variant:
-                combinations = product.product_varient.get('combinations', {})
-                for combo_key, combo_data in combinations.items():
-                    if isinstance(combo_data, dict) and combo_data.get('is_primary', False):
-                        variant = combo_key
-                        break
-                
-                # If still no variant found, return error
-                if not variant:
-                    messages.error(request, 'Please select a variant for this product')
-                    return redirect('website:product_detail', pk=product_id)
-            
-            # Validate variant selection for products with variants
-            if has_variants and not variant:
-                messages.error(request, 'Variant selection is required for this product')
-                return redirect('website:product_detail', pk=product_id)
-            
-            # Check stock
-            if variant:
-                stock = product.get_variant_stock(variant)
-            else:
-                stock = product.stock
-            
-            if quantity > stock:
-                messages.error(request, f'Only {stock} items available in stock')
+            if error:
+                messages.error(request, error)
                 return redirect('website:product_detail', pk=product_id)
             
-            # Get price
-            price = float(product.get_final_price(variant))
-            
-            cart = get_cart(request)
-            
             # Get campaign_id and earncode from session if available
             campaign_id = request.session.get('campaign_id', '')
             earn_code = request.session.get('campaign_earncode', '')
             
-            # Check if item already exists
-            item_found = False
-            for item in cart['items']:
-                if item['product_id'] == product_id and item.get('variant') == variant:
-                    item['quantity'] += quantity
-                    # Preserve campaign info if not already set
-                    if not item.get('campaign_id') and campaign_id:
-                        item['campaign_id'] = campaign_id
-                    if not item.get('earn_code') and earn_code:
-                        item['earn_code'] = earn_code
-                    item_found = True
-                    break
-            
-            if not item_found:
-                cart_item = {
-                    'product_id': product_id,
-                    'variant': variant,
-                    'quantity': quantity,
-                    'price': price,
-                }
-                # Add campaign info if available
-                if campaign_id:
-                    cart_item['campaign_id'] = campaign_id
-                if earn_code:
-                    cart_item['earn_code'] = earn_code
-                cart['items'].append(cart_item)
-            
-            request.session.modified = True
+            # Merges into an existing line for the same product and variant
+            get_cart(request).add(product_id, variant, quantity, campaign_id, earn_code)
             messages.success(request, 'Product added to cart')
             
         except Product.DoesNotExist:
@@ -170,15 +87,9 @@ def add_to_cart(request, product_id):
 def update_cart(request, item_index):
     """Update cart item quantity"""
     if request.method == 'POST':
-        cart = get_cart(request)
         quantity = int(request.POST.get('quantity', 1))
         
-        if 0 <= item_index < len(cart['items']):
-            if quantity <= 0:
-                cart['items'].pop(item_index)
-            else:
-                cart['items'][item_index]['quantity'] = quantity
-            request.session.modified = True
+        if get_cart(request).set_quantity(item_index, quantity):
             messages.success(request, 'Cart updated')
     
     return redirect('website:cart')
@@ -186,10 +97,7 @@ def update_cart(request, item_index):
 
 def remove_from_cart(request, item_index):
     """Remove item from cart"""
-    cart = get_cart(request)
-    if 0 <= item_index < len(cart['items']):
-        cart['items'].pop(item_index)
-        request.session.modified = True
+    if get_cart(request).remove(item_index):
         messages.success(request, 'Item removed from cart')
     
     return redirect('website:cart')
@@ -198,23 +106,122 @@ def remove_from_cart(request, item_index):
 def apply_coupon(request):
     """Apply coupon code to cart"""
     if request.method == 'POST':
-        coupon_code = request.POST.get('coupon_code', '').strip().upper()
+        coupon_code = normalize_code(request.POST.get('coupon_code'))
         cart = get_cart(request)
         
         if coupon_code:
-            try:
-                coupon = Coupon.objects.get(coupon_code=coupon_code)
-                if coupon.is_valid():
-                    cart['coupon_code'] = coupon_code
-                    request.session.modified = True
-                    messages.success(request, 'Coupon applied successfully')
-                else:
-                    messages.error(request, 'Coupon is not valid or has expired')
-            except Coupon.DoesNotExist:
+            coupon = get_coupon(coupon_code)
+            if coupon is None:
                 messages.error(request, 'Invalid coupon code')
+            elif coupon.is_valid():
+                cart.set_coupon(coupon_code)
+                messages.success(request, 'Coupon applied successfully')
+            else:
+                messages.error(request, 'Coupon is not valid or has expired')
         else:
-            cart['coupon_code'] = None
-            request.session.modified = True
+            cart.set_coupon(None)
             messages.success(request, 'Coupon removed')
     
     return redirect('website:cart')
+
+
+# JSON cart API: same operations as the views above, answered with the changed
+# line, the new totals and the header count instead of a redirect.
+
+def _money(value):
+    return f'{value:.2f}'
+
+
+def cart_api_response(cart, key=None, removed=False):
+    """Reprice the cart and describe line key (None if it was removed or is gone)"""
+    priced_cart = price_cart(cart.items(), cart.coupon_code)
+    line = None
+    if key is not None and not removed:
+        line = next((line for line in priced_cart.lines if line.index == key), None)
+    return JsonResponse({
+        'success': True,
+        'line': {
+            'key': line.index,
+            'product_id': line.product.pk,
+            'name': line.product.name,
+            'variant': line.variant,
+            'quantity': line.quantity,
+            'price': _money(line.price),
+            'total': _money(line.total),
+        } if line else None,
+        'removed': key if removed else None,
+        'totals': {
+            'subtotal': _money(priced_cart.subtotal),
+            'shipping': _money(priced_cart.shipping),
+            'discount': _money(priced_cart.discount),
+            'total': _money(priced_cart.total),
+            'coupon_code': priced_cart.coupon.coupon_code if priced_cart.coupon else None,
+        },
+        'cart_count': cart.count(),
+    })
+
+
+def cart_api_error(message, status=400):
+    return JsonResponse({'success': False, 'error': message}, status=status)
+
+
+@require_POST
+def cart_api_add(request, product_id):
+    """Add a product (quantity, variant) to the cart"""
+    try:
+        product = Product.objects.get(pk=product_id, is_active=True)
+        quantity = int(request.POST.get('quantity', 1))
+    except Product.DoesNotExist:
+        return cart_api_error('Product not found', status=404)
+    except ValueError:
+        return cart_api_error('Invalid quantity')
+    
+    variant, error = prepare_cart_add(product, request.POST.get('variant', ''), quantity)
+    if error:
+        return cart_api_error(error)
+    
+    cart = get_cart(request)
+    key = cart.add(
+        product_id, variant, quantity,
+        request.session.get('campaign_id', ''), request.session.get('campaign_earncode', '')
+    )
+    return cart_api_response(cart, key)
+
+
+@require_POST
+def cart_api_update(request, item_index):
+    """Set a line's quantity (0 removes it)"""
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except ValueError:
+        return cart_api_error('Invalid quantity')
+    
+    cart = get_cart(request)
+    if not cart.set_quantity(item_index, quantity):
+        return cart_api_error('Cart item not found', status=404)
+    return cart_api_response(cart, item_index, removed=quantity <= 0)
+
+
+@require_POST
+def cart_api_remove(request, item_index):
+    """Remove a line"""
+    cart = get_cart(request)
+    if not cart.remove(item_index):
+        return cart_api_error('Cart item not found', status=404)
+    return cart_api_response(cart, item_index, removed=True)
+
+
+@require_POST
+def cart_api_coupon(request):
+    """Apply a coupon code (an empty code removes the coupon)"""
+    coupon_code = normalize_code(request.POST.get('coupon_code'))
+    cart = get_cart(request)
+    
+    if coupon_code:
+        coupon = get_coupon(coupon_code)
+        if coupon is None:
+            return cart_api_error('Invalid coupon code')
+        if not coupon.is_valid():
+            return cart_api_error('Coupon is not valid or has expired')
+    cart.set_coupon(coupon_code or None)
+    return cart_api_response(cart)
@@ -1,7 +1,5 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.http import Http404
-from core.models import Category, SubCategory, Product
+from django.shortcuts import get_object_or_404, redirect
+from core.models import Category, SubCategory
 
 
 def category_list(request, category_id=None):
@@ -1,63 +1,26 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction
-from core.models import Order, OrderItem, Address, Coupon, Product, ShippingCharge, Setting, Campaign
-from core.stock_utils import deduct_stock, validate_stock_availability
-from .cart_views import get_cart
-from decimal import Decimal
+from core.models import Order, Address
+from website.cart import get_cart, price_cart
+from website.orders import OrderPlacementError, place_order
 
 
 @login_required(login_url='website:login')
 def checkout(request):
     """Checkout page"""
     cart = get_cart(request)
+    cart_items = cart.items()
     
-    if not cart.get('items'):
+    if not cart_items:
         messages.warning(request, 'Your cart is empty')
         return redirect('website:cart')
     
     # Get user addresses with shipping_charge prefetched
     addresses = Address.objects.filter(user=request.user).select_related('shipping_charge')
     
-    # Calculate cart totals (same logic as cart view)
-    subtotal = Decimal('0.00')
-    for item in cart['items']:
-        from core.models import Product
-        try:
-            product = Product.objects.get(pk=item['product_id'], is_active=True)
-            item_total = Decimal(str(item['price'])) * item['quantity']
-            subtotal += item_total
-        except Product.DoesNotExist:
-            continue
-    
-    # Calculate initial shipping charge based on first address (if addresses exist)
-    shipping = Decimal('0.00')
-    if addresses.exists():
-        # Use first address as default (will be the selected billing address)
-        first_address = addresses.first()
-        if first_address.shipping_charge:
-            shipping = first_address.shipping_charge.charge
-        else:
-            # Fallback to old logic if no shipping charge set
-            shipping = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-    
-    tax = Decimal('0.00')  # Tax removed from system
-    
-    discount = Decimal('0.00')
-    coupon = None
-    if cart.get('coupon_code'):
-        try:
-            coupon = Coupon.objects.get(coupon_code=cart['coupon_code'])
-            if coupon.is_valid():
-                if coupon.discount_type == 'flat':
-                    discount = coupon.discount
-                else:
-                    discount = subtotal * (coupon.discount / 100)
-        except Coupon.DoesNotExist:
-            pass
-    
-    total = subtotal + shipping - discount
+    # Price the cart once (fixed number of queries); shipping defaults to the first address
+    priced_cart = price_cart(cart_items, cart.coupon_code, addresses.first())
     
     if request.method == 'POST':
         billing_address_id = request.POST.get('billing_address')
@@ -72,108 +35,20 @@ def checkout(request):
             else:
                 shipping_address = Address.objects.get(pk=shipping_address_id, user=request.user)
             
-            # Get shipping charge from shipping address
-            shipping_charge_obj = shipping_address.shipping_charge
-            if shipping_charge_obj:
-                shipping = shipping_charge_obj.charge
-            else:
-                # Fallback to old logic if no shipping charge set
-                shipping = Decimal('0.00') if subtotal >= 50 else Decimal('5.00')
-            
-            # Recalculate total with correct shipping
-            total = subtotal + shipping - discount
-            
-            # Validate stock availability before creating order
-            stock_errors = []
-            for item in cart['items']:
-                try:
-                    product = Product.objects.get(pk=item['product_id'], is_active=True)
-                    variant = item.get('variant', '')
-                    is_available, available_qty, message = validate_stock_availability(
-                        product, item['quantity'], variant
-                    )
-                    if not is_available:
-                        stock_errors.append(f"{product.name}: {message}")
-                except Product.DoesNotExist:
-                    stock_errors.append(f"Product ID {item['product_id']}: Product not found")
-            
-            if stock_errors:
-                messages.error(request, 'Stock validation failed: ' + '; '.join(stock_errors))
+            # Validate, then create the order, reserve stock and redeem the coupon in one transaction
+            try:
+                order = place_order(request.user, priced_cart, billing_address, shipping_address)
+            except OrderPlacementError as e:
+                if e.coupon_invalid:
+                    cart.set_coupon(None)
+                messages.error(request, str(e))
                 return redirect('website:cart')
             
-            # Create order
-            with transaction.atomic():
-                order = Order.objects.create(
-                    user=request.user,
-                    billing_address=billing_address,
-                    shipping_address=shipping_address,
-                    sub_total=subtotal,
-                    shipping=shipping,
-                    tax=tax,
-                    total=total,
-                    payment_status='pending',
-                    order_status='pending',
-                    payment_method='cod',
-                    shipping_charge=shipping_charge_obj,
-                )
-                
-                # Create order items and deduct stock
-                for item in cart['items']:
-                    try:
-                        product = Product.objects.get(pk=item['product_id'], is_active=True)
-                        price = Decimal(str(item['price']))
-                        variant = item.get('variant', '')
-                        
-                        # If product has variants but no variant provided, use is_primary variant
-                        has_variants = product.product_varient and product.product_varient.get('enabled', False)
-                        if has_variants and not variant:
-                            combinations = product.product_varient.get('combinations', {})
-                            for combo_key, combo_data in combinations.items():
-                                if isinstance(combo_data, dict) and combo_data.get('is_primary', False):
-                                    variant = combo_key
-                                    break
-                        
-                        # Get campaign and earncode from cart item
-                        campaign = None
-                        earn_code = ''
-                        campaign_id = item.get('campaign_id', '')
-                        if campaign_id:
-                            try:
-                                campaign = Campaign.objects.get(pk=campaign_id, is_active=True, product=product)
-                            except Campaign.DoesNotExist:
-                                pass
-                        
-                        earn_code = item.get('earn_code', '')
-                        
-                        # Create order item
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            product_varient=variant,
-                            campaign=campaign,
-                            earn_code=earn_code,
-                            quantity=item['quantity'],
-                            price=price,
-                            total=price * item['quantity'],
-                        )
-                        
-                        # Note: Stock deduction will happen when order is delivered and paid (via signal)
-                        # Don't deduct stock here during order creation
-                            
-                    except Product.DoesNotExist:
-                        continue
-                
-                # Clear cart and campaign session data
-                cart['items'] = []
-                cart['coupon_code'] = None
-                request.session.pop('campaign_earncode', None)
-                request.session.pop('campaign_id', None)
-                request.session.modified = True
-                
-                # Update coupon usage
-                if coupon:
-                    coupon.usage += 1
-                    coupon.save()
+            # Clear cart and campaign session data
+            cart.clear()
+            request.session.pop('campaign_earncode', None)
+            request.session.pop('campaign_id', None)
+            request.session.modified = True
             
             messages.success(request, 'Order placed successfully!')
             return redirect('website:checkout_success', order_id=order.id)
@@ -185,12 +60,7 @@ def checkout(request):
     
     context = {
         'addresses': addresses,
-        'subtotal': subtotal,
-        'shipping': shipping,
-        'tax': tax,
-        'discount': discount,
-        'total': total,
-        'coupon': coupon,
+        **priced_cart.totals(),
     }
     
     return render(request, 'site/checkout/checkout.html', context)
@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.models import Setting, Withdrawal, Transaction
+from core.models import Withdrawal, Transaction
+from core.cache_utils import get_setting
 
 
 def check_influencer_kyc_access(user):
@@ -28,7 +29,7 @@ def check_influencer_kyc_access(user):
 def wallet_view(request):
     """User wallet and withdrawal"""
     # Get setting for context
-    setting = Setting.objects.first() or Setting.objects.create()
+    setting = get_setting()
     
     # Check access
     has_access, error_message = check_influencer_kyc_access(request.user)
@@ -1,16 +1,52 @@
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from urllib.parse import unquote
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
-from datetime import timedelta
-from core.models import Banner, Category, Product, Brand, CMSPage, FlashDeal, OrderItem, ProductReview
+from core.models import Banner, Category, Product, Brand, CMSPage, ProductReview
+from core.cache_utils import get_versioned
+from core.pricing import resolve_prices, flash_deal_index
+from core.sales import get_sales_rankings, ranked_products
+
+# Upper bound (seconds) on how long the rendered home page content is reused
+HOME_CACHE_TIMEOUT = 900
+
+
+def home_cache_timeout():
+    """Expire the cached home content no later than the next flash deal start/end"""
+    seconds = (flash_deal_index.next_boundary() - timezone.now()).total_seconds()
+    return max(1, min(HOME_CACHE_TIMEOUT, int(seconds)))
 
 
 def home(request):
-    """Homepage view with banners, categories, and featured products"""
-    from django.utils import timezone
-    now = timezone.now()
-    
+    """
+    Homepage view with banners, categories, and featured products.
+    The content below the search bar is the same for every visitor and is cached
+    until a banner, catalog or sales ranking change, the next flash deal
+    boundary or midnight; the page around it (header, cart/wishlist counts,
+    messages, search box) is rendered per request.
+    """
+    home_page = get_versioned(
+        'home',
+        lambda: render_home_content(request),
+        timeout=home_cache_timeout(),
+        key=str(timezone.localdate()),
+        depends=('catalog', 'sales_rankings')
+    )
+    context = {
+        'content': mark_safe(home_page['content']),
+        # Banner carousel and flash deal countdown scripts
+        'banner_count': home_page['banner_count'],
+        'active_flash_deals': home_page['active_flash_deals'],
+    }
+    return render(request, 'site/home/index.html', context)
+
+
+def render_home_content(request):
+    """
+    Render the home page content shared by all visitors
+    Returns: dict with the content HTML and the data its page scripts need
+    """
     # Get active banners
     banners = Banner.objects.filter(is_active=True).order_by('-created_at')[:5]
     
@@ -18,53 +54,29 @@ def home(request):
     categories = Category.objects.order_by('order', 'name')[:8]
     
     # Get featured products
-    featured_products = Product.objects.filter(is_featured=True, is_active=True)[:8]
+    featured_products = list(Product.objects.filter(is_featured=True, is_active=True)[:8])
     
     # Get new arrivals (latest products)
-    new_arrivals = Product.objects.filter(is_active=True).order_by('-created_at')[:8]
+    new_arrivals = list(Product.objects.filter(is_active=True).order_by('-created_at')[:8])
     
     # Get brands
     brands = Brand.objects.all()[:10]
     
     # Get active flash deals
-    active_flash_deals = FlashDeal.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).order_by('-created_at')[:3]
+    active_flash_deals = flash_deal_index.active_deals()[:3]
     
     # Get flash deal products (from all active deals)
-    flash_deal_products = Product.objects.filter(
-        flash_deals__in=active_flash_deals,
+    flash_deal_products = list(Product.objects.filter(
+        flash_deals__in=[deal.pk for deal in active_flash_deals],
         is_active=True
-    ).distinct()[:8]
-    
-    # Get best sellers (top selling products based on order items)
-    best_sellers = Product.objects.filter(
-        is_active=True,
-        order_items__order__payment_status='paid'
-    ).annotate(
-        total_sold=Sum('order_items__quantity')
-    ).filter(
-        total_sold__gt=0
-    ).order_by('-total_sold')[:8]
+    ).distinct()[:8])
     
-    # Get trending products (products with recent orders in last 30 days)
-    thirty_days_ago = now - timedelta(days=30)
-    trending_products = Product.objects.filter(
-        is_active=True,
-        order_items__order__created_at__gte=thirty_days_ago,
-        order_items__order__payment_status='paid'
-    ).annotate(
-        recent_orders=Count('order_items__id', distinct=True)
-    ).filter(
-        recent_orders__gt=0
-    ).order_by('-recent_orders', '-created_at')[:8]
-    
-    # Evaluate trending_products to get IDs first
-    trending_products_list = list(trending_products)
+    # Best sellers and trending products, ranked from the daily sales rollup
+    rankings = get_sales_rankings()
+    best_sellers = ranked_products(rankings['best_sellers'], 8)
+    trending_products_list = ranked_products(rankings['trending'], 8)
     trending_product_ids = [p.id for p in trending_products_list]
-
+    
     # If not enough trending products, fill with new arrivals
     if len(trending_products_list) < 8:
         additional = Product.objects.filter(
@@ -76,6 +88,9 @@ def home(request):
     else:
         trending_products = trending_products_list
     
+    # Attach flash deals and final prices to every product card in one query
+    resolve_prices(featured_products + new_arrivals + flash_deal_products + best_sellers + trending_products)
+    
     # Get customer testimonials (recent product reviews with messages)
     testimonials = ProductReview.objects.filter(
         message__isnull=False,
@@ -95,7 +110,11 @@ def home(request):
         'testimonials': testimonials,
     }
     
-    return render(request, 'site/home/index.html', context)
+    return {
+        'content': render_to_string('site/home/content.html', context, request=request),
+        'banner_count': len(banners),
+        'active_flash_deals': list(active_flash_deals),
+    }
 
 
 def cms_page_view(request, slug):
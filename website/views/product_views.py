@@ -1,11 +1,22 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.db.models import Q, Avg
+from django.db.models import Q
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+import hashlib
 import json
-from core.models import Product, ProductReview, Category, SubCategory, ChildCategory, Brand, OrderItem, Wishlist, Setting, Campaign, User
+from core.models import Product, ProductReview, Category, Brand, OrderItem, Wishlist, Campaign, User
+from core.cache_utils import get_setting, get_versioned
+from core.pricing import resolve_prices, flash_deal_index
+from core.search import search_products
+from core.facets import get_facet_counts
+from core.pagination import CursorPaginator
+from core.autocomplete import suggest_index
 
 
 def can_user_review_product(user, product):
@@ -20,63 +31,110 @@ def can_user_review_product(user, product):
     ).exists()
 
 
+# Query parameters that shape the product listing (others, e.g. utm_*, share its cache entry)
+LISTING_PARAMS = ('search', 'min_price', 'max_price', 'sort', 'page')
+LISTING_MULTI_PARAMS = ('category', 'subcategory', 'childcategory', 'brand')
+LISTING_CACHE_TIMEOUT = 300
+# Rendered in place of the CSRF token in cached listings; swapped for the visitor's token
+CSRF_TOKEN_PLACEHOLDER = 'listing-csrf-token-placeholder'
+
+
+def listing_cache_key(request):
+    """Normalized, order-independent signature of the listing query parameters"""
+    params = [(name, request.GET.get(name, '')) for name in LISTING_PARAMS]
+    params += [(name, sorted(set(request.GET.getlist(name)))) for name in LISTING_MULTI_PARAMS]
+    # Wishlist buttons are only rendered for logged-in users
+    params.append(('authenticated', request.user.is_authenticated))
+    return hashlib.md5(repr(params).encode()).hexdigest()
+
+
+def listing_page_query(request, page):
+    """
+    request.GET restricted to the listing parameters (as normalized by listing_cache_key)
+    with page replaced, urlencoded for the pagination links
+    """
+    query = request.GET.copy()
+    for name in list(query):
+        if name not in LISTING_PARAMS and name not in LISTING_MULTI_PARAMS:
+            del query[name]
+    for name in LISTING_MULTI_PARAMS:
+        if name in query:
+            query.setlist(name, sorted(set(query.getlist(name))))
+    query.pop('page', None)
+    if page:
+        query['page'] = page
+    return query.urlencode()
+
+
+def listing_cache_timeout():
+    """Expire cached listings no later than the next flash deal start/end"""
+    seconds = (flash_deal_index.next_boundary() - timezone.now()).total_seconds()
+    return max(1, min(LISTING_CACHE_TIMEOUT, int(seconds)))
+
+
 def product_list(request):
-    """Product listing with filters and search"""
+    """
+    Product listing with filters and search.
+    The listing (filters, facets and product grid) is cached per query under the
+    'catalog' version; the page around it (header cart/wishlist counts, messages,
+    CSRF token) is rendered per visitor.
+    """
+    listing = get_versioned(
+        'catalog',
+        lambda: render_product_listing(request),
+        timeout=listing_cache_timeout(),
+        key=listing_cache_key(request)
+    )
+    listing = listing.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request))
+    return render(request, 'site/products/list.html', {'listing': mark_safe(listing)})
+
+
+def render_product_listing(request):
+    """Render the product listing HTML for request.GET (shared by all visitors)"""
     products = Product.objects.filter(is_active=True)
     
     # Search
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(short_description__icontains=search_query) |
-            Q(sku__icontains=search_query)
-        )
+        # Full-text index, ranked by relevance
+        products = search_products(products, search_query)
+    
+    # Price range filter
+    min_price = request.GET.get('min_price')
+    max_price = request.GET.get('max_price')
+    if min_price:
+        products = products.filter(effective_price__gte=min_price)
+    if max_price:
+        products = products.filter(effective_price__lte=max_price)
+    
+    # Base set for the sidebar facet counts (before category/brand filters)
+    facet_products = products
     
     # Category filter - support multiple selections (parent, sub, child)
     category_ids = request.GET.getlist('category')
     subcategory_ids = request.GET.getlist('subcategory')
     childcategory_ids = request.GET.getlist('childcategory')
     
+    # Indexed lookups on the denormalized ancestry (no joins or DISTINCT)
     category_q = Q()
+    selected_category_ids = [int(cid) for cid in category_ids if cid.isdigit()]
+    selected_subcategory_ids = [int(sid) for sid in subcategory_ids if sid.isdigit()]
+    selected_childcategory_ids = [int(cid) for cid in childcategory_ids if cid.isdigit()]
+    
+    # Parent categories match products in the category, its subcategories or child categories
+    if selected_category_ids:
+        category_q |= Q(ancestor_category_id__in=selected_category_ids)
+    
+    # Subcategories match products in the subcategory or its child categories
+    if selected_subcategory_ids:
+        category_q |= Q(ancestor_sub_category_id__in=selected_subcategory_ids)
     
-    # Filter by parent categories
-    if category_ids:
-        for cat_id in category_ids:
-            try:
-                cat_id_int = int(cat_id)
-                # Match products in parent category, its subcategories, or child categories
-                category_q |= (
-                    Q(category_id=cat_id_int) |
-                    Q(sub_category__category_id=cat_id_int) |
-                    Q(child_category__sub_category__category_id=cat_id_int)
-                )
-            except ValueError:
-                continue
-    
-    # Filter by subcategories
-    if subcategory_ids:
-        for subcat_id in subcategory_ids:
-            try:
-                subcat_id_int = int(subcat_id)
-                category_q |= (
-                    Q(sub_category_id=subcat_id_int) |
-                    Q(child_category__sub_category_id=subcat_id_int)
-                )
-            except ValueError:
-                continue
-    
-    # Filter by child categories
-    if childcategory_ids:
-        for childcat_id in childcategory_ids:
-            try:
-                childcat_id_int = int(childcat_id)
-                category_q |= Q(child_category_id=childcat_id_int)
-            except ValueError:
-                continue
+    # Child categories
+    if selected_childcategory_ids:
+        category_q |= Q(child_category_id__in=selected_childcategory_ids)
     
     if category_q:
-        products = products.filter(category_q).distinct()
+        products = products.filter(category_q)
     
     # Brand filter - support multiple selections
     brand_ids = request.GET.getlist('brand')
@@ -87,40 +145,47 @@ def product_list(request):
         except ValueError:
             pass
     
-    # Price range filter
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        products = products.filter(regular_price__gte=min_price)
-    if max_price:
-        products = products.filter(regular_price__lte=max_price)
-    
-    # Sort
-    sort_by = request.GET.get('sort', 'created_at')
-    if sort_by == 'price_asc':
-        products = products.order_by('regular_price')
+    # Sort (keyset columns; pk is the tie-breaker)
+    sort_by = request.GET.get('sort') or ('relevance' if search_query else 'created_at')
+    if sort_by == 'relevance' and search_query:
+        ordering = ['search_rank', '-created_at']
+    elif sort_by == 'price_asc':
+        ordering = ['effective_price']
     elif sort_by == 'price_desc':
-        products = products.order_by('-regular_price')
+        ordering = ['-effective_price']
     elif sort_by == 'name':
-        products = products.order_by('name')
+        ordering = ['name']
+    elif sort_by == 'rating':
+        ordering = ['-rating_avg', '-rating_count']
     else:
-        products = products.order_by('-created_at')
+        ordering = ['-created_at']
     
-    # Pagination
-    paginator = Paginator(products, 12)
+    # Get selected IDs for template
+    selected_brand_ids = [int(bid) for bid in brand_ids if bid.isdigit()]
+    
+    # Sidebar facet counts, cached per search/price signature
+    facet_counts = get_facet_counts(
+        facet_products,
+        (search_query.strip().lower(), min_price or '', max_price or ''),
+        category_ids=selected_category_ids,
+        subcategory_ids=selected_subcategory_ids,
+        childcategory_ids=selected_childcategory_ids,
+        brand_ids=selected_brand_ids,
+    )
+    
+    # Cursor pagination: deep pages cost the same as the first
+    paginator = CursorPaginator(products, 12, ordering)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = resolve_prices(page_obj.object_list)
+    # Page links keep every filter; the cached HTML is shared, so only listing parameters are carried
+    previous_page_query = listing_page_query(request, page_obj.previous_page_number()) if page_obj.has_previous() else ''
+    next_page_query = listing_page_query(request, page_obj.next_page_number()) if page_obj.has_next() else ''
     
     # Get filter options with hierarchy
     categories = Category.objects.prefetch_related('sub_categories__child_categories').order_by('order', 'name')
     brands = Brand.objects.all()
     
-    # Get selected IDs for template
-    selected_category_ids = [int(cid) for cid in category_ids if cid.isdigit()]
-    selected_subcategory_ids = [int(sid) for sid in subcategory_ids if sid.isdigit()]
-    selected_childcategory_ids = [int(cid) for cid in childcategory_ids if cid.isdigit()]
-    selected_brand_ids = [int(bid) for bid in brand_ids if bid.isdigit()]
-    
     context = {
         'page_obj': page_obj,
         'products': page_obj,
@@ -131,10 +196,43 @@ def product_list(request):
         'selected_subcategory_ids': selected_subcategory_ids,
         'selected_childcategory_ids': selected_childcategory_ids,
         'selected_brand_ids': selected_brand_ids,
+        'facet_counts': facet_counts,
         'sort_by': sort_by,
+        'previous_page_query': previous_page_query,
+        'next_page_query': next_page_query,
+        'csrf_token': CSRF_TOKEN_PLACEHOLDER,
     }
     
-    return render(request, 'site/products/list.html', context)
+    return render_to_string('site/products/listing.html', context, request=request)
+
+
+# product_list filter parameter for each non-product suggestion kind
+SUGGEST_FILTER_PARAMS = {
+    'brand': 'brand',
+    'category': 'category',
+    'subcategory': 'subcategory',
+    'childcategory': 'childcategory',
+}
+
+
+def product_suggest(request):
+    """Autocomplete JSON: prefix matches on product names, SKUs, brands and categories"""
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    
+    product_list_url = reverse('website:product_list')
+    results = []
+    for kind, pk, label in suggest_index.lookup(query, limit=limit):
+        if kind == 'product':
+            url = reverse('website:product_detail', args=[pk])
+        else:
+            url = f'{product_list_url}?{SUGGEST_FILTER_PARAMS[kind]}={pk}'
+        results.append({'type': kind, 'id': pk, 'label': label, 'url': url})
+    
+    return JsonResponse({'query': query, 'results': results})
 
 
 def product_detail(request, pk):
@@ -142,7 +240,7 @@ def product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk, is_active=True)
     
     # Check if referral system is active
-    setting = Setting.objects.first()
+    setting = get_setting()
     active_referal_system = setting.active_referal_system if setting else False
     
     # Handle campaign and earncode from query params
@@ -186,22 +284,23 @@ def product_detail(request, pk):
     # Get product images
     product_images = product.images.all()
     
-    # Get reviews
-    reviews = ProductReview.objects.filter(product=product).order_by('-created_at')[:10]
-    
-    # Calculate average rating
-    avg_rating = reviews.aggregate(
-        avg=Avg('star')
-    )['avg'] or 0
+    # Get reviews (rating aggregates are stored on the product)
+    reviews = ProductReview.objects.filter(product=product).select_related('user').order_by('-created_at')[:10]
     
-    # Get related products (same category)
-    related_products = Product.objects.filter(
-        category=product.category,
+    # Related products: co-purchase recommendations (one indexed lookup), topped up from the same category
+    related_products = list(Product.objects.filter(
+        recommended_in__product=product,
         is_active=True
-    ).exclude(pk=product.pk)[:4]
+    ).order_by('recommended_in__position')[:4])
+    if len(related_products) < 4:
+        related_products += list(Product.objects.filter(
+            category=product.category,
+            is_active=True
+        ).exclude(pk__in=[product.pk] + [p.pk for p in related_products])[:4 - len(related_products)])
+    resolve_prices([product] + related_products)
     
     # Prepare variant data as JSON for JavaScript
-    variant_data_json = json.dumps(product.product_varient) if product.product_varient else '{}'
+    variant_data_json = json.dumps(product.variant_data) if product.product_varient else '{}'
     
     # Check if user can review this product
     can_review = False
@@ -219,7 +318,8 @@ def product_detail(request, pk):
         'product': product,
         'product_images': product_images,
         'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
+        'avg_rating': round(product.rating_avg, 1),
+        'rating_breakdown': product.rating_breakdown,
         'related_products': related_products,
         'variant_data_json': variant_data_json,
         'can_review': can_review,